@@ -0,0 +1,208 @@
+# backend/aggregates.py
+# 維護 SampleAggregate 這張單列累計表：
+# - ORM 的單筆新增 / 刪除 / 修改 由下方的 mapper 事件自動處理
+# - 批次的 Core 語句 (例如 query.delete()) 不會觸發 mapper 事件，必須改走 sample_writes 中的函式
+
+from sqlalchemy import event, func, select, delete, update, insert, inspect, or_, and_
+from models import Sample, SampleAggregate
+from extensions import sample_archive
+
+AGGREGATE_ID = 1
+
+_agg = SampleAggregate.__table__
+_sample = Sample.__table__
+
+
+def _totals(conn, criterion=None):
+    """計算符合條件的紀錄的 筆數 / 總和 / 非空筆數"""
+    stmt = select(
+        func.count(_sample.c.id),
+        func.coalesce(func.sum(_sample.c.metric_a), 0.0),
+        func.coalesce(func.sum(_sample.c.metric_b), 0.0),
+        func.count(_sample.c.metric_a),
+        func.count(_sample.c.metric_b),
+    )
+    if criterion is not None:
+        stmt = stmt.where(criterion)
+    count, sum_a, sum_b, count_a, count_b = conn.execute(stmt).one()
+    return {
+        'total_count': count,
+        'sum_metric_a': float(sum_a),
+        'sum_metric_b': float(sum_b),
+        'count_metric_a': count_a,
+        'count_metric_b': count_b,
+    }
+
+
+def _latest(conn):
+    """找出目前最新的一筆紀錄 (timestamp 最大，同時間取 id 最大)"""
+    row = conn.execute(
+        select(_sample.c.id, _sample.c.timestamp, _sample.c.metric_a, _sample.c.metric_b)
+        .order_by(_sample.c.timestamp.desc(), _sample.c.id.desc())
+        .limit(1)
+    ).first()
+    return {
+        'latest_sample_id': row.id if row else None,
+        'latest_timestamp': row.timestamp if row else None,
+        'latest_metric_a': row.metric_a if row else None,
+        'latest_metric_b': row.metric_b if row else None,
+    }
+
+
+def _row_deltas(rows, sign=1):
+    """把一批紀錄 (dict 或 Sample 物件) 換算成累計欄位的增減量"""
+    deltas = {'total_count': 0, 'sum_metric_a': 0.0, 'sum_metric_b': 0.0, 'count_metric_a': 0, 'count_metric_b': 0}
+    for row in rows:
+        get = row.get if isinstance(row, dict) else (lambda key, _r=row: getattr(_r, key, None))
+        deltas['total_count'] += sign
+        if get('metric_a') is not None:
+            deltas['sum_metric_a'] += sign * get('metric_a')
+            deltas['count_metric_a'] += sign
+        if get('metric_b') is not None:
+            deltas['sum_metric_b'] += sign * get('metric_b')
+            deltas['count_metric_b'] += sign
+    return deltas
+
+
+def _apply_deltas(conn, deltas):
+    """以 col = col + delta 的方式原子地更新累計列；累計列不存在時回傳 False"""
+    values = {name: _agg.c[name] + delta for name, delta in deltas.items()}
+    result = conn.execute(update(_agg).where(_agg.c.id == AGGREGATE_ID).values(**values))
+    return result.rowcount > 0
+
+
+def _refresh_latest(conn):
+    conn.execute(update(_agg).where(_agg.c.id == AGGREGATE_ID).values(**_latest(conn)))
+
+
+def _history_totals(conn):
+    """熱資料表加上封存區 (由 manifest 記錄的總和，不必開啟封存檔) 的累計值"""
+    totals = _totals(conn)
+    for name, value in sample_archive.totals().items():
+        totals[name] += value
+    return totals
+
+
+def rebuild(conn):
+    """從 Sample 表 (與封存區) 重新計算整列累計值 (初始化或修正漂移時使用)"""
+    values = {**_history_totals(conn), **_latest(conn)}
+    conn.execute(delete(_agg))
+    conn.execute(insert(_agg).values(id=AGGREGATE_ID, **values))
+    return values
+
+
+def verify(conn, tolerance=1e-6):
+    """比對累計列與實際重算的結果，回傳不一致的欄位 {欄位: (儲存值, 實際值)}"""
+    stored = conn.execute(select(_agg).where(_agg.c.id == AGGREGATE_ID)).mappings().first()
+    expected = {**_history_totals(conn), **_latest(conn)}
+    if stored is None:
+        return {name: (None, value) for name, value in expected.items()}
+
+    mismatches = {}
+    for name, value in expected.items():
+        current = stored[name]
+        if isinstance(value, float) and current is not None:
+            if abs(current - value) > tolerance * max(1.0, abs(value)):
+                mismatches[name] = (current, value)
+        elif current != value:
+            mismatches[name] = (current, value)
+    return mismatches
+
+
+def apply_insert(conn, rows):
+    """在同一個交易中，把新寫入的紀錄 (需含 id/timestamp/metric_a/metric_b) 累加進去"""
+    rows = list(rows)
+    if not rows:
+        return
+    if not _apply_deltas(conn, _row_deltas(rows)):
+        # 累計列尚未建立：留給第一次讀取時的 get_or_rebuild() 一次重算。
+        # 不能在這裡重算 —— ORM 一次 flush 多筆時，同一批後面的紀錄已經寫入，
+        # 它們的 after_insert 事件還會再各自累加一次，造成重複計算
+        return
+
+    newest = max(rows, key=lambda r: (r['timestamp'], r['id']))
+    conn.execute(
+        update(_agg)
+        .where(_agg.c.id == AGGREGATE_ID)
+        .where(or_(
+            _agg.c.latest_timestamp.is_(None),
+            _agg.c.latest_timestamp < newest['timestamp'],
+            and_(_agg.c.latest_timestamp == newest['timestamp'], _agg.c.latest_sample_id < newest['id']),
+        ))
+        .values(
+            latest_sample_id=newest['id'],
+            latest_timestamp=newest['timestamp'],
+            latest_metric_a=newest.get('metric_a'),
+            latest_metric_b=newest.get('metric_b'),
+        )
+    )
+
+
+def prepare_delete(conn, criterion):
+    """在刪除之前呼叫：記下即將被刪除的紀錄的累計值，以及最新一筆是否在其中"""
+    removed = _totals(conn, criterion)
+    if removed['total_count'] == 0:
+        return None
+
+    latest_id = conn.execute(select(_agg.c.latest_sample_id).where(_agg.c.id == AGGREGATE_ID)).scalar()
+    latest_removed = latest_id is not None and conn.execute(
+        select(func.count()).select_from(_sample).where(criterion, _sample.c.id == latest_id)
+    ).scalar() > 0
+    return {'removed': removed, 'latest_removed': latest_removed}
+
+
+def apply_delete(conn, state):
+    """在刪除之後 (同一個交易中) 呼叫：扣除 prepare_delete() 記下的累計值"""
+    if state is None:
+        return
+    deltas = {name: -value for name, value in state['removed'].items()}
+    # 累計列尚未建立時不需處理 (讀取時才重算)
+    if _apply_deltas(conn, deltas) and state['latest_removed']:
+        _refresh_latest(conn)
+
+
+def get_or_rebuild(session):
+    """讀取累計列；若尚未建立則先重算一次"""
+    aggregate = session.get(SampleAggregate, AGGREGATE_ID)
+    if aggregate is None:
+        rebuild(session.connection())
+        session.commit()
+        aggregate = session.get(SampleAggregate, AGGREGATE_ID)
+    return aggregate
+
+
+# --- ORM 單筆寫入的自動維護 ---
+
+def _snapshot(target):
+    return {'id': target.id, 'timestamp': target.timestamp, 'metric_a': target.metric_a, 'metric_b': target.metric_b}
+
+
+@event.listens_for(Sample, 'after_insert')
+def _sample_inserted(mapper, connection, target):
+    apply_insert(connection, [_snapshot(target)])
+
+
+@event.listens_for(Sample, 'after_delete')
+def _sample_deleted(mapper, connection, target):
+    latest_id = connection.execute(select(_agg.c.latest_sample_id).where(_agg.c.id == AGGREGATE_ID)).scalar()
+    if _apply_deltas(connection, _row_deltas([target], sign=-1)) and latest_id == target.id:
+        _refresh_latest(connection)
+
+
+@event.listens_for(Sample, 'after_update')
+def _sample_updated(mapper, connection, target):
+    state = inspect(target)
+    changed = [name for name in ('metric_a', 'metric_b', 'timestamp') if state.attrs[name].history.has_changes()]
+    if not changed:
+        return
+
+    old = _snapshot(target)
+    for name in ('metric_a', 'metric_b'):
+        history = state.attrs[name].history
+        if history.deleted:
+            old[name] = history.deleted[0]
+    deltas = _row_deltas([target])
+    for name, value in _row_deltas([old], sign=-1).items():
+        deltas[name] += value
+    if _apply_deltas(connection, deltas):
+        _refresh_latest(connection)
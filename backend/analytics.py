@@ -0,0 +1,249 @@
+# backend/analytics.py
+# 產線的管制圖統計 (/analysis)：
+# - 每條產線以只選需要欄位的查詢 (走 line_name, timestamp 索引)、分批 (yield_per) 讀取，
+#   直接轉成 NumPy 陣列；不建立 ORM 物件
+# - 平均、標準差、百分位數、移動平均、I-MR 管制界限、Cp / Cpk、相關係數都以向量運算計算
+# - 已結束的時間區間 (to <= 現在) 的結果保存在行程內的 LRU；以彙總表算出的區間指紋
+#   (各產線的筆數 / 總和 / 平方和) 確認資料沒有變動，補寫或刪除舊資料後會自動重新計算
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select
+from models import Sample
+from extensions import sample_archive
+import rollups
+
+METRICS = rollups.METRICS
+PERCENTILES = (5, 25, 50, 75, 95)
+# I-MR 管制圖以平均移動全距估計組內標準差：sigma = MR-bar / d2 (n = 2 時 d2 = 1.128)
+D2 = 1.128
+CHUNK_SIZE = 50000
+
+_FINGERPRINT_FIELDS = ('sample_count',) + tuple(
+    f'{stat}_{metric}' for metric in METRICS for stat in ('count', 'sum', 'sumsq')
+)
+
+
+class WindowTooLarge(ValueError):
+    """區間內的資料筆數超過上限"""
+
+
+def load_columns(session, line_name, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """
+    讀取一條產線在 [start, end) 內的資料 (含已封存的紀錄)，依時間排序；
+    回傳 (timestamps: datetime64[us], metric_a, metric_b: float64 陣列，NULL 為 NaN)。
+    """
+    stmt = select(Sample.timestamp, Sample.metric_a, Sample.metric_b).where(Sample.line_name == line_name)
+    if start is not None:
+        stmt = stmt.where(Sample.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(Sample.timestamp < end)
+    stmt = stmt.order_by(Sample.timestamp, Sample.id)
+
+    timestamps, metric_a, metric_b = [], [], []
+    result = session.execute(stmt.execution_options(yield_per=chunk_size))
+    try:
+        for rows in result.partitions():
+            batch_timestamps, batch_a, batch_b = zip(*rows)
+            timestamps.append(np.array(batch_timestamps, dtype='datetime64[us]'))
+            metric_a.append(np.array(batch_a, dtype=np.float64))
+            metric_b.append(np.array(batch_b, dtype=np.float64))
+    finally:
+        result.close()
+
+    # 封存的紀錄都比熱資料表舊 (補寫的舊資料例外)，放在前面再以穩定排序整理
+    archived = sample_archive.select(start, end, line_name)
+    if archived['id'].size:
+        timestamps.insert(0, archived['timestamp'])
+        metric_a.insert(0, archived['metric_a'])
+        metric_b.insert(0, archived['metric_b'])
+    if not timestamps:
+        return np.empty(0, dtype='datetime64[us]'), np.empty(0), np.empty(0)
+    timestamps, metric_a, metric_b = np.concatenate(timestamps), np.concatenate(metric_a), np.concatenate(metric_b)
+    if archived['id'].size:
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, metric_a, metric_b = timestamps[order], metric_a[order], metric_b[order]
+    return timestamps, metric_a, metric_b
+
+
+def rolling_mean(values, window):
+    """長度為 window 的移動平均 (只有完整視窗)；以累加和計算，先減去平均值以降低浮點誤差"""
+    if values.size < window:
+        return np.empty(0)
+    offset = values.mean()
+    cumsum = np.concatenate(([0.0], np.cumsum(values - offset)))
+    return (cumsum[window:] - cumsum[:-window]) / window + offset
+
+
+def capability(mean, sigma_within, sigma_overall, lsl=None, usl=None):
+    """製程能力：Cp / Cpk 以組內標準差、Pp / Ppk 以整體標準差計算；只有單邊規格時 Cp / Pp 為 None"""
+    if lsl is None and usl is None:
+        return None
+
+    def spread(sigma):
+        if not sigma or lsl is None or usl is None:
+            return None
+        return (usl - lsl) / (6 * sigma)
+
+    def centered(sigma):
+        if not sigma:
+            return None
+        sides = []
+        if usl is not None:
+            sides.append((usl - mean) / (3 * sigma))
+        if lsl is not None:
+            sides.append((mean - lsl) / (3 * sigma))
+        return min(sides)
+
+    return {
+        'lsl': lsl, 'usl': usl,
+        'cp': spread(sigma_within), 'cpk': centered(sigma_within),
+        'pp': spread(sigma_overall), 'ppk': centered(sigma_overall),
+    }
+
+
+def _sample_indexes(size, max_points):
+    if size <= max_points:
+        return np.arange(size)
+    return np.unique(np.linspace(0, size - 1, max_points).round().astype(np.int64))
+
+
+def metric_stats(timestamps, values, window=20, lsl=None, usl=None, max_points=500):
+    """單一指標的敘述統計、管制界限、製程能力與移動平均 (NaN 不計入)"""
+    valid = ~np.isnan(values)
+    values = values[valid]
+    timestamps = timestamps[valid]
+    n = int(values.size)
+    if n == 0:
+        return {'count': 0, 'mean': None, 'std': None, 'min': None, 'max': None, 'percentiles': None,
+                'control': None, 'capability': None,
+                'rolling': {'window': window, 'timestamps': [], 'values': []}}
+
+    mean = float(values.mean())
+    std = float(values.std(ddof=1)) if n > 1 else 0.0
+    sigma_within = float(np.abs(np.diff(values)).mean() / D2) if n > 1 else 0.0
+    ucl, lcl = mean + 3 * sigma_within, mean - 3 * sigma_within
+    out_of_control = int(np.count_nonzero((values > ucl) | (values < lcl))) if sigma_within else 0
+
+    # 移動平均第 i 個值對應到視窗最後一筆的時間；點數過多時等距取樣 (移動平均本身已經平滑)
+    rolling = rolling_mean(values, window)
+    rolling_timestamps = timestamps[window - 1:]
+    picked = _sample_indexes(rolling.size, max_points)
+
+    return {
+        'count': n,
+        'mean': mean,
+        'std': std,
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'percentiles': dict(zip((f'p{p}' for p in PERCENTILES), np.percentile(values, PERCENTILES).tolist())),
+        'control': {
+            'center': mean, 'ucl': ucl, 'lcl': lcl,
+            'sigma_within': sigma_within, 'out_of_control': out_of_control,
+        },
+        'capability': capability(mean, sigma_within, std, lsl, usl),
+        'rolling': {
+            'window': window,
+            'timestamps': [value.isoformat() for value in rolling_timestamps[picked].tolist()],
+            'values': rolling[picked].tolist(),
+        },
+    }
+
+
+def correlation(metric_a, metric_b):
+    """兩個指標都有值的紀錄之間的 Pearson 相關係數；資料不足或其中一個指標沒有變異時回傳 None"""
+    both = ~np.isnan(metric_a) & ~np.isnan(metric_b)
+    if np.count_nonzero(both) < 3:
+        return None
+    x, y = metric_a[both], metric_b[both]
+    if not x.std() or not y.std():
+        return None
+    return float(np.corrcoef(x, y)[0, 1])
+
+
+def _rounded(value):
+    if isinstance(value, float):
+        return round(value, 4)
+    if isinstance(value, dict):
+        return {name: _rounded(item) for name, item in value.items()}
+    if isinstance(value, list):
+        return [_rounded(item) for item in value]
+    return value
+
+
+class WindowMemo:
+    """已結束區間的計算結果 (LRU)；每個項目附帶計算當時的資料指紋"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, fingerprint):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != fingerprint:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, fingerprint, result, max_entries):
+        with self._lock:
+            self._entries[key] = (fingerprint, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+memo = WindowMemo()
+
+
+def analyze(session, start=None, end=None, line_name=None, window=20, spec_limits=None, max_points=500,
+            max_rows=None, memo_size=256, now=None):
+    """
+    計算各產線在 [start, end) 內的統計；spec_limits 為 {指標: (lsl, usl)}。
+    end 在現在之前 (區間已結束) 時使用 / 寫入 memo；資料筆數超過 max_rows 時丟出 WindowTooLarge。
+    """
+    spec_limits = spec_limits or {}
+    # 區間指紋與各產線筆數都來自彙總表 (見 rollups.query_stats)，不必掃描原始紀錄
+    grouped = rollups.query_stats(session.connection(), start, end, line_name=line_name)
+    fingerprint = tuple(
+        (line, tuple(stats[name] for name in _FINGERPRINT_FIELDS))
+        for (line, _), stats in sorted(grouped.items()) if stats['sample_count']
+    )
+    total = sum(counts[0] for _, counts in fingerprint)
+    if max_rows and total > max_rows:
+        raise WindowTooLarge(f'區間內有 {total} 筆資料，超過單次分析的上限 {max_rows} 筆，請縮小區間')
+
+    closed = end is not None and end <= (now or datetime.utcnow())
+    key = (start, end, line_name, window, max_points,
+           tuple(sorted((metric, tuple(limits)) for metric, limits in spec_limits.items())))
+    if closed:
+        result = memo.get(key, fingerprint)
+        if result is not None:
+            return result
+
+    lines = []
+    for line, _ in fingerprint:
+        timestamps, metric_a, metric_b = load_columns(session, line, start, end)
+        entry = {'line_name': line, 'total_records': int(timestamps.size)}
+        for metric, values in zip(METRICS, (metric_a, metric_b)):
+            lsl, usl = spec_limits.get(metric, (None, None))
+            entry[metric] = metric_stats(timestamps, values, window, lsl, usl, max_points)
+        entry['correlation'] = correlation(metric_a, metric_b)
+        lines.append(_rounded(entry))
+
+    result = {
+        'from': start.isoformat() if start else None,
+        'to': end.isoformat() if end else None,
+        'closed': closed,
+        'lines': lines,
+    }
+    if closed:
+        memo.put(key, fingerprint, result, memo_size)
+    return result
@@ -2,6 +2,8 @@
 
 from flask import Blueprint
 from flask_restx import Api
+from flask_restx.representations import output_json
+from profiling import track_serialization
 from flask_cors import CORS
 
 # 從各個功能模組匯入它們自己的 Namespace
@@ -10,6 +12,9 @@ from .statistics import ns as statistics_ns
 from .charts import ns as charts_ns
 from .wastewater_reports import ns as wastewater_reports_ns
 from .auth import ns as auth_ns
+from .analysis import ns as analysis_ns
+from .jobs import ns as jobs_ns
+from .control_charts import ns as control_charts_ns
 
 # 建立一個總的 API 藍圖
 api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
@@ -18,8 +23,9 @@ api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
 CORS(api_bp, resources={
     r"/*": { # r"/*" 代表此藍圖下的所有路徑
         "origins": "http://localhost:5173",
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+        "expose_headers": ["X-Total-Count", "X-Total-Pages", "X-Page", "X-Per-Page", "ETag"], # 分頁資訊放在回應標頭；ETag 供條件式請求使用
         "supports_credentials": True
     }
 })
@@ -39,9 +45,18 @@ api = Api(api_bp,
           authorizations=authorizations,
          )
 
+@api.representation('application/json')
+def output_json_profiled(data, code, headers=None):
+    """與預設的 JSON 輸出相同，另外把編碼時間計入請求量測的 serialize"""
+    with track_serialization():
+        return output_json(data, code, headers)
+
 # 註冊所有 Namespaces，路徑由 Namespace 名稱和 @ns.route() 決定
 api.add_namespace(auth_ns)
 api.add_namespace(samples_ns)
 api.add_namespace(statistics_ns)
 api.add_namespace(charts_ns)
-api.add_namespace(wastewater_reports_ns)
\ No newline at end of file
+api.add_namespace(wastewater_reports_ns)
+api.add_namespace(analysis_ns)
+api.add_namespace(jobs_ns)
+api.add_namespace(control_charts_ns)
\ No newline at end of file
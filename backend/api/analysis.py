@@ -0,0 +1,98 @@
+# backend/api/analysis.py
+
+from flask import current_app
+from flask_restx import Namespace, Resource, fields, inputs
+from extensions import db, cache
+from cache import TAG_SAMPLES
+from .common import utc_datetime
+import analytics
+
+ns = Namespace('analysis', description='產線管制圖統計 (平均、標準差、百分位數、移動平均、Cpk、相關係數)')
+
+analysis_parser = ns.parser()
+analysis_parser.add_argument('from', type=utc_datetime, dest='start_time', help='起始時間 (含，ISO 8601)')
+analysis_parser.add_argument('to', type=utc_datetime, dest='end_time', help='結束時間 (不含，ISO 8601)；早於現在的區間結果會被保留重複使用')
+analysis_parser.add_argument('line_name', type=str, help='產線名稱篩選')
+analysis_parser.add_argument('window', type=inputs.int_range(2, 10000), default=20, help='移動平均的視窗筆數')
+analysis_parser.add_argument('max_points', type=inputs.int_range(3, 100000), help='移動平均每個指標最多回傳的點數')
+for _metric in analytics.METRICS:
+    analysis_parser.add_argument(f'{_metric}_lsl', type=float, help=f'{_metric} 的規格下限 (省略時使用 ANALYSIS_SPEC_LIMITS)')
+    analysis_parser.add_argument(f'{_metric}_usl', type=float, help=f'{_metric} 的規格上限 (省略時使用 ANALYSIS_SPEC_LIMITS)')
+
+percentiles_model = ns.model('AnalysisPercentiles', {
+    f'p{p}': fields.Float(description=f'第 {p} 百分位數') for p in analytics.PERCENTILES
+})
+control_model = ns.model('AnalysisControlLimits', {
+    'center': fields.Float(description='中心線 (平均)'),
+    'ucl': fields.Float(description='管制上限 (中心線 + 3 sigma)'),
+    'lcl': fields.Float(description='管制下限 (中心線 - 3 sigma)'),
+    'sigma_within': fields.Float(description='組內標準差 (平均移動全距 / 1.128)'),
+    'out_of_control': fields.Integer(description='超出管制界限的筆數'),
+})
+capability_model = ns.model('AnalysisCapability', {
+    'lsl': fields.Float, 'usl': fields.Float,
+    'cp': fields.Float(description='(USL - LSL) / 6 sigma_within (需要雙邊規格)'),
+    'cpk': fields.Float(description='min(USL - 平均, 平均 - LSL) / 3 sigma_within'),
+    'pp': fields.Float(description='同 Cp，以整體標準差計算'),
+    'ppk': fields.Float(description='同 Cpk，以整體標準差計算'),
+})
+rolling_model = ns.model('AnalysisRollingMean', {
+    'window': fields.Integer(description='視窗筆數'),
+    'timestamps': fields.List(fields.String, description='各點視窗最後一筆的時間'),
+    'values': fields.List(fields.Float, description='移動平均'),
+})
+metric_stats_model = ns.model('AnalysisMetricStats', {
+    'count': fields.Integer(description='有值的筆數'),
+    'mean': fields.Float, 'std': fields.Float(description='樣本標準差'),
+    'min': fields.Float, 'max': fields.Float,
+    'percentiles': fields.Nested(percentiles_model, allow_null=True),
+    'control': fields.Nested(control_model, allow_null=True),
+    'capability': fields.Nested(capability_model, allow_null=True, description='沒有規格界限時為 null'),
+    'rolling': fields.Nested(rolling_model),
+})
+line_analysis_model = ns.model('LineAnalysis', {
+    'line_name': fields.String,
+    'total_records': fields.Integer,
+    'metric_a': fields.Nested(metric_stats_model),
+    'metric_b': fields.Nested(metric_stats_model),
+    'correlation': fields.Float(description='metric_a 與 metric_b 的 Pearson 相關係數'),
+})
+analysis_model = ns.model('LineAnalysisResult', {
+    'from': fields.String, 'to': fields.String,
+    'closed': fields.Boolean(description='區間是否已結束 (結果可重複使用)'),
+    'lines': fields.List(fields.Nested(line_analysis_model)),
+})
+
+
+@ns.route('/lines')
+class LineAnalysis(Resource):
+    @cache.cached('analysis', tags=(TAG_SAMPLES,))
+    @ns.expect(analysis_parser)
+    @ns.response(200, '成功', analysis_model)
+    @ns.response(400, '區間無效或資料量超過上限')
+    def get(self):
+        """各產線的管制圖統計 (以 NumPy 向量運算計算)"""
+        args = analysis_parser.parse_args()
+        if args['start_time'] and args['end_time'] and args['start_time'] >= args['end_time']:
+            return {'message': 'from 必須早於 to'}, 400
+
+        config = current_app.config
+        spec_limits = {}
+        for metric in analytics.METRICS:
+            default_lsl, default_usl = config['ANALYSIS_SPEC_LIMITS'].get(metric, (None, None))
+            lsl = args[f'{metric}_lsl'] if args[f'{metric}_lsl'] is not None else default_lsl
+            usl = args[f'{metric}_usl'] if args[f'{metric}_usl'] is not None else default_usl
+            if lsl is not None and usl is not None and lsl >= usl:
+                return {'message': f'{metric} 的規格下限必須小於上限'}, 400
+            spec_limits[metric] = (lsl, usl)
+
+        try:
+            result = analytics.analyze(
+                db.session, args['start_time'], args['end_time'], line_name=args['line_name'],
+                window=args['window'], spec_limits=spec_limits,
+                max_points=args['max_points'] or config['CHART_MAX_POINTS'],
+                max_rows=config['ANALYSIS_MAX_ROWS'], memo_size=config['ANALYSIS_MEMO_SIZE'],
+            )
+        except analytics.WindowTooLarge as e:
+            return {'message': str(e)}, 400
+        return ns.marshal(result, analysis_model), 200
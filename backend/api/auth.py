@@ -1,57 +1,129 @@
 # backend/api/auth.py
 
 from flask_restx import Namespace, Resource, fields
-from flask_jwt_extended import create_access_token
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt_identity, jwt_required
+from sqlalchemy import select, update, or_
+from sqlalchemy.exc import IntegrityError
 from models import User
-from extensions import db
+from extensions import db, hasher
+from passwords import HashingBusy, MAX_PASSWORD_BYTES
 
 # --- Namespace and Models ---
 ns = Namespace('auth', description='使用者認證相關操作')
 
 register_model = ns.model('UserRegisterInput', {
-    'username': fields.String(required=True, description='使用者名稱'),
-    'email': fields.String(required=True, description='電子郵件'),
+    'username': fields.String(required=True, description='使用者名稱 (不可包含 @)'),
+    'email': fields.String(required=True, description='電子郵件 (必須包含 @)'),
     'password': fields.String(required=True, description='密碼'),
 })
 
 login_model = ns.model('UserLoginInput', {
-    'username': fields.String(required=True, description='使用者名稱'),
+    'username': fields.String(required=True, description='使用者名稱或電子郵件 (包含 @ 時視為電子郵件)'),
     'password': fields.String(required=True, description='密碼'),
 })
 
+token_model = ns.model('AuthTokens', {
+    'access_token': fields.String(description='短效的 access token'),
+    'refresh_token': fields.String(description='用來向 /auth/refresh 換發 access token (僅登入時回傳)'),
+})
+
+BUSY_RESPONSE = ({'message': '目前登入的人數過多，請稍後再試'}, 503, {'Retry-After': '1'})
+
 # --- API Resources ---
 @ns.route('/register')
 class UserRegister(Resource):
     @ns.expect(register_model, validate=True)
+    @ns.response(503, '密碼雜湊工作池已滿')
     def post(self):
         """註冊一個新使用者"""
         data = ns.payload
-        if User.query.filter_by(username=data['username']).first() is not None:
+        if len(data['password'].encode('utf-8')) > MAX_PASSWORD_BYTES:
+            return {'message': f'密碼不可超過 {MAX_PASSWORD_BYTES} bytes'}, 400
+        # 登入時以是否包含 @ 決定查哪個欄位：使用者名稱不可包含 @、電子郵件必須包含 @，
+        # 一個帳號的使用者名稱就不可能等於另一個帳號的電子郵件
+        if '@' in data['username']:
+            return {'message': '使用者名稱不可包含 @'}, 400
+        if '@' not in data['email']:
+            return {'message': '電子郵件格式不正確'}, 400
+
+        # 一次查詢同時檢查使用者名稱與電子郵件 (兩個欄位都有唯一索引)
+        existing = db.session.execute(
+            select(User.username, User.email)
+            .where(or_(User.username == data['username'], User.email == data['email']))
+        ).all()
+        if any(row.username == data['username'] for row in existing):
             return {'message': '此使用者名稱已被註冊'}, 400
-        if User.query.filter_by(email=data['email']).first() is not None:
+        if existing:
             return {'message': '此電子郵件已被註冊'}, 400
-            
+
         new_user = User(
             username=data['username'],
             email=data['email']
         )
-        new_user.set_password(data['password'])
-        
+        try:
+            new_user.set_password(data['password'])
+        except HashingBusy:
+            return BUSY_RESPONSE
+
         db.session.add(new_user)
-        db.session.commit()
-        
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 與另一個同時送出的註冊請求撞名 (唯一索引擋下)
+            db.session.rollback()
+            return {'message': '此使用者名稱或電子郵件已被註冊'}, 400
+
         return {'message': '使用者註冊成功'}, 201
 
 @ns.route('/login')
 class UserLogin(Resource):
     @ns.expect(login_model, validate=True)
+    @ns.response(200, '登入成功', token_model)
+    @ns.response(503, '密碼雜湊工作池已滿')
     def post(self):
-        """使用者登入並獲取 JWT"""
+        """使用者登入並獲取 JWT (access token + refresh token)"""
         data = ns.payload
-        user = User.query.filter_by(username=data['username']).first()
-        
-        if user and user.check_password(data['password']):
-            access_token = create_access_token(identity=user.id)
-            return {'access_token': access_token}, 200
-            
-        return {'message': '使用者名稱或密碼錯誤'}, 401
\ No newline at end of file
+        # 包含 @ 的以電子郵件登入，否則以使用者名稱登入 (註冊時確保兩者不會互相撞名)；
+        # 只查一個有唯一索引的欄位，找到的帳號是確定的。只取驗證需要的欄位
+        column = User.email if '@' in data['username'] else User.username
+        user = db.session.execute(
+            select(User.id, User.password_hash).where(column == data['username'])
+        ).first()
+
+        try:
+            valid = hasher.check(user.password_hash if user else None, data['password'])
+        except HashingBusy:
+            return BUSY_RESPONSE
+
+        if valid and hasher.needs_rehash(user.password_hash):
+            # 設定的 cost 調整過：趁這次拿到明文密碼時以新的 cost 重新雜湊 (忙碌時留到下次登入)
+            try:
+                new_hash = hasher.hash(data['password'])
+            except HashingBusy:
+                new_hash = None
+            if new_hash:
+                db.session.execute(update(User).where(User.id == user.id).values(password_hash=new_hash))
+                db.session.commit()
+
+        if valid:
+            identity = str(user.id)
+            return {
+                'access_token': create_access_token(identity=identity),
+                'refresh_token': create_refresh_token(identity=identity),
+            }, 200
+
+        return {'message': '使用者名稱或密碼錯誤'}, 401
+
+
+@ns.route('/refresh')
+class TokenRefresh(Resource):
+    @jwt_required(refresh=True)
+    @ns.doc(security='jsonWebToken', description='Authorization: Bearer <refresh_token>')
+    @ns.response(200, '換發成功', token_model)
+    def post(self):
+        """以 refresh token 換發新的 access token (不需要密碼，也不會計算 bcrypt)"""
+        identity = get_jwt_identity()
+        # 只以主鍵確認帳號仍然存在 (已刪除的使用者不能再換發)
+        if db.session.execute(select(User.id).where(User.id == int(identity))).first() is None:
+            return {'message': '使用者不存在'}, 401
+        return {'access_token': create_access_token(identity=identity)}, 200
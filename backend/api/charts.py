@@ -1,55 +1,93 @@
 # backend/api/charts.py
 
-from flask_restx import Namespace, Resource
+from flask import current_app
+from flask_restx import Namespace, Resource, inputs
+from sqlalchemy import select, func
 from collections import defaultdict
+from datetime import datetime
+import numpy as np
 from models import Sample
+from extensions import db, cache, sample_archive
+from cache import TAG_SAMPLES
+from .common import utc_datetime
+import downsampling
+import rollups
 
 ns = Namespace('charts', description='圖表數據相關操作')
 
+chart_parser = ns.parser()
+chart_parser.add_argument('from', type=utc_datetime, dest='start_time', help='起始時間 (含，ISO 8601)')
+chart_parser.add_argument('to', type=utc_datetime, dest='end_time', help='結束時間 (不含，ISO 8601)')
+chart_parser.add_argument('bucket', type=str, choices=downsampling.BUCKETS,
+                          help='時間分桶粒度；指定時改由彙總表取各桶平均 (桶數超過點數上限時自動改用較粗的粒度)')
+chart_parser.add_argument('metric', type=str, default='metric_a', choices=('metric_a', 'metric_b'), help='要繪製的指標')
+chart_parser.add_argument('max_points', type=inputs.int_range(3, 100000),
+                          help='每條產線最多回傳的點數 (以 LTTB 降採樣；指定區間或分桶時預設為 CHART_MAX_POINTS)')
+
+# 每個分桶粒度的秒數 (月以 31 天估計)，用來估計區間內的桶數
+_BUCKET_SECONDS = {'minute': 60, 'hour': 3600, 'day': 86400, 'month': 31 * 86400}
+# 原始區間查詢每次從資料庫取回的筆數
+RAW_CHUNK_SIZE = 50000
+
+# 定義每條線的顏色
+colors = {
+    '產線A': 'rgba(255, 99, 132, 1)',
+    '產線B': 'rgba(54, 162, 235, 1)',
+    '產線C': 'rgba(75, 192, 192, 1)',
+}
+
 @ns.route('/line-comparison')
 class LineComparisonChart(Resource):
+    @cache.cached('charts', tags=(TAG_SAMPLES,))
+    @ns.expect(chart_parser)
     def get(self):
         """提供產線交叉比對的折線圖數據"""
-        
-        # 為了示範，我們先抓取最新的 30 筆資料
-        records = Sample.query.order_by(Sample.timestamp.desc()).limit(30).all()
-        records.reverse() # 將資料反轉，讓時間從左到右遞增
+        args = chart_parser.parse_args()
+        metric = args['metric']
+        max_points = args['max_points']
+
+        if args['bucket'] or args['start_time'] or args['end_time']:
+            # 分桶或時間區間查詢的點數都可能非常大 (一年的分鐘桶約 52 萬點)，一律加上點數上限
+            max_points = max_points or current_app.config['CHART_MAX_POINTS']
+        if args['bucket']:
+            series = _bucketed_series(args, max_points)
+        elif args['start_time'] or args['end_time']:
+            series = _raw_series(args, max_points)
+        else:
+            # 未指定區間時維持原本的行為：最新的 30 筆資料
+            records = db.session.execute(
+                select(Sample.timestamp, Sample.line_name, getattr(Sample, metric))
+                .order_by(Sample.timestamp.desc(), Sample.id.desc())
+                .limit(30)
+            ).all()
+            series = defaultdict(list)
+            for timestamp, line_name, value in reversed(records):
+                series[line_name].append((timestamp.strftime('%H:%M:%S'), _epoch(timestamp), value))
 
-        if not records:
+        if not series:
             return {'labels': [], 'datasets': []}
 
+        if max_points:
+            # 分桶粒度只能粗估桶數，最後再以 LTTB 確保不超過上限 (原始區間已在 _raw_series 降採樣)
+            series = {line_name: _downsample(points, max_points) for line_name, points in series.items()}
+
         # --- 資料轉換 ---
-        # 我們需要將資料從 [row1, row2, ...] 的格式，轉換成 Chart.js 需要的格式
-        
-        labels = [] # X 軸的標籤 (時間)
-        
-        # 用一個字典來按產線分組數據
-        # defaultdict 讓我們在key不存在時，能自動建立一個空列表
-        data_by_line = defaultdict(list)
-
-        for record in records:
-            # 格式化時間作為 X 軸標籤
-            label = record.timestamp.strftime('%H:%M:%S')
-            labels.append(label)
-            
-            # 將各產線的指標A數據分別存起來
-            # 這裡我們假設所有產線在每個時間點都有數據，實際情況可能更複雜
-            data_by_line[record.line_name].append(record.metric_a)
-
-        # 定義每條線的顏色
-        colors = {
-            '產線A': 'rgba(255, 99, 132, 1)',
-            '產線B': 'rgba(54, 162, 235, 1)',
-            '產線C': 'rgba(75, 192, 192, 1)',
-        }
+        # 所有產線共用同一條 X 軸：取各線時間點的聯集並排序，
+        # 某條線在某個時間點沒有資料時補 None (Chart.js 會留空)，避免各線錯位
+        label_order = {}
+        for points in series.values():
+            for label, sort_key, _ in points:
+                label_order[label] = sort_key
+        labels = sorted(label_order, key=label_order.get)
 
         # 組合 Chart.js 需要的 datasets 格式
         datasets = []
-        for line_name, data_points in data_by_line.items():
+        for line_name, points in series.items():
+            values = {label: value for label, _, value in points}
             color = colors.get(line_name, 'rgba(201, 203, 207, 1)') # 如果產線沒有預設顏色，給一個灰色
             datasets.append({
                 'label': line_name,
-                'data': data_points,
+                'data': [values.get(label) for label in labels],
                 'borderColor': color,
                 'backgroundColor': color.replace('1)', '0.5)'), # 將顏色變為半透明作為背景色
                 'tension': 0.1
@@ -58,4 +96,134 @@ class LineComparisonChart(Resource):
         return {
             'labels': labels,
             'datasets': datasets,
-        }
\ No newline at end of file
+        }
+
+
+def _time_filters(stmt, args):
+    if args['start_time']:
+        stmt = stmt.where(Sample.timestamp >= args['start_time'])
+    if args['end_time']:
+        stmt = stmt.where(Sample.timestamp < args['end_time'])
+    return stmt
+
+
+def _bucketed_series(args, max_points):
+    """依 (時間桶, 產線) 取平均，回傳 {產線: [(標籤, 排序鍵, 值), ...]}
+    資料來自能涵蓋查詢區間的最粗彙總表 (見 rollups.query_stats)，長區間也不必掃描原始紀錄；
+    區間內的桶數超過 max_points 時先改用較粗的粒度 (見 _coarsen_bucket)，不會讀出數十萬個分鐘桶。"""
+    bucket = _coarsen_bucket(args, max_points)
+    max_grain = bucket if bucket in rollups.GRAINS else rollups.GRAINS[-1]
+    grouped = rollups.query_stats(
+        db.session.connection(), args['start_time'], args['end_time'], max_grain=max_grain, group_grain=bucket
+    )
+
+    series = defaultdict(list)
+    for (line_name, bucket_start), stats in sorted(grouped.items(), key=lambda item: item[0][1]):
+        count = stats[f"count_{args['metric']}"]
+        if count:
+            value = stats[f"sum_{args['metric']}"] / count
+            series[line_name].append((bucket_start.isoformat(), _epoch(bucket_start), value))
+    return series
+
+
+def _coarsen_bucket(args, max_points):
+    """回傳指定粒度或更粗、桶數不超過 max_points 的最細粒度 (都超過時用最粗的 month)"""
+    start, end = args['start_time'], args['end_time']
+    if start is None or end is None:
+        first, last = _data_bounds()
+        start, end = start or first, end or last
+    if start is None or end is None or end <= start:
+        return args['bucket']
+    span = (end - start).total_seconds()
+    for bucket in downsampling.BUCKETS[downsampling.BUCKETS.index(args['bucket']):]:
+        if span / _BUCKET_SECONDS[bucket] + 1 <= max_points:
+            return bucket
+    return downsampling.BUCKETS[-1]
+
+
+def _data_bounds():
+    """全部紀錄 (含封存區) 的最早 / 最晚時間；MIN / MAX 各自一個子查詢才能直接走 timestamp 索引"""
+    first, last = db.session.execute(select(
+        select(func.min(Sample.timestamp)).scalar_subquery(),
+        select(func.max(Sample.timestamp)).scalar_subquery(),
+    )).one()
+    segments = sample_archive.segments()
+    if segments:
+        archived_first = datetime.fromisoformat(segments[0]['min_timestamp'])
+        archived_last = datetime.fromisoformat(max(entry['max_timestamp'] for entry in segments))
+        first = min(first, archived_first) if first else archived_first
+        last = max(last, archived_last) if last else archived_last
+    return first, last
+
+
+def _raw_series(args, max_points):
+    """
+    未分桶的區間查詢：以 yield_per 分批把各產線的 (時間, 值, id) 讀進 NumPy 陣列 (區間涵蓋封存資料時一併讀取)，
+    以 lttb_indices 降到 max_points 點後才建立回傳的 [(標籤, 排序鍵, 值), ...]，不為每一筆紀錄建立 Python 物件。
+    """
+    metric = args['metric']
+    metric_column = getattr(Sample, metric)
+    stmt = _time_filters(
+        select(Sample.line_name, Sample.timestamp, metric_column, Sample.id)
+        .where(metric_column.is_not(None))
+        .order_by(Sample.timestamp.asc(), Sample.id.asc()),
+        args,
+    )
+
+    parts = defaultdict(list)  # 產線 -> [(timestamps, values, ids), ...]
+    result = db.session.execute(stmt.execution_options(yield_per=RAW_CHUNK_SIZE))
+    try:
+        for rows in result.partitions():
+            line_names, timestamps, values, ids = zip(*rows)
+            _add_parts(parts, np.array(line_names), np.array(timestamps, dtype='datetime64[us]'),
+                       np.array(values, dtype=np.float64), np.array(ids, dtype=np.int64))
+    finally:
+        result.close()
+
+    # 封存紀錄 (manifest 剪枝後只開啟有交集的片段) 排在前面，之後依 (時間, id) 重新排序
+    archived = sample_archive.select(args['start_time'], args['end_time'])
+    has_archived = bool(archived['id'].size)
+    if has_archived:
+        present = ~np.isnan(archived[metric])
+        archived_parts = defaultdict(list)
+        _add_parts(archived_parts, archived['line_name'][present], archived['timestamp'][present],
+                   archived[metric][present], archived['id'][present])
+        for line_name, line_parts in archived_parts.items():
+            parts[line_name][:0] = line_parts
+
+    series = {}
+    for line_name, line_parts in parts.items():
+        timestamps, values, ids = (np.concatenate(column) for column in zip(*line_parts))
+        if has_archived:
+            order = np.lexsort((ids, timestamps))
+            timestamps, values = timestamps[order], values[order]
+        epochs = timestamps.astype(np.int64) / 1e6
+        kept = downsampling.lttb_indices(epochs, values, max_points)
+        series[line_name] = [
+            (timestamps[index].item().isoformat(), float(epochs[index]), float(values[index])) for index in kept
+        ]
+    return series
+
+
+def _add_parts(parts, line_names, timestamps, values, ids):
+    """把一批紀錄依產線切開，加進 parts[產線]"""
+    for line_name in np.unique(line_names):
+        mask = line_names == line_name
+        parts[str(line_name)].append((timestamps[mask], values[mask], ids[mask]))
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch(timestamp):
+    """naive UTC datetime -> epoch 秒 (作為排序鍵與 LTTB 的 X 座標)"""
+    return (timestamp - _EPOCH).total_seconds()
+
+
+def _downsample(points, max_points):
+    """以 LTTB 將單一產線的點數降到 max_points 以內"""
+    points = [point for point in points if point[2] is not None]
+    if len(points) <= max_points:
+        return points
+    kept = downsampling.lttb([(sort_key, value, index) for index, (_, sort_key, value) in enumerate(points)], max_points)
+    return [points[index] for _, _, index in kept]
@@ -0,0 +1,25 @@
+# backend/api/common.py
+# 各個 Namespace 共用的請求參數型別
+
+from datetime import timezone
+from flask_restx import inputs
+
+
+def utc_datetime(value):
+    """解析 ISO 8601 時間；帶時區時轉成 UTC 並去掉時區 (資料庫內一律存 UTC naive datetime)"""
+    parsed = inputs.datetime_from_iso8601(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+utc_datetime.__schema__ = {'type': 'string', 'format': 'date-time'}
+
+
+def id_list(value):
+    """請求 body 中的 id 列表：必須是非空的整數列表 (不接受布林值與字串)，否則拋出 ValueError"""
+    if not isinstance(value, list) or not value:
+        raise ValueError('ids 必須是非空的整數列表')
+    if any(isinstance(item, bool) or not isinstance(item, int) for item in value):
+        raise ValueError('ids 必須是整數')
+    return value
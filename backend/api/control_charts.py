@@ -0,0 +1,116 @@
+# backend/api/control_charts.py
+
+from flask import current_app
+from flask_restx import Namespace, Resource, fields, inputs
+from sqlalchemy import select, func
+from models import Sample, ControlChartAlert
+from extensions import db
+import control_charts
+
+ns = Namespace('control-charts', description='串流管制圖：各產線的即時管制界限與警報 (Western Electric 規則、EWMA、規格界限)')
+
+window_model = ns.model('ControlChartWindow', {
+    'count': fields.Integer(description='視窗內的筆數'),
+    'mean': fields.Float, 'sigma': fields.Float,
+})
+metric_state_model = ns.model('ControlChartMetric', {
+    'count': fields.Integer(description='累計筆數 (有值的紀錄)'),
+    'ready': fields.Boolean(description='累計筆數已達 CONTROL_MIN_SAMPLES，開始評估規則'),
+    'mean': fields.Float(description='中心線 (累計平均)'),
+    'sigma': fields.Float(description='累計標準差'),
+    'ucl': fields.Float(description='管制上限 (中心線 + 3 sigma)'),
+    'lcl': fields.Float(description='管制下限 (中心線 - 3 sigma)'),
+    'ewma': fields.Float,
+    'ewma_ucl': fields.Float, 'ewma_lcl': fields.Float,
+    'window': fields.Nested(window_model, description='最近 CONTROL_WINDOW 筆的移動視窗'),
+    'active_rules': fields.List(fields.String, description='目前觸發中的規則'),
+})
+line_state_model = ns.model('ControlChartLine', {
+    'line_name': fields.String,
+    'metric_a': fields.Nested(metric_state_model),
+    'metric_b': fields.Nested(metric_state_model),
+})
+lines_model = ns.model('ControlChartLines', {
+    'last_sample_id': fields.Integer(description='已處理到的紀錄 id'),
+    'latest_sample_id': fields.Integer(description='目前最新的紀錄 id (大於 last_sample_id 代表還有紀錄尚未處理)'),
+    'rules': fields.Raw(description='啟用的規則 {名稱: 說明}'),
+    'lines': fields.List(fields.Nested(line_state_model)),
+})
+alert_model = ns.model('ControlChartAlert', {
+    'id': fields.Integer,
+    'line_name': fields.String,
+    'metric': fields.String(enum=list(control_charts.METRICS)),
+    'rule': fields.String(enum=list(control_charts.RULES)),
+    'description': fields.String(attribute=lambda alert: control_charts.RULES.get(alert.rule)),
+    'sample_id': fields.Integer,
+    'sample_timestamp': fields.DateTime(dt_format='iso8601'),
+    'value': fields.Float(description='觸發時的值 (ewma 規則為 EWMA 值)'),
+    'center_line': fields.Float,
+    'sigma': fields.Float,
+    'created_at': fields.DateTime(dt_format='iso8601'),
+})
+
+lines_parser = ns.parser()
+lines_parser.add_argument('line_name', type=str, help='產線名稱篩選')
+
+alerts_parser = ns.parser()
+alerts_parser.add_argument('line_name', type=str, help='產線名稱篩選')
+alerts_parser.add_argument('metric', type=str, choices=control_charts.METRICS, help='指標篩選')
+alerts_parser.add_argument('rule', type=str, choices=tuple(control_charts.RULES), help='規則篩選')
+alerts_parser.add_argument('after', type=inputs.natural, help='只回傳 id 大於這個值的警報 (由舊到新)；輪詢時帶上一次收到的最大 id')
+alerts_parser.add_argument('limit', type=inputs.int_range(1, 500), default=100, help='最多回傳筆數 (省略 after 時由新到舊)')
+
+
+def _sync():
+    """先補上尚未處理的紀錄 (每次請求最多 CONTROL_SYNC_MAX_ROWS 筆)"""
+    control_charts.monitor.sync(db.session, max_rows=current_app.config['CONTROL_SYNC_MAX_ROWS'])
+
+
+@ns.route('/lines')
+class ControlChartLines(Resource):
+
+    @ns.expect(lines_parser)
+    @ns.marshal_with(lines_model)
+    def get(self):
+        """各產線目前的管制界限、EWMA、移動視窗與觸發中的規則"""
+        args = lines_parser.parse_args()
+        _sync()
+        result = control_charts.monitor.lines(args['line_name'])
+        result['latest_sample_id'] = db.session.execute(select(func.max(Sample.id))).scalar() or 0
+        result['rules'] = {rule: control_charts.RULES[rule] for rule in control_charts.monitor.settings.rules}
+        return result
+
+
+@ns.route('/lines/<string:line_name>/reset')
+class ControlChartLineReset(Resource):
+
+    @ns.response(200, '已清除，之後的紀錄重新建立基準')
+    @ns.response(404, '這條產線還沒有統計資料')
+    def post(self, line_name):
+        """清除一條產線的基準 (製程調整後使用)；已記錄的警報保留"""
+        if not control_charts.monitor.reset(db.session, line_name):
+            ns.abort(404, '這條產線還沒有統計資料')
+        return {'message': f'已清除 {line_name} 的管制圖基準'}
+
+
+@ns.route('/alerts')
+class ControlChartAlertList(Resource):
+
+    @ns.expect(alerts_parser)
+    @ns.marshal_list_with(alert_model)
+    def get(self):
+        """管制圖警報 (規則由未觸發變為觸發時記錄一筆)"""
+        args = alerts_parser.parse_args()
+        _sync()
+        stmt = select(ControlChartAlert).limit(args['limit'])
+        if args['after'] is not None:
+            stmt = stmt.where(ControlChartAlert.id > args['after']).order_by(ControlChartAlert.id.asc())
+        else:
+            stmt = stmt.order_by(ControlChartAlert.id.desc())
+        if args['line_name']:
+            stmt = stmt.where(ControlChartAlert.line_name == args['line_name'])
+        if args['metric']:
+            stmt = stmt.where(ControlChartAlert.metric == args['metric'])
+        if args['rule']:
+            stmt = stmt.where(ControlChartAlert.rule == args['rule'])
+        return db.session.execute(stmt).scalars().all()
@@ -0,0 +1,158 @@
+# backend/api/jobs.py
+
+import os
+from flask import send_file, url_for
+from flask_restx import Namespace, Resource, fields, inputs
+from sqlalchemy import select
+from werkzeug.datastructures import FileStorage
+from models import Job
+from extensions import db
+import jobs
+
+ns = Namespace('jobs', description='背景工作 (大量匯入 / 匯出 / 批次刪除 / 重建)：建立後由 flask worker 執行')
+
+job_model = ns.model('Job', {
+    'id': fields.String(readonly=True),
+    'type': fields.String(attribute='job_type', enum=list(jobs.JOB_TYPES)),
+    'status': fields.String(enum=list(jobs.STATUSES)),
+    'params': fields.Raw(description='工作參數 (驗證後的值)'),
+    'progress': fields.Float(description='進度 (0 ~ 1)'),
+    'progress_message': fields.String,
+    'result': fields.Raw(description='工作結果 (成功時)'),
+    'has_result_file': fields.Boolean(attribute=lambda job: bool(job.result_file),
+                                      description='可由 GET /jobs/{id}/result 下載結果檔'),
+    'error': fields.String(description='失敗原因'),
+    'cancel_requested': fields.Boolean,
+    'worker_id': fields.String,
+    'created_at': fields.DateTime(dt_format='iso8601'),
+    'started_at': fields.DateTime(dt_format='iso8601'),
+    'finished_at': fields.DateTime(dt_format='iso8601'),
+})
+
+job_input_model = ns.model('JobInput', {
+    'type': fields.String(required=True, enum=[name for name, spec in jobs.JOB_TYPES.items() if not spec.upload],
+                          description='; '.join(f'{spec.name}: {spec.description}' for spec in jobs.JOB_TYPES.values()
+                                                if not spec.upload)),
+    'params': fields.Raw(description='工作參數，例如 export-samples 的 {"line_name", "start_time", "end_time", "format"}'),
+})
+
+list_parser = ns.parser()
+list_parser.add_argument('status', type=str, choices=jobs.STATUSES, help='狀態篩選')
+list_parser.add_argument('type', type=str, dest='job_type', choices=tuple(jobs.JOB_TYPES), help='工作類型篩選')
+list_parser.add_argument('limit', type=inputs.int_range(1, 200), default=50, help='最多回傳筆數 (由新到舊)')
+
+upload_parser = ns.parser()
+upload_parser.add_argument('file', location='files', type=FileStorage, required=True, help='CSV (UTF-8) 或 XLSX 檔案，每一列是一個檢測項目')
+upload_parser.add_argument('format', location='form', type=str, choices=('csv', 'xlsx'), help='檔案格式 (省略時依副檔名判斷)')
+
+
+def _get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None:
+        ns.abort(404, '找不到這個工作')
+    return job
+
+
+def _accepted(job):
+    return ns.marshal(job, job_model), 202, {'Location': url_for('api.jobs_job_resource', job_id=job.id)}
+
+
+@ns.route('/')
+class JobList(Resource):
+
+    @ns.expect(list_parser)
+    @ns.marshal_list_with(job_model)
+    def get(self):
+        """列出背景工作 (由新到舊)"""
+        args = list_parser.parse_args()
+        stmt = select(Job).order_by(Job.created_at.desc()).limit(args['limit'])
+        if args['status']:
+            stmt = stmt.where(Job.status == args['status'])
+        if args['job_type']:
+            stmt = stmt.where(Job.job_type == args['job_type'])
+        return db.session.execute(stmt).scalars().all()
+
+    @ns.expect(job_input_model)
+    @ns.response(202, '已排入佇列', job_model)
+    @ns.response(400, '工作類型或參數不正確')
+    def post(self):
+        """建立背景工作 (立即回應，進度以 GET /jobs/{id} 查詢)"""
+        payload = ns.payload or {}
+        spec = jobs.JOB_TYPES.get(payload.get('type'))
+        if spec is not None and spec.upload:
+            return {'message': f'{spec.name} 需要上傳檔案，請使用 POST /jobs/report-imports'}, 400
+        try:
+            job = jobs.submit(db.session, payload.get('type'), payload.get('params'))
+        except jobs.InvalidParams as e:
+            return {'message': str(e)}, 400
+        db.session.commit()
+        return _accepted(job)
+
+
+@ns.route('/report-imports')
+class JobReportImport(Resource):
+
+    @ns.expect(upload_parser)
+    @ns.response(202, '已排入佇列', job_model)
+    @ns.response(400, '檔案格式不支援')
+    def post(self):
+        """上傳 CSV / XLSX 檔案，以背景工作匯入廢水報告 (大檔案請使用這個 API，而不是 /wastewater-reports/import)"""
+        args = upload_parser.parse_args()
+        upload = args['file']
+        file_format = (args['format'] or (upload.filename or '').rsplit('.', 1)[-1]).lower()
+        if file_format not in ('csv', 'xlsx', 'xlsm'):
+            return {'message': '只支援 .csv 與 .xlsx 檔案'}, 400
+
+        job_id = jobs.new_id()
+        filename = f'upload.{file_format}'
+        directory = jobs.job_directory(job_id)
+        os.makedirs(directory, exist_ok=True)
+        upload.save(os.path.join(directory, filename))
+        job = jobs.submit(db.session, 'import-reports', {
+            'file': filename, 'filename': upload.filename or filename, 'format': args['format'],
+        }, job_id=job_id)
+        db.session.commit()
+        return _accepted(job)
+
+
+@ns.route('/<string:job_id>')
+class JobResource(Resource):
+
+    @ns.marshal_with(job_model)
+    @ns.response(404, '找不到這個工作')
+    def get(self, job_id):
+        """查詢工作的狀態與進度"""
+        return _get_job(job_id)
+
+
+@ns.route('/<string:job_id>/cancel')
+class JobCancel(Resource):
+
+    @ns.response(202, '已受理 (排隊中的工作直接取消；執行中的工作在下次回報進度時停止)', job_model)
+    @ns.response(404, '找不到這個工作')
+    @ns.response(409, '工作已結束')
+    def post(self, job_id):
+        """取消工作"""
+        _get_job(job_id)
+        accepted = jobs.request_cancel(db.session, job_id)
+        db.session.commit()
+        if not accepted:
+            return {'message': '工作已結束，無法取消'}, 409
+        return ns.marshal(db.session.get(Job, job_id, populate_existing=True), job_model), 202
+
+
+@ns.route('/<string:job_id>/result')
+class JobResult(Resource):
+
+    @ns.produces(['application/x-ndjson', 'text/csv'])
+    @ns.response(404, '找不到這個工作，或工作沒有結果檔')
+    @ns.response(409, '工作尚未成功完成')
+    def get(self, job_id):
+        """下載工作的結果檔 (例如 export-samples 的匯出檔)"""
+        job = _get_job(job_id)
+        if job.status != 'succeeded':
+            return {'message': f'工作狀態為 {job.status}，尚無結果'}, 409
+        path = jobs.result_path(job)
+        if path is None or not os.path.exists(path):
+            return {'message': '這個工作沒有結果檔'}, 404
+        return send_file(path, mimetype=job.result_mimetype, as_attachment=True, download_name=job.result_file)
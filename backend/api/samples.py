@@ -1,8 +1,23 @@
 # backend/api/samples.py (全新內容)
 
-from flask_restx import Namespace, Resource, fields
+from flask import Response, current_app, request, stream_with_context
+from flask_restx import Namespace, Resource, fields, inputs
+from sqlalchemy import and_, tuple_
+from datetime import datetime
+import base64
+import binascii
+import heapq
+import json
+from itertools import islice
 from models import Sample # 從 models.py 匯入我們的 Sample 模型
-from extensions import db
+from .common import utc_datetime, id_list
+from extensions import db, sample_archive
+import aggregates
+import archive
+import batch_delete
+import fast_json
+import ingest
+import sample_export
 
 # 1. 建立一個新的 Namespace，專門給 sample 功能使用
 ns = Namespace('samples', description='產線紀錄相關操作')
@@ -22,12 +37,14 @@ sample_model = ns.model('SampleModel', {
 # 3. 定義列表的完整輸出模型 (包含分頁資訊)
 #    我們暫時先回傳假的分頁資訊
 pagination_model = ns.model('PaginationModel', {
-    'total_items': fields.Integer(default=0),
-    'total_pages': fields.Integer(default=0),
-    'current_page': fields.Integer(default=1),
+    'total_items': fields.Integer(description='總筆數 (cursor 模式下只有 with_total=true 時才會計算)'),
+    'total_pages': fields.Integer(description='總頁數 (cursor 模式下只有 with_total=true 時才會計算)'),
+    'current_page': fields.Integer(description='目前頁碼 (僅 offset 模式)'),
     'per_page': fields.Integer(default=20),
     'has_next': fields.Boolean(default=False),
-    'has_prev': fields.Boolean(default=False)
+    'has_prev': fields.Boolean(default=False),
+    'next_cursor': fields.String(description='下一頁的 cursor (僅 cursor 模式)'),
+    'prev_cursor': fields.String(description='上一頁的 cursor (僅 cursor 模式)'),
 })
 
 sample_list_model = ns.model('SampleListModel', {
@@ -35,19 +52,61 @@ sample_list_model = ns.model('SampleListModel', {
     'pagination': fields.Nested(pagination_model)
 })
 
+batch_delete_model = ns.model('BatchDeleteInput', {
+    'ids': fields.List(fields.Integer, description='要刪除的紀錄 ID 列表'),
+    'line_name': fields.String(description='未提供 ids 時：依產線刪除'),
+    'start_time': fields.DateTime(dt_format='iso8601', description='未提供 ids 時：起始時間 (含)'),
+    'end_time': fields.DateTime(dt_format='iso8601', description='未提供 ids 時：結束時間 (不含)'),
+})
+
+# 篩選條件：列表、匯出等所有讀取路徑共用同一組參數
+filter_parser = ns.parser()
+filter_parser.add_argument('line_name', type=str, help='產線名稱篩選') # <-- 新增篩選參數
+filter_parser.add_argument('start_time', type=utc_datetime, help='起始時間 (含，ISO 8601)；區間涵蓋已封存的資料時一併讀取封存區 (未指定時間區間時：匯出包含全部封存資料，列表只列熱資料表)')
+filter_parser.add_argument('end_time', type=utc_datetime, help='結束時間 (不含，ISO 8601)')
+
 # 更新請求解析器，加入排序相關參數
-parser = ns.parser()
+parser = filter_parser.copy()
 parser.add_argument('page', type=int, default=1, help='頁碼')
 parser.add_argument('per_page', type=int, default=5, help='每頁筆數')
 parser.add_argument('sort_by', type=str, default='timestamp', help='排序欄位')
 parser.add_argument('order', type=str, default='desc', help='排序順序 (asc/desc)')
-parser.add_argument('line_name', type=str, help='產線名稱篩選') # <-- 新增篩選參數
+parser.add_argument('pagination', type=str, default='offset', choices=('offset', 'cursor'), help='分頁模式 (offset/cursor)')
+parser.add_argument('cursor', type=str, help='cursor 模式下的 next_cursor / prev_cursor (帶入時自動使用 cursor 模式)')
+parser.add_argument('with_total', type=inputs.boolean, default=False, help='cursor 模式下是否計算總筆數')
+parser.add_argument('format', type=str, default='rows', choices=('rows', 'columnar'),
+                    help='data 的格式：rows (物件陣列) 或 columnar ({欄位: [值, ...]}，適合圖表)')
+
+# 可排序的欄位；每個欄位都有 (欄位, id) 與 (line_name, 欄位, id) 的複合索引 (見 models.Sample)
+SORTABLE_COLUMNS = ('id', 'line_name', 'product_name', 'timestamp', 'metric_a', 'metric_b', 'operator')
+
+export_parser = filter_parser.copy()
+export_parser.add_argument('format', type=str, default='ndjson', choices=('ndjson', 'csv'), help='匯出格式 (ndjson/csv)')
+
+# 列表與匯出只選取這些欄位 (Row tuple)，不建立 ORM 物件；篩選條件與匯出的讀取見 sample_export.py
+SAMPLE_COLUMNS = sample_export.SAMPLE_COLUMNS
+apply_filters = sample_export.apply_filters
+
+encode_sample = fast_json.row_encoder(sample_model)
+encode_pagination = fast_json.row_encoder(pagination_model)
+
+
+def _archived_columns(args):
+    return sample_archive.select(args.get('start_time'), args.get('end_time'), args.get('line_name'))
+
+
+def _sort_key(sort_by):
+    """與 _ordering 相同的排序鍵 (NULL 最小，同值依 id)，用來合併熱資料表與封存區各自排序好的結果"""
+    def key(row):
+        value = getattr(row, sort_by)
+        return (value is not None, value if value is not None else 0, row.id)
+    return key
 
 
 @ns.route('/')
 class SampleList(Resource):
     
-    @ns.marshal_with(sample_list_model)
+    @fast_json.documented(sample_list_model)
     @ns.expect(parser)
     def get(self):
         """獲取產線紀錄列表 (支援分頁、排序與篩選)"""
@@ -56,22 +115,28 @@ class SampleList(Resource):
         per_page = args['per_page']
         sort_by_column_name = args['sort_by']
         order_direction = args['order']
-        line_name_filter = args['line_name'] # <-- 取得篩選參數值
-
-        # 基礎查詢
-        base_query = Sample.query
 
-        # 如果有提供產線名稱篩選，則加入 filter 條件
-        if line_name_filter:
-            base_query = base_query.filter(Sample.line_name == line_name_filter)
+        # 基礎查詢，並套用產線名稱 / 時間區間篩選
+        base_query = apply_filters(Sample.query.with_entities(*SAMPLE_COLUMNS), args)
             
-        # 動態排序邏輯
-        sort_column = getattr(Sample, sort_by_column_name, Sample.timestamp)
-        
-        if order_direction.lower() == 'asc':
-            order_logic = sort_column.asc()
-        else:
+        # 動態排序邏輯 (不在白名單內的欄位一律退回 timestamp)
+        if sort_by_column_name not in SORTABLE_COLUMNS:
+            sort_by_column_name = 'timestamp'
+        sort_column = getattr(Sample, sort_by_column_name)
+        descending = order_direction.lower() != 'asc'
+
+        archived = _archived_columns(args) if sample_export.reads_archive(args, require_window=True) else None
+        if args['pagination'] == 'cursor' or args['cursor']:
+            return _render_page(_cursor_page(base_query, sort_by_column_name, descending, per_page, args, archived), args)
+        if archived is not None:
+            return _render_page(
+                _merged_offset_page(base_query, sort_by_column_name, descending, page, per_page, archived), args
+            )
+
+        if descending:
             order_logic = sort_column.desc()
+        else:
+            order_logic = sort_column.asc()
             
         # 將排序與分頁應用到查詢中
         pagination_obj = base_query.order_by(order_logic).paginate(
@@ -93,24 +158,290 @@ class SampleList(Resource):
             }
         }
         
-        return response_data, 200
-    @ns.doc(body=ns.model('BatchDeleteInput', {
-        'ids': fields.List(fields.Integer, required=True, description='要刪除的紀錄 ID 列表')
-    }))
+        return _render_page(response_data, args)
+    @ns.expect(batch_delete_model)
+    @ns.response(200, '刪除完成')
+    @ns.response(400, '沒有提供 ids 或篩選條件，或 ids 不是整數列表')
+    @ns.response(404, '找不到對應的紀錄')
+    @ns.response(409, '範圍涵蓋已封存的紀錄 (封存區唯讀，整個請求不執行)')
+    @ns.response(413, '超過單次請求可刪除的筆數上限 (請改用背景工作 delete-samples)')
     def delete(self):
-        """批次刪除多筆產線紀錄"""
+        """批次刪除產線紀錄 (依 id 列表，或依產線 / 時間區間；分批在短交易中刪除)"""
         # ns.payload 會自動解析請求 body 中的 JSON 資料
-        ids_to_delete = ns.payload.get('ids')
-
-        if not ids_to_delete:
-            # 如果沒有提供 ids，回傳一個錯誤請求
-            return {'message': '請提供要刪除的 ID 列表'}, 400
+        payload = ns.payload or {}
+        ids_to_delete = payload.get('ids')
+        max_rows = current_app.config['SAMPLE_DELETE_MAX_ROWS']
 
-        # 使用 SQLAlchemy 的 in_ 運算子來一次刪除所有對應的紀錄
-        num_deleted = db.session.query(Sample).filter(Sample.id.in_(ids_to_delete)).delete(synchronize_session=False)
-        db.session.commit()
+        if ids_to_delete is not None:
+            try:
+                ids_to_delete = id_list(ids_to_delete)
+            except ValueError as e:
+                return {'message': str(e)}, 400
+            if len(ids_to_delete) > max_rows:
+                return {'message': f'單次最多只能刪除 {max_rows} 筆，請改用背景工作 (POST /jobs，type=delete-samples)'}, 413
+            num_deleted = batch_delete.delete_sample_ids(db.session, ids_to_delete)
+        else:
+            try:
+                filters = {name: payload.get(name) for name in ('line_name', 'start_time', 'end_time')}
+                for name in ('start_time', 'end_time'):
+                    filters[name] = utc_datetime(filters[name]) if filters[name] else None
+            except ValueError:
+                return {'message': 'start_time / end_time 必須是 ISO 8601 時間'}, 400
+            if not any(filters.values()):
+                # 如果沒有提供 ids 或篩選條件，回傳一個錯誤請求
+                return {'message': '請提供要刪除的 ID 列表，或 line_name / start_time / end_time 篩選條件'}, 400
+            try:
+                batch_delete.check_not_archived(**filters)
+            except batch_delete.ArchivedRangeError as e:
+                return {'message': str(e)}, 409
+            if batch_delete.count_samples(db.session, **filters) > max_rows:
+                return {'message': f'符合條件的紀錄超過 {max_rows} 筆，請改用背景工作 (POST /jobs，type=delete-samples)'}, 413
+            num_deleted = batch_delete.delete_sample_range(
+                db.session, **filters, batch_size=current_app.config['DELETE_BATCH_SIZE']
+            )
 
         if num_deleted > 0:
-            return {'message': f'成功刪除 {num_deleted} 筆紀錄'}, 200
+            return {'message': f'成功刪除 {num_deleted} 筆紀錄', 'deleted': num_deleted}, 200
         else:
-            return {'message': '找不到對應的紀錄可供刪除'}, 404
+            return {'message': '找不到對應的紀錄可供刪除', 'deleted': 0}, 404
+
+
+@ns.route('/export')
+class SampleExport(Resource):
+
+    @ns.expect(export_parser)
+    @ns.produces(['application/x-ndjson', 'text/csv'])
+    def get(self):
+        """以串流方式匯出產線紀錄 (NDJSON / CSV)，適合大量資料的批次抽取"""
+        args = export_parser.parse_args()
+        extension, mimetype = sample_export.FORMATS[args['format']]
+        body = sample_export.encode(sample_export.batches(args), args['format'])
+
+        filename = f'samples.{extension}'
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'},
+        )
+
+
+
+def _render_page(page, args):
+    """以快速路徑序列化列表回應 (輸出與 sample_list_model 相同)"""
+    records = [encode_sample(row) for row in page['data']]
+    pagination = encode_pagination(page['pagination'])
+    if args['format'] == 'columnar':
+        return fast_json.response({'data': fast_json.columnar(records, sample_model), 'pagination': pagination})
+    return fast_json.response({'data': records, 'pagination': pagination}, sample_list_model)
+
+
+sample_input_model = ns.model('SampleInput', {
+    'line_name': fields.String(required=True, description='產線名稱'),
+    'product_name': fields.String(description='產品名稱'),
+    'timestamp': fields.DateTime(dt_format='iso8601', description='紀錄時間 (省略時為伺服器收到的時間)'),
+    'metric_a': fields.Float(description='指標 A'),
+    'metric_b': fields.Float(description='指標 B'),
+    'operator': fields.String(description='操作員')
+})
+
+ingest_result_model = ns.model('SampleIngestResult', {
+    'inserted': fields.Integer(description='成功寫入筆數'),
+    'rejected': fields.Integer(description='被拒絕筆數'),
+    'rejects': fields.List(fields.Raw, description='被拒絕的資料 [{index, errors}]，index 從 0 起算'),
+})
+
+
+@ns.route('/ingest')
+class SampleIngest(Resource):
+
+    @ns.expect([sample_input_model])
+    @ns.doc(description='接受 JSON 陣列 (或 {"samples": [...]})，或以 Content-Type: application/x-ndjson 逐行傳送')
+    @ns.response(201, '寫入完成 (可能包含部分被拒絕的資料)', ingest_result_model)
+    @ns.response(400, '沒有任何資料可寫入')
+    @ns.response(413, '超過單次請求的筆數上限')
+    def post(self):
+        """批次寫入產線紀錄 (供產線設備大量上傳使用)"""
+        max_rows = current_app.config['INGEST_MAX_ROWS']
+
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            records = _ndjson_records(request.stream)
+        else:
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict):
+                payload = payload.get('samples')
+            if not isinstance(payload, list):
+                return {'message': '請提供 JSON 陣列，或 {"samples": [...]} 格式的資料'}, 400
+            if len(payload) > max_rows:
+                return {'message': f'單次最多只能寫入 {max_rows} 筆'}, 413
+            records = enumerate(payload)
+
+        truncated = []
+        inserted, rejects = ingest.insert_samples(
+            db.session, _limited(records, max_rows, truncated), chunk_size=current_app.config['INGEST_CHUNK_SIZE']
+        )
+        if truncated:
+            rejects.append({'index': max_rows, 'errors': [f'超過單次最多 {max_rows} 筆的上限，之後的資料未處理']})
+        result = {'inserted': inserted, 'rejected': len(rejects), 'rejects': rejects}
+        return result, (201 if inserted else 400)
+
+
+def _ndjson_records(stream):
+    """逐行解析 NDJSON；無法解析的行以 None 交給驗證流程回報為拒絕"""
+    index = 0
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield index, record
+        index += 1
+
+
+def _limited(records, max_rows, truncated):
+    for count, item in enumerate(records):
+        if count >= max_rows:
+            truncated.append(True)
+            return
+        yield item
+
+# --- Keyset (cursor) 分頁 ---
+# 以 (排序欄位, id) 作為鍵值：每一頁都只是從索引上的某個位置往後讀 per_page 筆，
+# 不需要 OFFSET 掃描，也不需要每次 COUNT(*)。
+# NULL 一律視為最小值 (ASC 時排最前、DESC 時排最後)，在 SQLite 與 PostgreSQL 上行為一致。
+
+def _encode_cursor(sort_by, descending, row, direction):
+    value = getattr(row, sort_by)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = {'s': sort_by, 'o': 'desc' if descending else 'asc', 'v': value, 'i': row.id, 'd': direction}
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor, sort_by, descending):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        value, last_id, direction = payload['v'], int(payload['i']), payload['d']
+        if payload['s'] != sort_by or payload['o'] != ('desc' if descending else 'asc') or direction not in ('next', 'prev'):
+            raise ValueError
+        if value is not None and sort_by == 'timestamp':
+            value = datetime.fromisoformat(value)
+    except (binascii.Error, UnicodeDecodeError, KeyError, TypeError, ValueError):
+        ns.abort(400, 'cursor 無效，或與目前的排序條件不符')
+    return value, last_id, direction
+
+
+def _after(column, value, last_id, descending):
+    """
+    回傳「排在 (value, last_id) 之後」的條件列表 (依指定的方向)，依序讀取，前一段不足一頁才讀下一段。
+    每一段都只是 (欄位, id) 索引上的一個範圍，SQLite 可以直接定位到 cursor 的位置往後讀；
+    NULL 排在最小值，可為 NULL 的欄位在非 NULL 值讀完之後 (DESC) 或之前 (ASC) 另外讀一段 NULL，
+    不用 OR 把 IS NULL 併進同一個條件 (那樣只能從索引開頭掃描)。timestamp / id 等 NOT NULL 欄位只有一段。
+    """
+    if column is Sample.id:
+        return [Sample.id < last_id if descending else Sample.id > last_id]
+    if value is None:
+        nulls = and_(column.is_(None), Sample.id < last_id if descending else Sample.id > last_id)
+        return [nulls] if descending else [nulls, column.is_not(None)]
+    if descending:
+        conditions = [tuple_(column, Sample.id) < tuple_(value, last_id)]
+        return conditions + [column.is_(None)] if column.nullable else conditions
+    return [tuple_(column, Sample.id) > tuple_(value, last_id)]
+
+
+def _ordering(column, descending):
+    if descending:
+        return [column.desc().nulls_last(), Sample.id.desc()]
+    return [column.asc().nulls_first(), Sample.id.asc()]
+
+
+def _cursor_page(base_query, sort_by, descending, per_page, args, archived=None):
+    """archived 為區間內的封存紀錄 (見 _archived_columns) 時，兩邊以相同的 keyset 條件各取一頁再合併"""
+    column = getattr(Sample, sort_by)
+    per_page = max(1, per_page)
+    direction = 'next'
+    queries = [base_query]
+    after = None
+
+    if args['cursor']:
+        value, last_id, direction = _decode_cursor(args['cursor'], sort_by, descending)
+        # 往前翻頁時，把排序方向反過來讀，再把結果翻轉回來
+        scan_descending = descending if direction == 'next' else not descending
+        # 依產線篩選又依產線排序時，排序欄位只有一個值，直接以 id 定位 ((line_name, id) 的列值比較無法與 line_name = ? 一起定位)
+        keyset_column = Sample.id if sort_by == 'line_name' and args['line_name'] else column
+        queries = [base_query.filter(condition) for condition in _after(keyset_column, value, last_id, scan_descending)]
+        after = (value, last_id)
+    else:
+        scan_descending = descending
+
+    # 多讀一筆，用來判斷同方向上是否還有資料
+    rows = []
+    for query in queries:
+        rows += query.order_by(*_ordering(column, scan_descending)).limit(per_page + 1 - len(rows)).all()
+        if len(rows) > per_page:
+            break
+    if archived is not None:
+        archived_rows = archive.sorted_rows(archived, sort_by, scan_descending, per_page + 1, after)
+        rows = list(islice(heapq.merge(rows, archived_rows, key=_sort_key(sort_by), reverse=scan_descending), per_page + 1))
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == 'next':
+        has_next, has_prev = has_more, bool(args['cursor'])
+    else:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+
+    total_items = total_pages = None
+    if args['with_total']:
+        if args['line_name'] or args['start_time'] or args['end_time']:
+            total_items = base_query.order_by(None).count()
+            if archived is not None:
+                total_items += int(archived['id'].size)
+        else:
+            # 未篩選時直接使用累計表的筆數，不必 COUNT(*)；累計表包含封存區，
+            # 未指定時間區間的列表只列熱資料表，因此扣掉封存片段的筆數 (manifest 中的彙總，不必讀檔)
+            total_items = aggregates.get_or_rebuild(db.session).total_count - sample_archive.totals()['total_count']
+        total_pages = -(-total_items // per_page)
+
+    return {
+        'data': rows,
+        'pagination': {
+            'total_items': total_items,
+            'total_pages': total_pages,
+            'current_page': None,
+            'per_page': per_page,
+            'has_next': has_next,
+            'has_prev': has_prev,
+            'next_cursor': _encode_cursor(sort_by, descending, rows[-1], 'next') if rows and has_next else None,
+            'prev_cursor': _encode_cursor(sort_by, descending, rows[0], 'prev') if rows and has_prev else None,
+        }
+    }
+
+
+def _merged_offset_page(base_query, sort_by, descending, page, per_page, archived):
+    """區間涵蓋封存區時的 offset 分頁：熱資料表與封存區各取排序後的前 page x per_page 筆，合併後切出該頁"""
+    page, per_page = max(1, page), max(1, per_page)
+    limit = page * per_page
+    hot_rows = base_query.order_by(*_ordering(getattr(Sample, sort_by), descending)).limit(limit).all()
+    archived_rows = archive.sorted_rows(archived, sort_by, descending, limit)
+    rows = list(islice(
+        heapq.merge(hot_rows, archived_rows, key=_sort_key(sort_by), reverse=descending), (page - 1) * per_page, limit
+    ))
+    total_items = base_query.order_by(None).count() + int(archived['id'].size)
+    total_pages = -(-total_items // per_page)
+    return {
+        'data': rows,
+        'pagination': {
+            'total_items': total_items,
+            'total_pages': total_pages,
+            'current_page': page,
+            'per_page': per_page,
+            'has_next': page < total_pages,
+            'has_prev': page > 1,
+        }
+    }
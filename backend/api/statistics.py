@@ -1,40 +1,166 @@
 # backend/api/statistics.py
 
+from flask import Response, current_app
 from flask_restx import Namespace, Resource
-from sqlalchemy import func
+from sqlalchemy import select, func
 from models import Sample
-from extensions import db
+from extensions import db, cache
+from cache import TAG_SAMPLES
+from live_metrics import LiveMetricsHub
+from .common import utc_datetime
+import aggregates
+import rollups
 
 ns = Namespace('statistics', description='統計數據相關操作')
 
+line_metrics_parser = ns.parser()
+line_metrics_parser.add_argument('from', type=utc_datetime, dest='start_time', help='起始時間 (含，ISO 8601)')
+line_metrics_parser.add_argument('to', type=utc_datetime, dest='end_time', help='結束時間 (不含，ISO 8601)')
+line_metrics_parser.add_argument('line_name', type=str, help='產線名稱篩選')
+
 @ns.route('/main-metrics')
 class MainMetrics(Resource):
+    @cache.cached('statistics', tags=(TAG_SAMPLES,))
     def get(self):
         """獲取關鍵製程指標，包含與前期的比較"""
-        
-        total_records = db.session.query(func.count(Sample.id)).scalar()
-        
-        if total_records < 2:
-            return { 'total_records': total_records, 'avg_metric_a': 0, 'avg_metric_b': 0, 'latest_record_time': None, 'prev_avg_metric_a': 0, 'prev_avg_metric_b': 0 }
-
-        # --- 原有計算 (不變) ---
-        avg_metric_a = db.session.query(func.avg(Sample.metric_a)).scalar()
-        avg_metric_b = db.session.query(func.avg(Sample.metric_b)).scalar()
-        latest_record_time = db.session.query(func.max(Sample.timestamp)).scalar()
-        
-        # --- 修正後的計算邏輯 ---
-        latest_record = Sample.query.order_by(Sample.timestamp.desc()).first()
-        
-        # 直接在新的查詢中，加入 filter 條件來排除最新一筆紀錄
-        prev_avg_metric_a = db.session.query(func.avg(Sample.metric_a)).filter(Sample.id != latest_record.id).scalar()
-        prev_avg_metric_b = db.session.query(func.avg(Sample.metric_b)).filter(Sample.id != latest_record.id).scalar()
-
-        # --- 組合回傳資料 (不變) ---
-        return {
-            'total_records': total_records,
-            'avg_metric_a': round(avg_metric_a, 2) if avg_metric_a else 0,
-            'avg_metric_b': round(avg_metric_b, 2) if avg_metric_b else 0,
-            'latest_record_time': latest_record_time.isoformat() if latest_record_time else None,
-            'prev_avg_metric_a': round(prev_avg_metric_a, 2) if prev_avg_metric_a else 0,
-            'prev_avg_metric_b': round(prev_avg_metric_b, 2) if prev_avg_metric_b else 0,
-        }
\ No newline at end of file
+
+        # 直接讀取累計表 (單列)，不再對 Sample 做多次全表 AVG 掃描
+        return main_metrics(aggregates.get_or_rebuild(db.session))
+
+
+@ns.route('/line-metrics')
+class LineMetrics(Resource):
+    @cache.cached('statistics', tags=(TAG_SAMPLES,))
+    @ns.expect(line_metrics_parser)
+    def get(self):
+        """獲取各產線在指定區間內的指標統計 (筆數、平均、標準差、最小、最大)"""
+        args = line_metrics_parser.parse_args()
+        grouped = rollups.query_stats(
+            db.session.connection(), args['start_time'], args['end_time'], line_name=args['line_name']
+        )
+
+        lines = []
+        for (line_name, _), stats in sorted(grouped.items()):
+            lines.append({
+                'line_name': line_name,
+                'total_records': stats['sample_count'],
+                'metric_a': _rounded(rollups.summarize(stats, 'metric_a')),
+                'metric_b': _rounded(rollups.summarize(stats, 'metric_b')),
+            })
+        return {'lines': lines}
+
+
+def main_metrics(aggregate):
+    """由累計列組出 /main-metrics 的回應內容 (即時推播也共用這個格式)"""
+    total_records = aggregate.total_count
+
+    if total_records < 2:
+        return { 'total_records': total_records, 'avg_metric_a': 0, 'avg_metric_b': 0, 'latest_record_time': None, 'prev_avg_metric_a': 0, 'prev_avg_metric_b': 0 }
+
+    avg_metric_a = _average(aggregate.sum_metric_a, aggregate.count_metric_a)
+    avg_metric_b = _average(aggregate.sum_metric_b, aggregate.count_metric_b)
+    latest_record_time = aggregate.latest_timestamp
+
+    # 前期平均 = 從總和中扣掉最新一筆紀錄的值 (該值為 NULL 時本來就不計入平均)
+    prev_avg_metric_a = _average_without(aggregate.sum_metric_a, aggregate.count_metric_a, aggregate.latest_metric_a)
+    prev_avg_metric_b = _average_without(aggregate.sum_metric_b, aggregate.count_metric_b, aggregate.latest_metric_b)
+
+    # --- 組合回傳資料 (不變) ---
+    return {
+        'total_records': total_records,
+        'avg_metric_a': round(avg_metric_a, 2) if avg_metric_a else 0,
+        'avg_metric_b': round(avg_metric_b, 2) if avg_metric_b else 0,
+        'latest_record_time': latest_record_time.isoformat() if latest_record_time else None,
+        'prev_avg_metric_a': round(prev_avg_metric_a, 2) if prev_avg_metric_a else 0,
+        'prev_avg_metric_b': round(prev_avg_metric_b, 2) if prev_avg_metric_b else 0,
+    }
+
+
+def _rounded(summary):
+    return {name: round(value, 4) if isinstance(value, float) else value for name, value in summary.items()}
+
+
+def _average(total, count):
+    """與 SQL AVG() 相同：沒有非空值時回傳 None"""
+    return total / count if count else None
+
+
+def _average_without(total, count, excluded_value):
+    if excluded_value is None:
+        return _average(total, count)
+    return _average(total - excluded_value, count - 1)
+
+
+# --- 即時推播 (SSE) ---
+
+def _live_updates(state):
+    """producer 每次喚醒時呼叫一次：回傳與上次相比有變動的指標欄位，以及新寫入的圖表點"""
+    metrics = main_metrics(aggregates.get_or_rebuild(db.session))
+    previous = state.get('metrics')
+    state['metrics'] = metrics
+    if previous is None:
+        state['last_id'] = db.session.execute(select(func.max(Sample.id))).scalar() or 0
+        return []
+
+    changed = {name: value for name, value in metrics.items() if previous.get(name) != value}
+    if not changed:
+        return []
+
+    # 新的圖表點：id 大於上次看到的最大 id (主鍵範圍查詢)；一次最多推送 LIVE_MAX_POINTS 筆最新的點
+    limit = current_app.config['LIVE_MAX_POINTS']
+    rows = db.session.execute(
+        select(Sample.id, Sample.line_name, Sample.timestamp, Sample.metric_a, Sample.metric_b)
+        .where(Sample.id > state['last_id'])
+        .order_by(Sample.id.desc())
+        .limit(limit + 1)
+    ).all()
+    truncated = len(rows) > limit
+    rows = list(reversed(rows[:limit]))
+    if rows:
+        state['last_id'] = rows[-1].id
+
+    updates = [('metrics', changed)]
+    if rows:
+        updates.append(('points', {
+            'truncated': truncated,
+            'points': [
+                {
+                    'id': row.id,
+                    'line_name': row.line_name,
+                    'timestamp': row.timestamp.isoformat(),
+                    'label': row.timestamp.strftime('%H:%M:%S'),
+                    'metric_a': row.metric_a,
+                    'metric_b': row.metric_b,
+                }
+                for row in rows
+            ],
+        }))
+    return updates
+
+
+def _live_snapshot(state):
+    return [('snapshot', state['metrics'])] if 'metrics' in state else []
+
+
+live_hub = LiveMetricsHub(_live_updates, _live_snapshot)
+
+
+@cache.on_invalidate
+def _wake_live_hub(tags):
+    if TAG_SAMPLES in tags:
+        live_hub.notify()
+
+
+@ns.route('/stream')
+class MetricsStream(Resource):
+    @ns.response(200, 'text/event-stream：snapshot / metrics / points / resync 事件')
+    @ns.response(503, '訂閱人數已達上限')
+    def get(self):
+        """即時推播關鍵指標與新的圖表點 (Server-Sent Events)"""
+        stream = live_hub.subscribe(current_app._get_current_object())
+        if stream is None:
+            return {'message': '即時推播的連線數已達上限，請稍後再試'}, 503
+        return Response(stream, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # 關閉 nginx 的回應緩衝，事件才會即時送達
+        })
@@ -1,15 +1,46 @@
 # backend/api/wastewater_reports.py
 
-from flask_restx import Namespace, Resource, fields
+from flask import current_app
+from flask_restx import Namespace, Resource, fields, inputs
+from werkzeug.datastructures import FileStorage
+from sqlalchemy import func, select, insert, update, delete
 from models import WastewaterReport, WastewaterReportItem
-from extensions import db
-from datetime import datetime
+from extensions import db, cache
+from cache import TAG_WASTEWATER_REPORTS
+from .common import id_list
+import batch_delete
+import fast_json
+import search_index
+import report_import
+import compliance
+from datetime import datetime, time, timedelta
 
 # --- Namespace and Parsers ---
 ns = Namespace('wastewater-reports', description='廢水報告相關操作')
 report_parser = ns.parser()
 report_parser.add_argument('status', type=str, help='依狀態篩選報告')
-report_parser.add_argument('search', type=str, help='依廠商名稱關鍵字搜尋')
+report_parser.add_argument('search', type=str, help='依廠商或檢測項目名稱關鍵字搜尋 (字首比對)')
+report_parser.add_argument('start_date', type=inputs.date_from_iso8601, help='報告日期起 (含，YYYY-MM-DD)')
+report_parser.add_argument('end_date', type=inputs.date_from_iso8601, help='報告日期迄 (含，YYYY-MM-DD)')
+report_parser.add_argument('page', type=inputs.positive, help='頁碼 (與 per_page 一起使用；總筆數放在 X-Total-Count 標頭)')
+report_parser.add_argument('per_page', type=inputs.int_range(1, 500), help='每頁筆數 (省略時回傳全部)')
+
+search_parser = ns.parser()
+search_parser.add_argument('q', type=str, required=True, help='關鍵字 (空白分隔的每個詞都必須出現，支援字首比對)')
+search_parser.add_argument('limit', type=inputs.int_range(1, 500), default=50, help='最多回傳筆數')
+
+import_parser = ns.parser()
+import_parser.add_argument('file', location='files', type=FileStorage, required=True, help='CSV (UTF-8) 或 XLSX 檔案，每一列是一個檢測項目')
+import_parser.add_argument('format', location='form', type=str, choices=('csv', 'xlsx'), help='檔案格式 (省略時依副檔名判斷)')
+
+compliance_parser = ns.parser()
+compliance_parser.add_argument('group_by', type=str, choices=tuple(compliance.GROUPINGS), default='item',
+                               help='分組方式：item (檢測項目) / vendor (廠商) / vendor_item (廠商 + 檢測項目)')
+compliance_parser.add_argument('vendor', type=str, help='只統計指定廠商')
+compliance_parser.add_argument('item_name', type=str, help='只統計指定檢測項目')
+compliance_parser.add_argument('start_date', type=inputs.date_from_iso8601, help='報告日期起 (含，YYYY-MM-DD)')
+compliance_parser.add_argument('end_date', type=inputs.date_from_iso8601, help='報告日期迄 (含，YYYY-MM-DD)')
+compliance_parser.add_argument('trend', type=inputs.boolean, default=True, help='是否附上每月趨勢')
 
 # --- Output Models (For GET requests) ---
 report_item_model = ns.model('WastewaterReportItem', {
@@ -27,9 +58,64 @@ report_model = ns.model('WastewaterReport', {
     'status': fields.String,
     'items': fields.List(fields.Nested(report_item_model))
 })
+search_result_model = ns.model('WastewaterReportSearchResult', {
+    'id': fields.Integer(description='報告 id'),
+    'score': fields.Float(description='相關度 (越小越相關)'),
+})
+import_result_model = ns.model('WastewaterReportImportResult', {
+    'reports_created': fields.Integer(description='新增的報告數'),
+    'items_inserted': fields.Integer(description='新增的檢測項目數'),
+    'rejected': fields.Integer(description='被拒絕的列數'),
+    'errors': fields.List(fields.Raw, description='被拒絕的列 [{row, errors}]，row 為檔案中的列號'),
+})
+report_summary_model = ns.model('WastewaterReportSummary', {
+    'id': fields.Integer(readonly=True),
+    'report_date': fields.DateTime(dt_format='iso8601'),
+    'vendor': fields.String,
+    'status': fields.String,
+    'item_count': fields.Integer(description='檢測項目數'),
+    'non_compliant_count': fields.Integer(description='不合格項目數'),
+})
+
+compliance_trend_model = ns.model('WastewaterComplianceTrend', {
+    'month': fields.String(description='月份 (YYYY-MM)'),
+    'total': fields.Integer(description='檢測項目數'),
+    'non_compliant': fields.Integer(description='不合格項目數'),
+    'compliance_rate': fields.Float(description='合格率 (0~1)'),
+    'exceedances': fields.Integer(description='檢測值超出標準值上下限的項目數'),
+})
+compliance_values_model = ns.model('WastewaterComplianceValues', {
+    'avg': fields.Float, 'min': fields.Float, 'max': fields.Float,
+    'percentiles': fields.Raw(description='最近秩百分位數 {p50, p90, p95}'),
+})
+compliance_group_model = ns.model('WastewaterComplianceGroup', {
+    'vendor': fields.String(description='廠商 (依廠商分組時)'),
+    'item_name': fields.String(description='檢測項目 (依檢測項目分組時)'),
+    'total': fields.Integer(description='檢測項目數'),
+    'compliant': fields.Integer(description='合格項目數'),
+    'non_compliant': fields.Integer(description='不合格項目數'),
+    'compliance_rate': fields.Float(description='合格率 (0~1)'),
+    'exceedances': fields.Integer(description='檢測值超出標準值上下限的項目數 (依寫入時解析的數值)'),
+    'standard_min': fields.Float(description='標準值下限 (分組內最小者)'),
+    'standard_max': fields.Float(description='標準值上限 (分組內最大者)'),
+    'values': fields.Nested(compliance_values_model, allow_null=True, description='檢測值統計 (只依廠商分組時為 null)'),
+    'trend': fields.List(fields.Nested(compliance_trend_model), description='每月趨勢'),
+})
+compliance_model = ns.model('WastewaterCompliance', {
+    'group_by': fields.String,
+    'groups': fields.List(fields.Nested(compliance_group_model)),
+})
+
+encode_report = fast_json.row_encoder(report_model)
+encode_report_item = fast_json.row_encoder(report_item_model)
+REPORT_COLUMNS = (WastewaterReport.id, WastewaterReport.report_date, WastewaterReport.vendor, WastewaterReport.status)
+REPORT_ITEM_COLUMNS = (WastewaterReportItem.report_id, WastewaterReportItem.id, WastewaterReportItem.item_name,
+                       WastewaterReportItem.value, WastewaterReportItem.unit, WastewaterReportItem.standard,
+                       WastewaterReportItem.is_compliant)
 
 # --- Input Models (For POST requests) ---
 report_item_input_model = ns.model('WastewaterReportItemInput', {
+    'id': fields.Integer(description='既有項目的 id (更新時帶入；省略代表新增項目)', nullable=True),
     'item_name': fields.String(required=True, description='項目名稱'),
     'value': fields.Float(required=True, description='檢測值'),
     'unit': fields.String(description='單位', nullable=True), # <-- 加上 nullable=True
@@ -43,28 +129,72 @@ report_input_model = ns.model('WastewaterReportInput', {
     'items': fields.List(fields.Nested(report_item_input_model), required=True, description='檢測項目列表')
 })
 
+# --- Input Models (For PATCH requests)：只需帶入有變動的欄位與項目 ---
+report_item_patch_model = ns.model('WastewaterReportItemPatch', {
+    'id': fields.Integer(description='要更新的項目 id；省略代表新增項目 (此時 item_name/value/is_compliant 為必填)', nullable=True),
+    'item_name': fields.String(description='項目名稱'),
+    'value': fields.Float(description='檢測值'),
+    'unit': fields.String(description='單位', nullable=True),
+    'standard': fields.String(description='標準值', nullable=True),
+    'is_compliant': fields.Boolean(description='是否合格'),
+})
+report_patch_model = ns.model('WastewaterReportPatch', {
+    'vendor': fields.String(description='廠商名稱'),
+    'status': fields.String(description='總體狀態'),
+    'report_date': fields.Date(description='報告日期 (YYYY-MM-DD)'),
+    'items': fields.List(fields.Nested(report_item_patch_model), description='要新增或更新的檢測項目'),
+    'delete_item_ids': fields.List(fields.Integer, description='要刪除的檢測項目 id'),
+})
+
+# --- Input Models (For DELETE requests)：依 id 列表，或依條件範圍刪除 ---
+report_delete_model = ns.model('WastewaterReportBatchDelete', {
+    'ids': fields.List(fields.Integer, description='要刪除的報告 id 列表'),
+    'vendor': fields.String(description='未提供 ids 時：依廠商刪除'),
+    'status': fields.String(description='未提供 ids 時：依狀態刪除'),
+    'start_date': fields.Date(description='未提供 ids 時：報告日期起 (含，YYYY-MM-DD)'),
+    'end_date': fields.Date(description='未提供 ids 時：報告日期迄 (含，YYYY-MM-DD)'),
+})
+report_delete_result_model = ns.model('WastewaterReportDeleteResult', {
+    'message': fields.String,
+    'reports': fields.Integer(description='刪除的報告數'),
+    'items': fields.Integer(description='刪除的檢測項目數'),
+})
+
 # --- API Resources ---
 @ns.route('/')
 class WastewaterReportList(Resource):
     
-    @ns.marshal_list_with(report_model)
+    @cache.cached('wastewater-reports', tags=(TAG_WASTEWATER_REPORTS,))
+    @fast_json.documented(report_model, as_list=True)
     @ns.expect(report_parser)
     def get(self):
-        """獲取所有廢水報告列表 (支援狀態篩選與廠商搜尋)"""
+        """獲取所有廢水報告列表 (支援狀態篩選、廠商搜尋、日期區間與分頁)"""
         args = report_parser.parse_args()
-        status_filter = args.get('status')
-        search_term = args.get('search')
 
-        base_query = WastewaterReport.query
+        # 只選取欄位 (不建立 ORM 物件)：報告一個查詢、這一頁所有報告的檢測項目一個查詢，
+        # 再直接組成與 report_model 相同的輸出，不經過 marshal()
+        stmt = _apply_report_filters(select(*REPORT_COLUMNS), args)
+        stmt = stmt.order_by(WastewaterReport.report_date.desc(), WastewaterReport.id.desc())
 
-        if status_filter and status_filter.lower() != '全部':
-            base_query = base_query.filter(WastewaterReport.status == status_filter)
-        
-        if search_term:
-            base_query = base_query.filter(WastewaterReport.vendor.like(f"%{search_term}%"))
-            
-        reports = base_query.order_by(WastewaterReport.report_date.desc()).all()
-        return reports
+        headers = None
+        if args.get('per_page'):
+            page, per_page = args.get('page') or 1, args['per_page']
+            total = db.session.execute(
+                _apply_report_filters(select(func.count(WastewaterReport.id)), args)
+            ).scalar()
+            stmt = stmt.limit(per_page).offset((page - 1) * per_page)
+            headers = {
+                'X-Total-Count': str(total),
+                'X-Total-Pages': str(-(-total // per_page)),
+                'X-Page': str(page),
+                'X-Per-Page': str(per_page),
+            }
+
+        reports = [encode_report(row) for row in db.session.execute(stmt)]
+        items_by_report = _items_by_report([report['id'] for report in reports])
+        for report in reports:
+            report['items'] = items_by_report.get(report['id'], [])
+        return fast_json.response(reports, [report_model], headers=headers)
 
     @ns.expect(report_input_model, validate=True)
     @ns.marshal_with(report_model, code=201)
@@ -96,11 +226,174 @@ class WastewaterReportList(Resource):
         
         return new_report, 201
 
+    @ns.expect(report_delete_model)
+    @ns.response(200, '刪除完成', report_delete_result_model)
+    @ns.response(400, '沒有提供 ids 或篩選條件，或 ids 不是整數列表')
+    @ns.response(404, '找不到對應的報告')
+    @ns.response(413, '超過單次請求可刪除的份數上限 (請改用背景工作 delete-reports)')
+    def delete(self):
+        """批次刪除廢水報告與其檢測項目 (依 id 列表，或依廠商 / 狀態 / 報告日期；分批在短交易中刪除)"""
+        payload = ns.payload or {}
+        max_rows = current_app.config['REPORT_DELETE_MAX_ROWS']
+        too_many = {'message': f'單次最多只能刪除 {max_rows} 份報告，請改用背景工作 (POST /jobs，type=delete-reports)'}, 413
+
+        if payload.get('ids') is not None:
+            try:
+                ids = id_list(payload['ids'])
+            except ValueError as e:
+                return {'message': str(e)}, 400
+            if len(ids) > max_rows:
+                return too_many
+            result = batch_delete.delete_report_ids(db.session, ids)
+        else:
+            try:
+                filters = {name: payload.get(name) for name in ('vendor', 'status', 'start_date', 'end_date')}
+                for name in ('start_date', 'end_date'):
+                    filters[name] = inputs.date_from_iso8601(filters[name]) if filters[name] else None
+            except ValueError:
+                return {'message': 'start_date / end_date 必須是 YYYY-MM-DD 格式的日期'}, 400
+            if not any(filters.values()):
+                return {'message': '請提供要刪除的報告 id 列表，或 vendor / status / start_date / end_date 篩選條件'}, 400
+            if batch_delete.count_reports(db.session, **filters) > max_rows:
+                return too_many
+            result = batch_delete.delete_report_range(db.session, **filters)
+
+        if not result['reports']:
+            return {'message': '找不到對應的報告可供刪除', **result}, 404
+        return {'message': f"成功刪除 {result['reports']} 份報告 ({result['items']} 個檢測項目)", **result}, 200
+
+@ns.route('/summary')
+class WastewaterReportSummaryList(Resource):
+
+    @cache.cached('wastewater-reports', tags=(TAG_WASTEWATER_REPORTS,))
+    @ns.marshal_list_with(report_summary_model)
+    @ns.expect(report_parser)
+    def get(self):
+        """獲取廢水報告摘要列表 (只含項目數與不合格數，不含項目明細)"""
+        args = report_parser.parse_args()
+        item_count = (
+            select(func.count(WastewaterReportItem.id))
+            .where(WastewaterReportItem.report_id == WastewaterReport.id)
+            .scalar_subquery()
+        )
+        non_compliant_count = (
+            select(func.count(WastewaterReportItem.id))
+            .where(WastewaterReportItem.report_id == WastewaterReport.id, WastewaterReportItem.is_compliant.is_(False))
+            .scalar_subquery()
+        )
+
+        # 每份報告的統計以相關子查詢計算：分頁先依 (report_date, id) 索引取出該頁報告，
+        # 子查詢只在 (report_id, is_compliant) 索引上計數，不必 GROUP BY 整張報告表
+        stmt = _apply_report_filters(
+            select(
+                WastewaterReport.id, WastewaterReport.report_date, WastewaterReport.vendor, WastewaterReport.status,
+                item_count.label('item_count'), non_compliant_count.label('non_compliant_count'),
+            ),
+            args,
+        ).order_by(WastewaterReport.report_date.desc(), WastewaterReport.id.desc())
+
+        if args.get('per_page'):
+            page = args.get('page') or 1
+            total = db.session.execute(
+                _apply_report_filters(select(func.count(WastewaterReport.id)), args)
+            ).scalar()
+            rows = db.session.execute(stmt.limit(args['per_page']).offset((page - 1) * args['per_page'])).mappings().all()
+            return rows, 200, {'X-Total-Count': str(total)}
+
+        return db.session.execute(stmt).mappings().all()
+
+
+@ns.route('/compliance')
+class WastewaterReportCompliance(Resource):
+
+    @cache.cached('wastewater-reports', tags=(TAG_WASTEWATER_REPORTS,))
+    @ns.expect(compliance_parser)
+    @ns.response(200, '成功', compliance_model)
+    @ns.response(400, '日期區間無效')
+    def get(self):
+        """依檢測項目 / 廠商統計合格率、超標數、檢測值百分位數與每月趨勢 (在資料庫彙總，不下載報告明細)"""
+        args = compliance_parser.parse_args()
+        if args['start_date'] and args['end_date'] and args['start_date'] > args['end_date']:
+            return {'message': 'start_date 不可晚於 end_date'}, 400
+        result = compliance.summarize(
+            db.session.connection(), args['group_by'], trend=args['trend'],
+            start_date=args['start_date'], end_date=args['end_date'],
+            vendor=args['vendor'], item_name=args['item_name'],
+        )
+        return ns.marshal(result, compliance_model), 200
+
+
+def _items_by_report(report_ids, chunk_size=500):
+    """一次讀取多份報告的檢測項目 (依 id 排序)，回傳 {報告 id: [項目 dict, ...]}"""
+    items_by_report = {}
+    for start in range(0, len(report_ids), chunk_size):
+        rows = db.session.execute(
+            select(*REPORT_ITEM_COLUMNS)
+            .where(WastewaterReportItem.report_id.in_(report_ids[start:start + chunk_size]))
+            .order_by(WastewaterReportItem.id)
+        )
+        for row in rows:
+            items_by_report.setdefault(row.report_id, []).append(encode_report_item(row))
+    return items_by_report
+
+
+def _apply_report_filters(query, args):
+    """把狀態 / 廠商關鍵字 / 日期區間篩選套用到 Query 或 select() 上"""
+    status_filter = args.get('status')
+    search_term = args.get('search')
+
+    if status_filter and status_filter.lower() != '全部':
+        query = query.where(WastewaterReport.status == status_filter)
+    if search_term:
+        # 以全文檢索索引比對廠商與檢測項目名稱 (索引不可用時退回廠商名稱 LIKE)
+        query = query.where(search_index.search_criterion(db.session.connection(), search_term))
+    if args.get('start_date'):
+        query = query.where(WastewaterReport.report_date >= datetime.combine(args['start_date'], time.min))
+    if args.get('end_date'):
+        # 結束日期包含當天，因此比較到隔天 00:00 之前
+        query = query.where(WastewaterReport.report_date < datetime.combine(args['end_date'] + timedelta(days=1), time.min))
+    return query
+
+@ns.route('/search')
+class WastewaterReportSearch(Resource):
+
+    @cache.cached('wastewater-reports', tags=(TAG_WASTEWATER_REPORTS,))
+    @ns.marshal_list_with(search_result_model)
+    @ns.expect(search_parser)
+    @ns.response(503, '全文檢索索引尚未建立')
+    def get(self):
+        """依廠商與檢測項目名稱全文檢索，依相關度回傳報告 id"""
+        args = search_parser.parse_args()
+        results = search_index.search(db.session.connection(), args['q'], limit=args['limit'])
+        if results is None:
+            ns.abort(503, '全文檢索索引尚未建立，請先執行 flask rebuild-search-index')
+        return [{'id': report_id, 'score': score} for report_id, score in results]
+
+@ns.route('/import')
+class WastewaterReportImport(Resource):
+
+    @ns.expect(import_parser)
+    @ns.response(201, '匯入完成 (可能包含部分被拒絕的列)', import_result_model)
+    @ns.response(400, '檔案格式錯誤或沒有任何資料可匯入')
+    def post(self):
+        """從 CSV / XLSX 檔案批次匯入廢水報告"""
+        args = import_parser.parse_args()
+        upload = args['file']
+        try:
+            rows = report_import.iter_rows(upload.stream, filename=upload.filename, file_format=args['format'])
+            result = report_import.import_reports(
+                db.session, rows, chunk_size=current_app.config['REPORT_IMPORT_CHUNK_SIZE']
+            )
+        except report_import.ImportFormatError as e:
+            return {'message': str(e)}, 400
+        return result, (201 if result['items_inserted'] else 400)
+
 @ns.route('/<int:report_id>') # 這個路由會處理像 /wastewater-reports/1 這樣的路徑
 @ns.response(404, '找不到指定的報告')
 @ns.param('report_id', '報告的唯一識別碼')
 class WastewaterReportResource(Resource):
     
+    @cache.cached('wastewater-reports', tags=(TAG_WASTEWATER_REPORTS,))
     @ns.marshal_with(report_model)
     def get(self, report_id):
         """獲取單筆廢水報告的詳細資料"""
@@ -110,7 +403,7 @@ class WastewaterReportResource(Resource):
     @ns.expect(report_input_model, validate=True)
     @ns.marshal_with(report_model)
     def put(self, report_id):
-        """更新一筆廢水報告"""
+        """更新一筆廢水報告 (項目以 id 比對差異：只更新有變動的、新增沒有 id 的、刪除沒有出現的)"""
         report_to_update = WastewaterReport.query.get_or_404(report_id)
         data = ns.payload
 
@@ -119,23 +412,111 @@ class WastewaterReportResource(Resource):
         report_to_update.status = data['status']
         report_to_update.report_date = datetime.strptime(data['report_date'], '%Y-%m-%d').date()
 
-        # 更新檢測項目：這裡我們用一個簡單但有效率的策略
-        # 1. 刪除所有舊的關聯項目
-        for item in report_to_update.items:
-            db.session.delete(item)
-        
-        # 2. 根據傳來的新資料，重新建立所有項目
-        for item_data in data['items']:
-            new_item = WastewaterReportItem(
-                item_name=item_data['item_name'],
-                value=item_data['value'],
-                unit=item_data.get('unit'),
-                standard=item_data.get('standard'),
-                is_compliant=item_data['is_compliant'],
-                report=report_to_update # 關聯到正在更新的報告
-            )
-            db.session.add(new_item)
-            
+        _sync_items(report_id, data['items'], partial=False)
         db.session.commit()
         
-        return report_to_update
\ No newline at end of file
+        return report_to_update
+
+    @ns.expect(report_patch_model, validate=True)
+    @ns.marshal_with(report_model)
+    def patch(self, report_id):
+        """部分更新一筆廢水報告 (只處理有帶入的欄位與項目)"""
+        report_to_update = WastewaterReport.query.get_or_404(report_id)
+        data = ns.payload
+
+        if 'vendor' in data:
+            report_to_update.vendor = data['vendor']
+        if 'status' in data:
+            report_to_update.status = data['status']
+        if 'report_date' in data:
+            report_to_update.report_date = datetime.strptime(data['report_date'], '%Y-%m-%d').date()
+
+        _sync_items(report_id, data.get('items') or [], partial=True, delete_ids=data.get('delete_item_ids') or [])
+        db.session.commit()
+
+        return report_to_update
+
+    @ns.response(200, '刪除完成', report_delete_result_model)
+    def delete(self, report_id):
+        """刪除一筆廢水報告與其所有檢測項目"""
+        result = batch_delete.delete_report_ids(db.session, [report_id])
+        if not result['reports']:
+            ns.abort(404, '找不到指定的報告')
+        return {'message': f"成功刪除報告 {report_id} ({result['items']} 個檢測項目)", **result}, 200
+
+
+ITEM_FIELDS = ('item_name', 'value', 'unit', 'standard', 'is_compliant')
+REQUIRED_ITEM_FIELDS = ('item_name', 'value', 'is_compliant')
+
+
+def _sync_items(report_id, incoming, partial, delete_ids=()):
+    """
+    以差異的方式同步報告的檢測項目 (不經過 lazy relationship，也不逐筆 ORM 操作)：
+    有變動的項目一次批次 UPDATE、新項目一次批次 INSERT、要移除的項目一個 DELETE ... IN。
+    partial=False (PUT)：incoming 是完整的項目列表，沒有出現的既有項目會被刪除。
+    partial=True (PATCH)：只更新 incoming 中帶入的欄位，只刪除 delete_ids 指定的項目。
+    """
+    existing = {
+        row.id: row._asdict()
+        for row in db.session.execute(
+            select(WastewaterReportItem.id, *(getattr(WastewaterReportItem, name) for name in ITEM_FIELDS))
+            .where(WastewaterReportItem.report_id == report_id)
+        )
+    }
+
+    updates, inserts, seen = [], [], set()
+    for item_data in incoming:
+        item_id = item_data.get('id')
+        if item_id is None:
+            missing = [name for name in REQUIRED_ITEM_FIELDS if item_data.get(name) is None]
+            if missing:
+                ns.abort(400, f"新增的檢測項目缺少欄位: {', '.join(missing)}")
+            inserts.append({
+                **{name: item_data.get(name) for name in ITEM_FIELDS},
+                **compliance.standard_limits(item_data.get('standard')),
+                'report_id': report_id,
+            })
+            continue
+
+        if item_id not in existing:
+            ns.abort(400, f'檢測項目 {item_id} 不屬於報告 {report_id}')
+        if item_id in seen:
+            ns.abort(400, f'檢測項目 {item_id} 重複出現')
+        seen.add(item_id)
+
+        names = [name for name in ITEM_FIELDS if name in item_data] if partial else ITEM_FIELDS
+        if partial and any(item_data[name] is None for name in REQUIRED_ITEM_FIELDS if name in item_data):
+            ns.abort(400, f'檢測項目 {item_id} 的 item_name/value/is_compliant 不可為空')
+        changes = {name: item_data.get(name) for name in names if item_data.get(name) != existing[item_id][name]}
+        if 'standard' in changes:
+            # 批次 UPDATE 不會觸發 mapper 事件，標準值的上下限需一併帶入
+            changes.update(compliance.standard_limits(changes['standard']))
+        if changes:
+            updates.append({'id': item_id, **changes})
+
+    if partial:
+        removed = set(delete_ids)
+        unknown = removed - set(existing)
+        if unknown:
+            ns.abort(400, f"檢測項目 {', '.join(map(str, sorted(unknown)))} 不屬於報告 {report_id}")
+        if removed & seen:
+            ns.abort(400, '同一個檢測項目不可同時更新與刪除')
+    else:
+        removed = set(existing) - seen
+
+    if updates:
+        # ORM 的 bulk UPDATE by primary key (executemany)
+        db.session.execute(update(WastewaterReportItem), updates)
+    if inserts:
+        db.session.execute(insert(WastewaterReportItem), inserts)
+    if removed:
+        db.session.execute(
+            delete(WastewaterReportItem).where(WastewaterReportItem.id.in_(removed))
+            .execution_options(synchronize_session=False)
+        )
+
+    # 批次語句不會觸發 after_flush 的索引同步與快取標記，需自行處理
+    if updates or inserts or removed:
+        cache.invalidate_on_commit(db.session.connection(), TAG_WASTEWATER_REPORTS)
+    if inserts or removed or any('item_name' in row for row in updates):
+        search_index.reindex(db.session.connection(), [report_id])
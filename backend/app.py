@@ -2,22 +2,61 @@
 
 from flask import Flask
 from flask_cors import CORS
-from config import Config
+from config import get_config, engine_options
 from api import api_bp
-from extensions import db, bcrypt, jwt
-from models import Sample, WastewaterReport, WastewaterReportItem, User
+from api.statistics import live_hub
+from extensions import db, migrate, jwt, cache, hasher, profiler, sample_archive, configure_sqlite
+from cache import TAG_SAMPLES, TAG_WASTEWATER_REPORTS
+from models import Sample, WastewaterReport, WastewaterReportItem, User, Job, ControlChartAlert
 from datetime import datetime
+import os
+import signal
+import json
+import tempfile
+import click
+import aggregates
+import rollups
+import search_index
+import report_import
+import compliance
+import retention
+import jobs
+import control_charts
+import seed_data
+import benchmark
 
-def create_app():
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def create_app(config_name=None, config_overrides=None):
     app = Flask(__name__)
     # 這是解決 CORS Redirect 問題的關鍵
     app.url_map.strict_slashes = False 
-    app.config.from_object(Config)
+    app.config.from_object(get_config(config_name))
+    app.config.update(config_overrides or {})
+    missing = [name for name in app.config['REQUIRED_SETTINGS'] if not app.config.get(name)]
+    if missing:
+        raise RuntimeError(f"缺少必要的設定 (環境變數): {', '.join(missing)}")
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
 
     # 初始化 extensions
     db.init_app(app)
-    bcrypt.init_app(app)
+    # SQLite 不支援大部分 ALTER TABLE，以 batch 模式重建資料表；FTS 索引表不納入 autogenerate
+    migrate.init_app(app, db, directory=MIGRATIONS_DIR, render_as_batch=True,
+                     include_name=search_index.include_in_migrations)
+    configure_sqlite(app)
     jwt.init_app(app)
+    hasher.init_app(app)
+    cache.init_app(app)
+    live_hub.init_app(app)
+    profiler.init_app(app, db)
+    sample_archive.init_app(app)
+    control_charts.monitor.init_app(app)
+
+    # 這些模型的 ORM 寫入會讓對應的回應快取失效 (Core 批次寫入在各自的寫入路徑中標記)
+    cache.tag_model(Sample, TAG_SAMPLES)
+    cache.tag_model(WastewaterReport, TAG_WASTEWATER_REPORTS)
+    cache.tag_model(WastewaterReportItem, TAG_WASTEWATER_REPORTS)
 
     # 註冊 API 藍圖
     app.register_blueprint(api_bp)
@@ -29,7 +68,9 @@ def create_app():
             'Sample': Sample,
             'WastewaterReport': WastewaterReport,
             'WastewaterReportItem': WastewaterReportItem,
-            'User': User
+            'User': User,
+            'Job': Job,
+            'ControlChartAlert': ControlChartAlert,
         }
 
     return app
@@ -37,15 +78,284 @@ def create_app():
 app = create_app()
 
 @app.cli.command('seed-db')
-def seed_db_command():
-    """Seeds the database with initial test data."""
-    print("Seeding database...")
+@click.option('--samples', default=10000, show_default=True, help='產線紀錄筆數 (分布在各產線與最近 --days 天)')
+@click.option('--reports', default=500, show_default=True, help='廢水報告份數 (每份 2~6 個檢測項目)')
+@click.option('--days', default=90, show_default=True, help='產線紀錄的時間跨度 (天)')
+@click.option('--seed', 'seed_value', default=42, show_default=True, help='亂數種子 (相同種子產生相同資料)')
+def seed_db_command(samples, reports, days, seed_value):
+    """Seeds the database with synthetic samples and wastewater reports."""
+    print(f"Seeding database with {samples} samples and {reports} reports...")
     try:
-        # ... (seed-db 的內容不變) ...
-        print("Database seeded successfully!")
+        inserted, imported = seed_data.seed(db.session, samples=samples, reports=reports, days=days, seed_value=seed_value)
+        print(f"Database seeded successfully! {inserted} samples, {imported['reports_created']} reports "
+              f"({imported['items_inserted']} items).")
     except Exception as e:
         db.session.rollback()
         print(f"Error seeding database: {e}")
 
+@app.cli.command('worker')
+@click.option('--threads', type=int, default=None, help='同時執行的工作數 (預設為 JOB_WORKER_THREADS)')
+@click.option('--burst', is_flag=True, help='佇列中沒有可執行的工作時就結束 (例如由排程器定期啟動)')
+def worker_command(threads, burst):
+    """Runs queued background jobs (/api/v1/jobs) until interrupted."""
+    worker = jobs.Worker(app, threads=threads)
+
+    # 第一次 SIGTERM / Ctrl-C：不再領取新的工作，等執行中的工作完成後結束；再按一次 Ctrl-C 立即中斷
+    def shutdown(signum, frame):
+        print("Stopping: waiting for running jobs to finish (press Ctrl-C again to abort)...")
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        worker.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    print(f"Worker {worker.worker_id} started ({worker.threads} threads, job types: {', '.join(jobs.JOB_TYPES)}).")
+    worker.run(burst=burst, log=print)
+    print("Worker stopped.")
+
+@app.cli.command('rebuild-aggregates')
+@click.option('--verify-only', is_flag=True, help='只比對累計表與實際資料，不寫入')
+def rebuild_aggregates_command(verify_only):
+    """Rebuilds (or verifies) the running Sample aggregates used by /statistics."""
+    conn = db.session.connection()
+    mismatches = aggregates.verify(conn)
+    if not mismatches:
+        print("Sample aggregates are consistent.")
+    else:
+        for name, (stored, expected) in mismatches.items():
+            print(f"  {name}: stored={stored} expected={expected}")
+
+    if verify_only:
+        db.session.rollback()
+        if mismatches:
+            raise SystemExit(1)
+        return
+
+    values = aggregates.rebuild(conn)
+    db.session.commit()
+    print(f"Sample aggregates rebuilt ({values['total_count']} records).")
+
+@app.cli.command('backfill-rollups')
+@click.option('--start', type=click.DateTime(), default=None, help='起始日期 (含，預設為最早的紀錄)')
+@click.option('--end', type=click.DateTime(), default=None, help='結束日期 (不含，預設為最新的紀錄)')
+@click.option('--days-per-batch', type=int, default=7, show_default=True, help='每個交易處理的天數')
+def backfill_rollups_command(start, end, days_per_batch):
+    """Rebuilds the minute/hour/day Sample rollups from raw records."""
+    def progress(batch_start, batch_end):
+        print(f"  {batch_start:%Y-%m-%d} ~ {batch_end:%Y-%m-%d} done")
+
+    print("Backfilling sample rollups...")
+    try:
+        rollups.backfill(db.session, start=start, end=end, days_per_batch=days_per_batch, progress=progress)
+        print("Sample rollups backfilled successfully!")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error backfilling rollups: {e}")
+
+
+@app.cli.command('archive-samples')
+@click.option('--retention-days', type=int, default=None, help='熱資料表保留的天數 (預設為 SAMPLE_RETENTION_DAYS)')
+@click.option('--batch-size', type=int, default=None, help='每個片段 (一個交易) 搬移的筆數 (預設為 ARCHIVE_BATCH_SIZE)')
+@click.option('--dry-run', is_flag=True, help='只顯示會被封存的筆數，不搬移')
+def archive_samples_command(retention_days, batch_size, dry_run):
+    """Moves samples older than the retention horizon into the compressed columnar archive."""
+    if not sample_archive.enabled:
+        print("Archive is disabled (ARCHIVE_DIR is not set).")
+        raise SystemExit(1)
+    retention_days = retention_days if retention_days is not None else app.config['SAMPLE_RETENTION_DAYS']
+    before = retention.cutoff(datetime.utcnow(), retention_days, sample_archive.partition)
+    if dry_run:
+        print(f"{retention.pending_count(db.session, before)} samples older than {before:%Y-%m-%d} would be archived.")
+        return
+
+    def progress(entry):
+        print(f"  {entry['partition']}: {entry['rows']} samples ({entry['bytes'] / 1024:.0f} KiB) -> {entry['file']}")
+
+    print(f"Archiving samples older than {before:%Y-%m-%d} into {sample_archive.root}...")
+    try:
+        result = retention.archive_samples(
+            db.session, sample_archive, retention_days,
+            batch_size=batch_size or app.config['ARCHIVE_BATCH_SIZE'], progress=progress,
+        )
+        print(f"{result['archived']} samples archived in {result['segments']} segments.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error archiving samples: {e}")
+        raise SystemExit(1)
+
+
+@app.cli.command('archive-status')
+def archive_status_command():
+    """Shows the archive manifest summary per partition."""
+    partitions = {}
+    for entry in sample_archive.manifest()['segments']:
+        summary = partitions.setdefault((entry['partition'], entry['state']), {'segments': 0, 'rows': 0, 'bytes': 0})
+        summary['segments'] += 1
+        summary['rows'] += entry['rows']
+        summary['bytes'] += entry['bytes']
+    if not partitions:
+        print("Archive is empty.")
+    for (partition, state), summary in sorted(partitions.items()):
+        print(f"  {partition} [{state}] {summary['segments']} segments, {summary['rows']} samples, "
+              f"{summary['bytes'] / 1024:.0f} KiB")
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Creates (if needed) and rebuilds the wastewater report full-text search index."""
+    try:
+        total = search_index.rebuild(db.session.connection())
+        db.session.commit()
+        print(f"Search index rebuilt ({total} reports).")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error rebuilding search index: {e}")
+
+
+@app.cli.command('backfill-standard-limits')
+@click.option('--batch-size', type=int, default=5000, show_default=True, help='每個交易處理的檢測項目數')
+def backfill_standard_limits_command(batch_size):
+    """Parses the free-text standard of every report item into standard_min / standard_max."""
+    try:
+        updated = compliance.backfill(db.session, batch_size=batch_size)
+        print(f"Standard limits backfilled ({updated} items updated).")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error backfilling standard limits: {e}")
+
+
+@app.cli.command('import-reports')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', type=int, default=None, help='每個交易寫入的項目列數')
+def import_reports_command(path, chunk_size):
+    """Imports wastewater reports from a CSV/XLSX file (one item per row)."""
+    print(f"Importing {path}...")
+    try:
+        with open(path, 'rb') as f:
+            result = report_import.import_reports(
+                db.session, report_import.iter_rows(f, filename=path),
+                chunk_size=chunk_size or app.config['REPORT_IMPORT_CHUNK_SIZE'],
+            )
+    except report_import.ImportFormatError as e:
+        print(f"Error importing reports: {e}")
+        raise SystemExit(1)
+
+    print(f"{result['reports_created']} reports / {result['items_inserted']} items imported, {result['rejected']} rows rejected.")
+    for error in result['errors'][:50]:
+        print(f"  row {error['row']}: {'; '.join(error['errors'])}")
+
+
+@app.cli.command('control-charts')
+@click.option('--rebuild', is_flag=True, help='清除檢查點與警報，從熱資料表的全部歷史重新計算')
+def control_charts_command(rebuild):
+    """Processes pending samples through the streaming control charts and writes a checkpoint."""
+    monitor = control_charts.monitor
+    try:
+        if rebuild:
+            monitor.reset(db.session)
+            print("Control chart state and alerts cleared.")
+        result = monitor.sync(db.session, checkpoint=True)
+        summary = monitor.lines()
+        print(f"{result['processed']} samples processed, {result['alerts']} alerts raised "
+              f"({len(summary['lines'])} lines, last sample id {summary['last_sample_id']}).")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error processing control charts: {e}")
+        raise SystemExit(1)
+
+
+@app.cli.command('check-query-plans')
+@click.option('--samples', default=100000, show_default=True, help='寫入的產線紀錄筆數')
+@click.option('--reports', default=5000, show_default=True, help='寫入的廢水報告份數')
+def check_query_plans_command(samples, reports):
+    """Seeds a temporary SQLite database and checks every read endpoint's query plans for full table scans."""
+    from flask_migrate import upgrade
+    import query_plans
+
+    with tempfile.TemporaryDirectory() as directory:
+        check_app = create_app('testing', {
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'query_plans.db'),
+            'CACHE_BACKEND': 'null',
+        })
+        now = datetime.utcnow().replace(microsecond=0)
+        with check_app.app_context():
+            upgrade(directory=MIGRATIONS_DIR)
+            print(f"Seeding {samples} samples and {reports} reports...")
+            seed_data.seed(db.session, samples=samples, reports=reports, now=now)
+            results = query_plans.check(check_app, now)
+            db.session.remove()
+            db.engine.dispose()
+
+    failed = 0
+    for result in results:
+        ok = not result['scans'] and result['status'] < 400
+        failed += not ok
+        print(f"[{'OK' if ok else 'FAIL'}] {result['name']} ({result['statements']} queries, HTTP {result['status']})")
+        for detail in result['scans']:
+            print(f"    scan: {detail}")
+        for detail in result['sorts']:
+            print(f"    note: {detail}")
+    print(f"{len(results) - failed}/{len(results)} endpoints use indexes.")
+    if failed:
+        raise SystemExit(1)
+
+
+
+@app.cli.command('benchmark')
+@click.option('--scale', 'scales', multiple=True, default=('10k',), show_default=True,
+              type=click.Choice(list(benchmark.SCALES)), help='資料規模 (可重複指定)')
+@click.option('--mode', 'modes', multiple=True, default=benchmark.MODES, show_default=True,
+              type=click.Choice(benchmark.MODES), help='test-client (行程內) 或 http (多個用戶端同時連線)')
+@click.option('--requests', default=200, show_default=True, help='每個路由送出的請求數')
+@click.option('--concurrency', default=8, show_default=True, help='http 模式同時連線的用戶端數')
+@click.option('--data-dir', type=click.Path(file_okay=False), default=None, help='保留寫好資料的資料庫，下次直接複製使用')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='把這次的結果寫成 JSON 檔')
+@click.option('--baseline', type=click.Path(dir_okay=False), default=benchmark.BASELINE_PATH, show_default=True,
+              help='比較用的基準檔')
+@click.option('--update-baseline', is_flag=True, help='以這次的結果更新基準檔 (不比較)')
+@click.option('--tolerance', default=0.5, show_default=True, help='允許比基準慢 (或吞吐量低) 的比例')
+def benchmark_command(scales, modes, requests, concurrency, data_dir, output, baseline, update_baseline, tolerance):
+    """Benchmarks every /api/v1 route on synthetic data and compares the results with a baseline file."""
+    def bench_app(database_uri):
+        # 與正式環境相同的 bcrypt cost，關閉回應快取 (量測實際的查詢路徑)
+        return create_app('testing', {
+            'SQLALCHEMY_DATABASE_URI': database_uri,
+            'CACHE_BACKEND': 'null',
+            'BCRYPT_LOG_ROUNDS': get_config('production').BCRYPT_LOG_ROUNDS,
+        })
+
+    results = {'requests': requests, 'concurrency': concurrency, 'scales': {}}
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmark.db')
+            now = benchmark.prepare_database(bench_app, MIGRATIONS_DIR, scale, path, data_dir)
+            scale_app = bench_app('sqlite:///' + path)
+            try:
+                results['scales'][scale] = benchmark.run_scale(scale_app, now, scale, modes, requests, concurrency)
+            finally:
+                with scale_app.app_context():
+                    db.session.remove()
+                    db.engine.dispose()
+        print(f"[{scale}] peak RSS while serving: {results['scales'][scale]['peak_rss_mb']} MB")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if update_baseline:
+        merged = benchmark.merge_baseline(benchmark.load_baseline(baseline), results)
+        with open(baseline, 'w', encoding='utf-8') as f:
+            json.dump(merged, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"Baseline updated: {baseline}")
+        return
+
+    regressions = benchmark.compare(results, benchmark.load_baseline(baseline), tolerance)
+    for line in regressions:
+        print(f"  REGRESSION {line}")
+    if regressions:
+        raise SystemExit(1)
+    print("No regressions against the baseline.")
+
+
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
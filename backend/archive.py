@@ -0,0 +1,386 @@
+# backend/archive.py
+# 產線紀錄的封存區 (搬移見 retention.py)：超過保留期限的 Sample 存成本機磁碟上的壓縮欄式檔案。
+# - 依時間分區 (ARCHIVE_PARTITION：day / month) 放在 <ARCHIVE_DIR>/<分區>/ 下，每次搬移的一批紀錄寫成一個片段：
+#   np.savez_compressed 的 .npz，每個欄位一個陣列、依 (timestamp, id) 排序；
+#   文字欄位以字典編碼 (代碼 + 不重複值，-1 為 NULL)，指標的 NULL 以 NaN 表示
+# - manifest.json 記錄每個片段的 時間 / id 範圍、產線、筆數與指標總和；讀取時先以 manifest 剪枝，
+#   只開啟與查詢區間、產線有交集的片段，片段內再以二分搜尋切出時間範圍
+# - 片段寫入後不再修改；開啟過的片段保留在行程內的 LRU (ARCHIVE_CACHE_SEGMENTS)
+# - 片段先以 pending 狀態記入 manifest，熱資料表的刪除 commit 之後才改為 committed；讀取只看 committed
+
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+import numpy as np
+
+MANIFEST_NAME = 'manifest.json'
+FIELDS = ('id', 'line_name', 'product_name', 'timestamp', 'metric_a', 'metric_b', 'operator')
+TEXT_FIELDS = ('line_name', 'product_name', 'operator')
+METRICS = ('metric_a', 'metric_b')
+PARTITIONS = ('day', 'month')
+
+class ArchivedSample(namedtuple('ArchivedSample', FIELDS)):
+    """一筆封存紀錄；與查詢結果的 Row 一樣有屬性存取、_asdict() 與 _mapping，可以直接交給 fast_json 的 row encoder"""
+    __slots__ = ()
+
+    @property
+    def _mapping(self):
+        return self._asdict()
+
+
+def partition_key(timestamp, partition):
+    return timestamp.strftime('%Y-%m-%d' if partition == 'day' else '%Y-%m')
+
+
+def _encode_text(values):
+    uniques = sorted({value for value in values if value is not None})
+    index = {value: code for code, value in enumerate(uniques)}
+    codes = np.array([index[value] if value is not None else -1 for value in values], dtype=np.int32)
+    return codes, np.array(uniques, dtype=np.str_)
+
+
+def _decode_text(codes, uniques):
+    # 在最後補一個 None，代碼 -1 就會對應到它
+    return np.array(uniques.tolist() + [None], dtype=object)[codes]
+
+
+def _empty_columns():
+    columns = {'id': np.empty(0, dtype=np.int64), 'timestamp': np.empty(0, dtype='datetime64[us]')}
+    for name in METRICS:
+        columns[name] = np.empty(0)
+    for name in TEXT_FIELDS:
+        columns[name] = np.empty(0, dtype=object)
+    return columns
+
+
+def _take(columns, indexes):
+    return {name: values[indexes] for name, values in columns.items()}
+
+
+def _concat(parts):
+    if not parts:
+        return _empty_columns()
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def _ordered(columns):
+    """依 (timestamp, id) 排序"""
+    return _take(columns, np.lexsort((columns['id'], columns['timestamp'])))
+
+
+def to_rows(columns, indexes=None):
+    """欄位陣列 -> [ArchivedSample]；NaN 轉回 None"""
+    if indexes is not None:
+        columns = _take(columns, indexes)
+    values = []
+    for name in FIELDS:
+        items = columns[name].tolist()  # datetime64[us] 會轉成 datetime
+        if name in METRICS:
+            items = [None if item != item else item for item in items]
+        values.append(items)
+    return [ArchivedSample(*row) for row in zip(*values)]
+
+
+def _nulls(values):
+    if values.dtype == object:
+        return np.equal(values, None)
+    if values.dtype.kind == 'f':
+        return np.isnan(values)
+    return np.zeros(values.shape, dtype=bool)
+
+
+def sorted_rows(columns, sort_by, descending=False, limit=None, after=None):
+    """
+    依 (sort_by, id) 排序取前 limit 筆，NULL 視為最小值 (與列表 API 的 keyset 分頁相同)；
+    after=(值, id) 時只取排在它之後的紀錄。回傳 [ArchivedSample]。
+    """
+    values, ids = columns[sort_by], columns['id']
+    nulls = _nulls(values)
+    if values.dtype == object:
+        filled = np.where(nulls, '', values).astype(np.str_)
+    elif values.dtype.kind == 'f':
+        filled = np.where(nulls, 0.0, values)
+    else:
+        filled = values
+
+    candidates = np.arange(ids.size)
+    if after is not None:
+        value, last_id = after
+        if value is None:
+            keep = nulls & (ids < last_id) if descending else ~nulls | (ids > last_id)
+        else:
+            if sort_by == 'timestamp':
+                value = np.datetime64(value, 'us')
+            if descending:
+                keep = nulls | (~nulls & ((filled < value) | ((filled == value) & (ids < last_id))))
+            else:
+                keep = ~nulls & ((filled > value) | ((filled == value) & (ids > last_id)))
+        candidates = np.flatnonzero(keep)
+
+    order = candidates[np.lexsort((ids[candidates], filled[candidates], ~nulls[candidates]))]
+    if descending:
+        order = order[::-1]
+    if limit is not None:
+        order = order[:limit]
+    return to_rows(columns, order)
+
+
+def _clusters(segments):
+    """把時間範圍互相重疊的片段歸成一組 (依時間先後)；不同組之間的紀錄不會交錯"""
+    clusters = []
+    for entry in segments:
+        if clusters and entry['min_timestamp'] <= clusters[-1][1]:
+            clusters[-1][0].append(entry)
+            clusters[-1][1] = max(clusters[-1][1], entry['max_timestamp'])
+        else:
+            clusters.append([[entry], entry['max_timestamp']])
+    return [cluster for cluster, _ in clusters]
+
+
+class ArchiveStore:
+    """在 extensions.py 建立，create_app 中以 init_app(app) 初始化；ARCHIVE_DIR 為空時停用 (讀取一律回傳空結果)"""
+
+    def __init__(self, app=None):
+        self.root = None
+        self.partition = 'month'
+        self.cache_size = 8
+        self._manifest = None
+        self._manifest_stamp = None
+        self._segments = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config.get('ARCHIVE_DIR') or None
+        self.partition = app.config.get('ARCHIVE_PARTITION', 'month')
+        if self.partition not in PARTITIONS:
+            raise ValueError(f"ARCHIVE_PARTITION 必須是 {' / '.join(PARTITIONS)}")
+        self.cache_size = app.config.get('ARCHIVE_CACHE_SEGMENTS', 8)
+        with self._lock:
+            self._manifest = self._manifest_stamp = None
+            self._segments.clear()
+
+    @property
+    def enabled(self):
+        return self.root is not None
+
+    # --- manifest ---
+
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def manifest(self):
+        """目前的 manifest；其他行程 (例如排程的搬移) 更新檔案後會自動重新讀取"""
+        if not self.enabled:
+            return {'version': 1, 'segments': []}
+        path = self._manifest_path()
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return {'version': 1, 'segments': []}
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if stamp != self._manifest_stamp:
+                with open(path, encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+                self._manifest_stamp = stamp
+            return self._manifest
+
+    def _save_manifest(self, manifest):
+        # 先寫暫存檔再 rename，讀取端不會讀到寫到一半的 manifest
+        path = self._manifest_path()
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, path)
+        stat = os.stat(path)
+        with self._lock:
+            self._manifest, self._manifest_stamp = manifest, (stat.st_mtime_ns, stat.st_size)
+
+    def _update_manifest(self, change):
+        manifest = self.manifest()
+        segments = change([dict(entry) for entry in manifest['segments']])
+        self._save_manifest({'version': 1, 'segments': segments})
+
+    def segments(self, start=None, end=None, line_name=None, state='committed'):
+        """與 [start, end) 有交集、包含該產線的片段 (依最早時間排序)；這一步就是分區剪枝"""
+        start = start.isoformat() if start else None
+        end = end.isoformat() if end else None
+        return sorted(
+            (
+                entry for entry in self.manifest()['segments']
+                if entry['state'] == state
+                and (start is None or entry['max_timestamp'] >= start)
+                and (end is None or entry['min_timestamp'] < end)
+                and (line_name is None or line_name in entry['lines'])
+            ),
+            key=lambda entry: (entry['min_timestamp'], entry['min_id']),
+        )
+
+    def totals(self):
+        """所有 committed 片段的 筆數 / 指標總和 / 非空筆數 (與 aggregates 的累計欄位同名)"""
+        totals = {'total_count': 0, 'sum_metric_a': 0.0, 'sum_metric_b': 0.0, 'count_metric_a': 0, 'count_metric_b': 0}
+        for entry in self.segments():
+            for name in totals:
+                totals[name] += entry['totals'][name]
+        return totals
+
+    # --- 寫入 ---
+
+    def write_segment(self, rows):
+        """
+        把一批紀錄 (依 (timestamp, id) 排序，欄位同 FIELDS) 寫成一個片段，並以 pending 記入 manifest；
+        回傳 manifest 項目 (之後以 commit_segment / discard_segment 確認或撤銷)。
+        """
+        if not self.enabled:
+            raise RuntimeError('封存區未啟用 (ARCHIVE_DIR 未設定)')
+        rows = list(rows)
+        columns = {name: [getattr(row, name) for row in rows] for name in FIELDS}
+        arrays = {
+            'id': np.array(columns['id'], dtype=np.int64),
+            'timestamp': np.array(columns['timestamp'], dtype='datetime64[us]'),
+        }
+        for name in METRICS:
+            arrays[name] = np.array(columns[name], dtype=np.float64)  # None -> NaN
+        for name in TEXT_FIELDS:
+            arrays[f'{name}_codes'], arrays[f'{name}_values'] = _encode_text(columns[name])
+
+        partition = partition_key(rows[0].timestamp, self.partition)
+        relative = f'{partition}/segment-{arrays["id"].min()}-{uuid.uuid4().hex[:8]}.npz'
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(temp_path, path)
+
+        totals = {'total_count': len(rows)}
+        for name in METRICS:
+            valid = arrays[name][~np.isnan(arrays[name])]
+            totals[f'count_{name}'] = int(valid.size)
+            totals[f'sum_{name}'] = float(valid.sum())
+        entry = {
+            'file': relative,
+            'partition': partition,
+            'state': 'pending',
+            'rows': len(rows),
+            'min_timestamp': min(columns['timestamp']).isoformat(),
+            'max_timestamp': max(columns['timestamp']).isoformat(),
+            'min_id': int(arrays['id'].min()),
+            'max_id': int(arrays['id'].max()),
+            'lines': arrays['line_name_values'].tolist(),
+            'bytes': os.path.getsize(path),
+            'totals': totals,
+            'created_at': datetime.utcnow().replace(microsecond=0).isoformat(),
+        }
+        self._update_manifest(lambda segments: segments + [entry])
+        return entry
+
+    def commit_segment(self, entry):
+        def change(segments):
+            for item in segments:
+                if item['file'] == entry['file']:
+                    item['state'] = 'committed'
+            return segments
+        self._update_manifest(change)
+
+    def discard_segment(self, entry):
+        self._update_manifest(lambda segments: [item for item in segments if item['file'] != entry['file']])
+        try:
+            os.remove(os.path.join(self.root, entry['file']))
+        except FileNotFoundError:
+            pass
+
+    # --- 讀取 ---
+
+    def load(self, entry):
+        """讀取片段的所有欄位 (文字欄位解碼為 object 陣列)"""
+        key = entry['file']
+        with self._lock:
+            columns = self._segments.get(key)
+            if columns is not None:
+                self._segments.move_to_end(key)
+                return columns
+
+        with np.load(os.path.join(self.root, key), allow_pickle=False) as data:
+            columns = {'id': data['id'], 'timestamp': data['timestamp']}
+            for name in METRICS:
+                columns[name] = data[name]
+            for name in TEXT_FIELDS:
+                columns[name] = _decode_text(data[f'{name}_codes'], data[f'{name}_values'])
+
+        with self._lock:
+            self._segments[key] = columns
+            while len(self._segments) > self.cache_size:
+                self._segments.popitem(last=False)
+        return columns
+
+    def _slice(self, entry, start=None, end=None, line_name=None):
+        columns = self.load(entry)
+        timestamps = columns['timestamp']
+        low = int(np.searchsorted(timestamps, np.datetime64(start, 'us'))) if start else 0
+        high = int(np.searchsorted(timestamps, np.datetime64(end, 'us'))) if end else timestamps.size
+        columns = {name: values[low:high] for name, values in columns.items()}
+        if line_name is not None:
+            columns = _take(columns, np.flatnonzero(np.equal(columns['line_name'], line_name)))
+        return columns
+
+    def select(self, start=None, end=None, line_name=None):
+        """[start, end) 內 (可限定產線) 的封存紀錄，回傳依 (timestamp, id) 排序的 {欄位: 陣列}"""
+        parts = [self._slice(entry, start, end, line_name) for entry in self.segments(start, end, line_name)]
+        return _ordered(_concat(parts))
+
+    def iter_rows(self, start=None, end=None, line_name=None):
+        """依 (timestamp, id) 順序逐筆產生 ArchivedSample；一次只展開一組時間上重疊的片段"""
+        for cluster in _clusters(self.segments(start, end, line_name)):
+            columns = _ordered(_concat([self._slice(entry, start, end, line_name) for entry in cluster]))
+            yield from to_rows(columns)
+
+    def count(self, start=None, end=None, line_name=None):
+        return sum(self._slice(entry, start, end, line_name)['id'].size for entry in self.segments(start, end, line_name))
+
+    def minute_stats(self, start=None, end=None, line_name=None):
+        """依 (產線, 分鐘) 彙總封存紀錄，格式與 rollups._raw_minute_stats 相同"""
+        columns = self.select(start, end, line_name)
+        if not columns['id'].size:
+            return {}
+        minutes = columns['timestamp'].astype('datetime64[m]')
+        lines = columns['line_name'].astype(np.str_)
+        order = np.lexsort((minutes, lines))
+        minutes, lines = minutes[order], lines[order]
+        boundary = np.ones(order.size, dtype=bool)
+        boundary[1:] = (lines[1:] != lines[:-1]) | (minutes[1:] != minutes[:-1])
+        starts = np.flatnonzero(boundary)
+
+        per_metric = {}
+        for name in METRICS:
+            values = columns[name][order]
+            valid = ~np.isnan(values)
+            filled = np.where(valid, values, 0.0)
+            per_metric[name] = (
+                np.add.reduceat(valid.astype(np.int64), starts).tolist(),
+                np.add.reduceat(filled, starts).tolist(),
+                np.add.reduceat(filled * filled, starts).tolist(),
+                np.fmin.reduceat(values, starts).tolist(),
+                np.fmax.reduceat(values, starts).tolist(),
+            )
+        counts = np.diff(np.append(starts, order.size)).tolist()
+
+        result = {}
+        for position, index in enumerate(starts.tolist()):
+            stats = {'sample_count': counts[position]}
+            for name, (valid_counts, sums, sumsqs, lows, highs) in per_metric.items():
+                low, high = lows[position], highs[position]
+                stats.update({
+                    f'count_{name}': valid_counts[position], f'sum_{name}': sums[position],
+                    f'sumsq_{name}': sumsqs[position],
+                    f'min_{name}': None if low != low else low, f'max_{name}': None if high != high else high,
+                })
+            result[(str(lines[index]), minutes[index].item())] = stats
+        return result
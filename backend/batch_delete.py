@@ -0,0 +1,175 @@
+# backend/batch_delete.py
+# 大量刪除的共用引擎 (產線紀錄 / 廢水報告)：API、背景工作 (jobs.py) 與 CLI 都經過這裡。
+# - id 列表依 DELETE_CHUNK 切段，每段一個短交易：不會超過 SQLite 的參數數量上限，也不會長時間佔住寫入鎖
+# - 依條件 (產線 / 時間區間、廠商 / 報告日期) 的範圍刪除以 keyset 依索引順序每次取 batch_size 筆，
+#   以「條件 + 排在這一批最後一筆之前」刪除後 commit；下一批從索引開頭重新讀，已刪除的部分不會再掃描
+# - 產線紀錄經 sample_writes.delete_samples 在同一個交易中同步累計表與彙總表；
+#   廢水報告以一個 DELETE ... WHERE report_id IN (...) 刪除整批報告的項目，再刪除報告本身，不經 ORM cascade 逐筆載入刪除
+# - progress(已刪除數, 預計總數) 在每一批 commit 之後呼叫，可拋出例外中止 (已 commit 的批次保留)
+# 封存區 (archive.py) 的紀錄是唯讀的片段：依 id 刪除只會刪到熱資料表中的紀錄；範圍刪除若涵蓋已封存的紀錄
+# 則整個拒絕 (ArchivedRangeError)，不做只刪掉熱資料表那一部分的部分刪除。
+
+from datetime import datetime, time, timedelta
+from sqlalchemy import select, delete, func, and_, or_
+from models import Sample, WastewaterReport, WastewaterReportItem
+from extensions import cache, sample_archive
+from cache import TAG_WASTEWATER_REPORTS
+import sample_writes
+import search_index
+
+# 每個 DELETE ... IN 的 id 數 (SQLite 的參數數量有上限)
+DELETE_CHUNK = 500
+
+_report = WastewaterReport.__table__
+_item = WastewaterReportItem.__table__
+
+
+def chunks(ids, size=DELETE_CHUNK):
+    ids = list(ids)
+    for offset in range(0, len(ids), size):
+        yield ids[offset:offset + size]
+
+
+class ArchivedRangeError(ValueError):
+    """範圍刪除的條件涵蓋已封存的紀錄"""
+
+
+def _report_progress(progress, done, total):
+    if progress:
+        progress(done, total)
+
+
+# --- 產線紀錄 ---
+
+def sample_filters(line_name=None, start_time=None, end_time=None):
+    """產線 / 時間區間 [start_time, end_time) 的條件列表"""
+    criteria = []
+    if line_name:
+        criteria.append(Sample.line_name == line_name)
+    if start_time:
+        criteria.append(Sample.timestamp >= start_time)
+    if end_time:
+        criteria.append(Sample.timestamp < end_time)
+    return criteria
+
+
+def count_samples(session, **filters):
+    return session.execute(select(func.count()).select_from(Sample).where(*sample_filters(**filters))).scalar()
+
+
+def check_not_archived(line_name=None, start_time=None, end_time=None):
+    """範圍內有封存紀錄時拋出 ArchivedRangeError (封存片段不可修改，只刪熱資料表會留下一半的批次)"""
+    archived = sample_archive.count(start_time, end_time, line_name)
+    if archived:
+        raise ArchivedRangeError(
+            f'範圍內有 {archived} 筆紀錄已封存，封存區是唯讀的，無法刪除；'
+            f'請把 start_time 設在封存範圍之後，只刪除仍在資料表中 (保留期限內) 的紀錄'
+        )
+
+
+def delete_sample_ids(session, ids, chunk_size=DELETE_CHUNK, progress=None):
+    """依 id 刪除產線紀錄，每 chunk_size 個 id 一個交易；回傳刪除筆數"""
+    ids = sorted(set(ids))
+    deleted = 0
+    for done, chunk in enumerate(chunks(ids, chunk_size), 1):
+        deleted += sample_writes.delete_samples(session, Sample.id.in_(chunk))
+        session.commit()
+        _report_progress(progress, min(done * chunk_size, len(ids)), len(ids))
+    return deleted
+
+
+def delete_sample_range(session, line_name=None, start_time=None, end_time=None, batch_size=5000, progress=None):
+    """
+    刪除符合條件 (產線 / 時間區間) 的產線紀錄，依 (timestamp, id) 每 batch_size 筆一個交易；回傳刪除筆數。
+    至少需要一個條件 (不提供「刪除全部」)；範圍涵蓋封存紀錄時在刪除任何一筆之前拋出 ArchivedRangeError。
+    """
+    criteria = sample_filters(line_name, start_time, end_time)
+    if not criteria:
+        raise ValueError('範圍刪除至少需要 line_name、start_time 或 end_time 其中一個條件')
+    check_not_archived(line_name, start_time, end_time)
+    total = count_samples(session, line_name=line_name, start_time=start_time, end_time=end_time)
+    session.rollback()
+    deleted = 0
+    while True:
+        # 走 (line_name, timestamp, id) 或 (timestamp, id) 索引，只讀這一批的最後一筆
+        last = session.execute(
+            select(Sample.timestamp, Sample.id).where(*criteria)
+            .order_by(Sample.timestamp, Sample.id).offset(batch_size - 1).limit(1)
+        ).first()
+        batch = list(criteria)
+        if last is not None:
+            batch.append(or_(Sample.timestamp < last.timestamp,
+                             and_(Sample.timestamp == last.timestamp, Sample.id <= last.id)))
+        count = sample_writes.delete_samples(session, and_(*batch))
+        session.commit()
+        deleted += count
+        _report_progress(progress, deleted, max(total, deleted))
+        if last is None or not count:
+            return deleted
+
+
+# --- 廢水報告 ---
+
+def report_filters(vendor=None, status=None, start_date=None, end_date=None):
+    """廠商 / 狀態 / 報告日期區間 (結束日期包含當天) 的條件列表"""
+    criteria = []
+    if vendor:
+        criteria.append(_report.c.vendor == vendor)
+    if status:
+        criteria.append(_report.c.status == status)
+    if start_date:
+        criteria.append(_report.c.report_date >= datetime.combine(start_date, time.min))
+    if end_date:
+        criteria.append(_report.c.report_date < datetime.combine(end_date + timedelta(days=1), time.min))
+    return criteria
+
+
+def count_reports(session, **filters):
+    return session.execute(select(func.count()).select_from(_report).where(*report_filters(**filters))).scalar()
+
+
+def _delete_reports(session, report_ids):
+    """刪除一批報告 (連同項目與全文檢索索引)；回傳 (報告數, 項目數)，由呼叫端 commit"""
+    conn = session.connection()
+    items = conn.execute(delete(_item).where(_item.c.report_id.in_(report_ids))).rowcount
+    search_index.remove(conn, report_ids)
+    reports = conn.execute(delete(_report).where(_report.c.id.in_(report_ids))).rowcount
+    if reports or items:
+        cache.invalidate_on_commit(conn, TAG_WASTEWATER_REPORTS)
+    return reports, items
+
+
+def delete_report_ids(session, ids, chunk_size=DELETE_CHUNK, progress=None):
+    """依 id 刪除廢水報告，每 chunk_size 份一個交易；回傳 {'reports', 'items'}"""
+    ids = sorted(set(ids))
+    result = {'reports': 0, 'items': 0}
+    for done, chunk in enumerate(chunks(ids, chunk_size), 1):
+        reports, items = _delete_reports(session, chunk)
+        session.commit()
+        result['reports'] += reports
+        result['items'] += items
+        _report_progress(progress, min(done * chunk_size, len(ids)), len(ids))
+    return result
+
+
+def delete_report_range(session, vendor=None, status=None, start_date=None, end_date=None,
+                        batch_size=DELETE_CHUNK, progress=None):
+    """刪除符合條件的廢水報告，依 (report_date, id) 每 batch_size 份一個交易；回傳 {'reports', 'items'}"""
+    criteria = report_filters(vendor, status, start_date, end_date)
+    if not criteria:
+        raise ValueError('範圍刪除至少需要 vendor、status、start_date 或 end_date 其中一個條件')
+    batch_size = min(batch_size, DELETE_CHUNK)
+    total = count_reports(session, vendor=vendor, status=status, start_date=start_date, end_date=end_date)
+    session.rollback()
+    result = {'reports': 0, 'items': 0}
+    while True:
+        ids = session.execute(
+            select(_report.c.id).where(*criteria).order_by(_report.c.report_date, _report.c.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return result
+        reports, items = _delete_reports(session, ids)
+        session.commit()
+        result['reports'] += reports
+        result['items'] += items
+        _report_progress(progress, result['reports'], max(total, result['reports']))
@@ -0,0 +1,491 @@
+# backend/benchmark.py
+# API 效能基準 (flask benchmark)：
+# - 依規模 (10k / 1m / 10m 筆產線紀錄) 建立暫存的 SQLite 資料庫並寫入合成資料 (seed_data.py)；
+#   指定 --data-dir 時保留寫好資料的資料庫，之後直接複製使用 (千萬筆的寫入需要很久)
+# - 對 api_bp 的每個路由 / 方法送出 --requests 次請求：
+#   test-client 模式在行程內依序呼叫 (只量測應用程式本身)；
+#   http 模式啟動一個多執行緒的 WSGI 伺服器，以 --concurrency 個用戶端同時透過 HTTP 連線送出
+# - 輸出每個路由的 p50 / p95 / p99 延遲 (ms)、每秒請求數、錯誤數，以及處理請求期間行程的峰值 RSS
+# - 結果可與基準檔 (benchmark_baseline.json) 比較，超出容許範圍時 CLI 以非零結束碼結束，可放進 CI
+# 新增 API 路由時需要在 cases() 加上對應的請求 (或列入 SKIPPED)，否則基準測試會直接失敗。
+
+import csv
+import http.client
+import io
+import json
+import math
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from sqlalchemy import func, insert, select, text
+from werkzeug.serving import WSGIRequestHandler, make_server
+import jobs
+import control_charts
+import ingest
+import seed_data
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# 規模名稱 -> (產線紀錄筆數, 廢水報告份數)
+SCALES = {
+    '10k': (10_000, 500),
+    '1m': (1_000_000, 20_000),
+    '10m': (10_000_000, 100_000),
+}
+MODES = ('test-client', 'http')
+
+# 不量測的路由 (endpoint -> 原因)
+SKIPPED = {
+    'api.root': 'Swagger 文件在 /docs，根路徑固定回傳 404',
+    'api.statistics_metrics_stream': 'SSE 長連線，不會結束',
+}
+
+# 每個路由正式量測前先送出的請求數 (不計入結果)
+WARMUP = 5
+
+# bcrypt 刻意很慢，認證類的路由最多只送這麼多次
+AUTH_REQUESTS = 20
+
+# p95 的差距小於這個值 (ms) 時視為雜訊，不算退步
+MIN_DELTA_MS = 1.0
+
+BENCH_USERNAME = 'benchmark'
+BENCH_PASSWORD = 'benchmark-password'
+
+
+# --- 資料庫 ---
+
+def prepare_database(app_factory, migrations_dir, scale, path, data_dir=None, progress=print):
+    """在 path 建立 scale 規模的資料庫；回傳種子資料的結束時間 (查詢的時間區間以它為基準)"""
+    from flask_migrate import upgrade
+    from extensions import db
+
+    samples, reports = SCALES[scale]
+    if data_dir:
+        cached = os.path.join(data_dir, f'benchmark-{scale}.db')
+        meta_path = cached + '.json'
+        if os.path.exists(cached) and os.path.exists(meta_path):
+            progress(f'[{scale}] 使用已寫好的資料庫 {cached}')
+            shutil.copyfile(cached, path)
+            with open(meta_path, encoding='utf-8') as f:
+                return datetime.fromisoformat(json.load(f)['now'])
+
+    now = datetime.utcnow().replace(microsecond=0)
+    app = app_factory('sqlite:///' + path)
+    with app.app_context():
+        upgrade(directory=migrations_dir)
+        progress(f'[{scale}] 寫入 {samples} 筆產線紀錄與 {reports} 份報告...')
+        started = time.perf_counter()
+        seed_data.seed(db.session, samples=samples, reports=reports, now=now)
+        # 合併 WAL，複製單一檔案就是完整的資料庫
+        db.session.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+        db.session.remove()
+        db.engine.dispose()
+    progress(f'[{scale}] 寫入完成 ({time.perf_counter() - started:.1f}s)')
+
+    if data_dir:
+        os.makedirs(data_dir, exist_ok=True)
+        shutil.copyfile(path, cached)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'now': now.isoformat(), 'samples': samples, 'reports': reports}, f)
+    return now
+
+
+# --- 請求 ---
+
+def _get(path, **query):
+    url = path + ('?' + urlencode(query) if query else '')
+    return lambda i: (url, None, {})
+
+
+def _json(path, payload, headers=None):
+    def build(i):
+        return path, json.dumps(payload(i)).encode('utf-8'), {'Content-Type': 'application/json', **(headers or {})}
+    return build
+
+
+def _multipart_csv(path, rows):
+    def build(i):
+        records = [row for _, row in rows(i)]
+        text = io.StringIO()
+        writer = csv.DictWriter(text, fieldnames=list(records[0]))
+        writer.writeheader()
+        writer.writerows(records)
+        boundary = uuid.uuid4().hex
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="benchmark.csv"\r\n'
+            f'Content-Type: text/csv\r\n\r\n'
+        ).encode('utf-8') + text.getvalue().encode('utf-8') + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        return path, body, {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+    return build
+
+
+class _Pool:
+    """多個用戶端執行緒共用、每次取出一個值 (例如要刪除的紀錄 id)"""
+
+    def __init__(self, values):
+        self._values = iter(values)
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            return next(self._values, 0)
+
+
+def prepare_context(app, requests):
+    """建立基準測試用的帳號，並準備寫入類請求需要的 id 與 token"""
+    from flask_jwt_extended import create_refresh_token
+    from extensions import db
+    from models import Sample, User, WastewaterReport, WastewaterReportItem
+
+    with app.app_context():
+        user = User.query.filter_by(username=BENCH_USERNAME).first()
+        if user is None:
+            user = User(username=BENCH_USERNAME, email=f'{BENCH_USERNAME}@example.com')
+            user.set_password(BENCH_PASSWORD)
+            db.session.add(user)
+            db.session.commit()
+        report_id = db.session.execute(select(func.min(WastewaterReport.id))).scalar()
+        # DELETE 請求每次刪除一筆既有的最新紀錄 (每個模式 requests + 暖身的次數)
+        delete_ids = db.session.execute(
+            select(Sample.id).order_by(Sample.id.desc()).limit((requests + WARMUP) * len(MODES))
+        ).scalars().all()
+        # 報告的 DELETE 請求 (單筆 / 批次) 各自刪除一份另外建立的報告 (每份 4 個項目)，不影響種子資料
+        count = (requests + WARMUP) * len(MODES) * 2
+        report_ids = db.session.execute(
+            insert(WastewaterReport).returning(WastewaterReport.id, sort_by_parameter_order=True),
+            [{'vendor': '基準刪除', 'report_date': datetime(2000, 1, 1), 'status': '合格'}] * count,
+        ).scalars().all()
+        db.session.execute(insert(WastewaterReportItem), [
+            {'report_id': rid, 'item_name': name, 'value': 1.0, 'unit': 'mg/L', 'is_compliant': True}
+            for rid in report_ids for name in seed_data.ITEM_NAMES[:4]
+        ])
+        db.session.commit()
+        refresh_token = create_refresh_token(identity=str(user.id))
+        # 一個已完成、有結果檔的匯出工作 (下載結果)，以及取消請求每次取消一個排隊中的工作
+        job_id = jobs.submit(db.session, 'export-samples', {'line_name': seed_data.LINES[0]}).id
+        db.session.commit()
+        jobs.Worker(app, threads=1).run(burst=True)
+        cancel_ids = [jobs.submit(db.session, 'rebuild-aggregates').id for _ in range((requests + WARMUP) * len(MODES))]
+        db.session.commit()
+        # 管制圖基準的清除請求每次清除一條另外建立的產線 (時間早於種子資料，不影響其他查詢)；
+        # 先處理完全部紀錄並寫入檢查點，讀取請求量測的是平常只需補處理少量新紀錄的情況
+        reset_lines = [f'基準管制圖{n}' for n in range((requests + WARMUP) * len(MODES))]
+        ingest.insert_samples(db.session, enumerate(
+            {'line_name': name, 'metric_a': 50.0, 'metric_b': 1.2, 'timestamp': datetime(2000, 1, 1).isoformat()}
+            for name in reset_lines
+        ))
+        control_charts.monitor.sync(db.session, checkpoint=True)
+        db.session.remove()
+    return {'report_id': report_id, 'delete_ids': _Pool(delete_ids), 'refresh_token': refresh_token,
+            'job_id': job_id, 'cancel_ids': _Pool(cancel_ids),
+            'delete_report_ids': _Pool(report_ids[0::2]), 'batch_delete_report_ids': _Pool(report_ids[1::2]),
+            'reset_lines': _Pool(reset_lines)}
+
+
+def cases(app, now, context):
+    """
+    每個路由 / 方法的請求：{'name', 'endpoint', 'method', 'build': build(i) -> (path, body, headers), 'expect', 'limit'}。
+    """
+    day = timedelta(days=1)
+    week_ago = (now - 7 * day).isoformat()
+    yesterday = (now - day).isoformat()
+    report_path = f"/api/v1/wastewater-reports/{context['report_id']}"
+    job_path = f"/api/v1/jobs/{context['job_id']}"
+    line = seed_data.LINES[0]
+
+    def new_samples(i):
+        return [{'line_name': line, 'product_name': '產品1', 'metric_a': 50.0 + n % 7, 'metric_b': 1.2,
+                 'operator': 'OP01', 'timestamp': (now - timedelta(seconds=n)).isoformat()} for n in range(100)]
+
+    def report_payload(i):
+        return {
+            'vendor': f'基準廠商{i % 10}', 'status': '合格', 'report_date': now.date().isoformat(),
+            'items': [{'item_name': name, 'value': 10.0 + i % 5, 'unit': 'mg/L', 'standard': '<30', 'is_compliant': True}
+                      for name in seed_data.ITEM_NAMES[:4]],
+        }
+
+    def import_rows(i):
+        return seed_data.report_rows(10, now, rng=None)
+
+    def register(i):
+        name = f'bench-{uuid.uuid4().hex[:16]}'
+        return {'username': name, 'email': f'{name}@example.com', 'password': BENCH_PASSWORD}
+
+    items = [
+        ('api.specs', 'GET', _get('/api/v1/swagger.json'), (200,)),
+        ('api.doc', 'GET', _get('/api/v1/docs'), (200,)),
+        ('api.samples_sample_list', 'GET', _get('/api/v1/samples/', per_page=20), (200,)),
+        ('api.samples_sample_list', 'DELETE',
+         _json('/api/v1/samples/', lambda i: {'ids': [context['delete_ids'].next()]}), (200,)),
+        ('api.samples_sample_export', 'GET', _get('/api/v1/samples/export', line_name=line, start_time=yesterday), (200,)),
+        ('api.samples_sample_ingest', 'POST', _json('/api/v1/samples/ingest', new_samples), (201,)),
+        ('api.statistics_main_metrics', 'GET', _get('/api/v1/statistics/main-metrics'), (200,)),
+        ('api.statistics_line_metrics', 'GET', _get('/api/v1/statistics/line-metrics', **{'from': week_ago, 'to': yesterday}), (200,)),
+        ('api.charts_line_comparison_chart', 'GET', _get('/api/v1/charts/line-comparison', **{'from': week_ago, 'bucket': 'hour'}), (200,)),
+        ('api.analysis_line_analysis', 'GET',
+         _get('/api/v1/analysis/lines', **{'from': week_ago, 'to': yesterday, 'metric_a_lsl': 35, 'metric_a_usl': 65}), (200,)),
+        ('api.wastewater-reports_wastewater_report_list', 'GET', _get('/api/v1/wastewater-reports/', per_page=20), (200,)),
+        ('api.wastewater-reports_wastewater_report_list', 'POST', _json('/api/v1/wastewater-reports/', report_payload), (201,)),
+        ('api.wastewater-reports_wastewater_report_list', 'DELETE',
+         _json('/api/v1/wastewater-reports/', lambda i: {'ids': [context['batch_delete_report_ids'].next()]}), (200,)),
+        ('api.wastewater-reports_wastewater_report_summary_list', 'GET', _get('/api/v1/wastewater-reports/summary', per_page=20), (200,)),
+        ('api.wastewater-reports_wastewater_report_compliance', 'GET',
+         _get('/api/v1/wastewater-reports/compliance', group_by='vendor_item'), (200,)),
+        ('api.wastewater-reports_wastewater_report_search', 'GET', _get('/api/v1/wastewater-reports/search', q='廠商1'), (200,)),
+        ('api.wastewater-reports_wastewater_report_import', 'POST', _multipart_csv('/api/v1/wastewater-reports/import', import_rows), (201,)),
+        ('api.wastewater-reports_wastewater_report_resource', 'GET', _get(report_path), (200,)),
+        ('api.wastewater-reports_wastewater_report_resource', 'PUT', _json(report_path, report_payload), (200,)),
+        ('api.wastewater-reports_wastewater_report_resource', 'PATCH',
+         _json(report_path, lambda i: {'status': '合格' if i % 2 else '部分項目不合格'}), (200,)),
+        ('api.wastewater-reports_wastewater_report_resource', 'DELETE',
+         lambda i: (f"/api/v1/wastewater-reports/{context['delete_report_ids'].next()}", None, {}), (200,)),
+        ('api.jobs_job_list', 'GET', _get('/api/v1/jobs/', limit=20), (200,)),
+        ('api.jobs_job_list', 'POST',
+         _json('/api/v1/jobs/', lambda i: {'type': 'export-samples', 'params': {'line_name': line, 'start_time': yesterday}}),
+         (202,)),
+        ('api.jobs_job_report_import', 'POST', _multipart_csv('/api/v1/jobs/report-imports', import_rows), (202,)),
+        ('api.jobs_job_resource', 'GET', _get(job_path), (200,)),
+        ('api.jobs_job_cancel', 'POST',
+         lambda i: (f"/api/v1/jobs/{context['cancel_ids'].next()}/cancel", b'', {}), (202,)),
+        ('api.jobs_job_result', 'GET', _get(job_path + '/result'), (200,)),
+        ('api.control-charts_control_chart_lines', 'GET', _get('/api/v1/control-charts/lines'), (200,)),
+        ('api.control-charts_control_chart_line_reset', 'POST',
+         lambda i: (f"/api/v1/control-charts/lines/{context['reset_lines'].next()}/reset", b'', {}), (200,)),
+        ('api.control-charts_control_chart_alert_list', 'GET', _get('/api/v1/control-charts/alerts', limit=50), (200,)),
+        ('api.auth_user_register', 'POST', _json('/api/v1/auth/register', register), (201,)),
+        ('api.auth_user_login', 'POST',
+         _json('/api/v1/auth/login', lambda i: {'username': BENCH_USERNAME, 'password': BENCH_PASSWORD}), (200,)),
+        ('api.auth_token_refresh', 'POST',
+         _json('/api/v1/auth/refresh', lambda i: {}, {'Authorization': f"Bearer {context['refresh_token']}"}), (200,)),
+    ]
+    rules = {rule.endpoint: rule.rule for rule in app.url_map.iter_rules()}
+    return [
+        {'name': f'{method} {rules[endpoint]}', 'endpoint': endpoint, 'method': method, 'build': build, 'expect': expect,
+         'limit': AUTH_REQUESTS if endpoint.startswith('api.auth_') else None}
+        for endpoint, method, build, expect in items
+    ]
+
+
+def check_coverage(app, case_list):
+    """回傳 api_bp 中沒有對應請求 (也不在 SKIPPED 中) 的 '方法 endpoint'"""
+    covered = {(case['endpoint'], case['method']) for case in case_list}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if not rule.endpoint.startswith('api.') or rule.endpoint in SKIPPED:
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (rule.endpoint, method) not in covered:
+                missing.append(f'{method} {rule.endpoint}')
+    return missing
+
+
+# --- 量測 ---
+
+def _percentile(ordered, fraction):
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'p50_ms': round(_percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(_percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(_percentile(ordered, 0.99) * 1000, 3),
+        'rps': round(len(ordered) / elapsed, 1) if elapsed else None,
+    }
+
+
+def run_test_client(app, case, requests, warmup=WARMUP):
+    client = app.test_client()
+
+    def send(i):
+        path, body, headers = case['build'](i)
+        started = time.perf_counter()
+        response = client.open(path, method=case['method'], data=body, headers=headers)
+        response.get_data()  # 串流回應 (匯出) 也要讀完
+        elapsed = time.perf_counter() - started
+        response.close()
+        return elapsed, response.status_code in case['expect']
+
+    for i in range(warmup):
+        send(-1 - i)
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for i in range(requests):
+        elapsed, ok = send(i)
+        latencies.append(elapsed)
+        errors += not ok
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+class _QuietHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 保持連線，量測的不是每次重新建立 TCP 連線
+
+    def setup(self):
+        super().setup()
+        # 串流回應 (匯出) 分多次寫出，關閉 Nagle 演算法以免每次都等待對方的延遲 ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve(app):
+    """在背景執行緒啟動多執行緒的 WSGI 伺服器；回傳 (server, port)"""
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietHandler)
+    threading.Thread(target=server.serve_forever, name='benchmark-server', daemon=True).start()
+    return server, server.server_address[1]
+
+
+def run_http(port, case, requests, concurrency, warmup=WARMUP):
+    local = threading.local()
+    connections = []
+    lock = threading.Lock()
+
+    def connection():
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            with lock:
+                connections.append(conn)
+        return conn
+
+    def send(i):
+        path, body, headers = case['build'](i)
+        started = time.perf_counter()
+        for attempt in range(2):
+            conn = connection()
+            try:
+                conn.request(case['method'], path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                return time.perf_counter() - started, response.status in case['expect']
+            except (http.client.HTTPException, OSError):
+                # 伺服器關閉了閒置的連線：重新連線再送一次
+                conn.close()
+                local.conn = None
+        return time.perf_counter() - started, False
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='benchmark-client') as executor:
+        list(executor.map(send, range(-warmup, 0)))
+        started = time.perf_counter()
+        outcomes = list(executor.map(send, range(requests)))
+        elapsed = time.perf_counter() - started
+    for conn in connections:
+        conn.close()
+    return summarize([latency for latency, _ in outcomes], sum(not ok for _, ok in outcomes), elapsed)
+
+
+def reset_peak_rss():
+    """把行程的峰值 RSS 歸零 (Linux)，之後量到的峰值只包含處理請求的期間"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """行程的峰值 RSS (MB)；無法取得時 (例如 Windows) 回傳 None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_scale(app, now, scale, modes, requests, concurrency, progress=print):
+    """對一個已寫好資料的 app 跑完所有路由；回傳這個規模的結果"""
+    context = prepare_context(app, requests)
+    case_list = cases(app, now, context)
+    missing = check_coverage(app, case_list)
+    if missing:
+        raise RuntimeError('以下路由沒有對應的基準測試請求: ' + ', '.join(missing))
+
+    samples, reports = SCALES[scale]
+    result = {'samples': samples, 'reports': reports, 'modes': {}}
+    reset_peak_rss()
+    for mode in modes:
+        measured = result['modes'][mode] = {}
+        server = None
+        if mode == 'http':
+            server, port = serve(app)
+        try:
+            for case in case_list:
+                count = min(requests, case['limit'] or requests)
+                warmup = 1 if case['limit'] else WARMUP
+                if mode == 'http':
+                    measured[case['name']] = run_http(port, case, count, concurrency, warmup)
+                else:
+                    measured[case['name']] = run_test_client(app, case, count, warmup)
+                progress(f"[{scale}] {mode:<11} {case['name']:<48} {_format(measured[case['name']])}")
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def _format(stats):
+    return (f"p50={stats['p50_ms']:>8.2f}ms p95={stats['p95_ms']:>8.2f}ms p99={stats['p99_ms']:>8.2f}ms "
+            f"{stats['rps']:>8.1f} req/s errors={stats['errors']}")
+
+
+# --- 基準檔 ---
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def merge_baseline(baseline, results):
+    """以這次的結果更新基準檔中相同規模的資料 (其他規模保留)"""
+    merged = dict(baseline or {'version': 1, 'scales': {}})
+    merged['scales'] = {**merged.get('scales', {}), **results['scales']}
+    merged['requests'] = results['requests']
+    merged['concurrency'] = results['concurrency']
+    return merged
+
+
+def compare(results, baseline, tolerance):
+    """回傳退步的項目列表；延遲 (p95) 或峰值 RSS 超過基準 x (1 + tolerance)、吞吐量低於基準 / (1 + tolerance)，或出現錯誤"""
+    regressions = []
+    for scale, current in results['scales'].items():
+        base = (baseline or {}).get('scales', {}).get(scale)
+        for mode, measured in current['modes'].items():
+            for name, stats in measured.items():
+                if stats['errors']:
+                    regressions.append(f'[{scale}] {mode} {name}: {stats["errors"]} 個請求失敗')
+                expected = ((base or {}).get('modes', {}).get(mode) or {}).get(name)
+                if not expected:
+                    continue
+                if (stats['p95_ms'] > expected['p95_ms'] * (1 + tolerance)
+                        and stats['p95_ms'] - expected['p95_ms'] > MIN_DELTA_MS):
+                    regressions.append(f'[{scale}] {mode} {name}: p95 {expected["p95_ms"]}ms -> {stats["p95_ms"]}ms')
+                if expected.get('rps') and stats['rps'] and stats['rps'] < expected['rps'] / (1 + tolerance):
+                    regressions.append(f'[{scale}] {mode} {name}: {expected["rps"]} -> {stats["rps"]} req/s')
+        if base and base.get('peak_rss_mb') and current.get('peak_rss_mb') \
+                and current['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f'[{scale}] peak RSS {base["peak_rss_mb"]}MB -> {current["peak_rss_mb"]}MB')
+    return regressions
@@ -0,0 +1,258 @@
+# backend/cache.py
+# 讀取型 API 的回應快取：
+# - 預設為行程內 LRU (TTL + 筆數 / 位元組上限)；多個 worker 時可改用 Redis 共用 (需安裝 redis 套件)
+# - 快取鍵 = 命名空間 + 路徑 + 排序後的查詢參數 + 欄位遮罩 (X-Fields) + 各標籤的版本號；
+#   失效時只要把標籤的版本號加一，舊的快取項目就再也不會被讀到 (之後由 TTL / LRU 淘汰)
+# - 標籤只在交易 commit 之後才失效，避免其他請求在 commit 前把舊資料重新放回快取
+# - 回應一律帶 ETag；瀏覽器帶 If-None-Match 且內容未變時回傳 304
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# 各模型寫入時要失效的標籤
+TAG_SAMPLES = 'samples'
+TAG_WASTEWATER_REPORTS = 'wastewater_reports'
+
+_PENDING_TAGS = 'response_cache_pending_tags'
+
+
+class MemoryBackend:
+    """行程內的 LRU 快取，以筆數與總位元組數為上限，項目過期時間由 TTL 決定"""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, entry)
+        self._bytes = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[2]
+
+    def set(self, key, entry, ttl):
+        size = len(entry['body'])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (time.monotonic() + ttl, size, entry)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def tag_versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class RedisBackend:
+    """多個 worker 共用的快取 (Redis)；淘汰交由 Redis 的 TTL 與 maxmemory-policy 處理"""
+
+    def __init__(self, url, prefix='cm:cache:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND='redis' 需要安裝 redis 套件 (pip install redis)")
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._redis.get(self.prefix + key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key, entry, ttl):
+        self._redis.setex(self.prefix + key, ttl, json.dumps(entry, ensure_ascii=False))
+
+    def tag_versions(self, tags):
+        values = self._redis.mget([f'{self.prefix}tag:{tag}' for tag in tags])
+        return [int(value or 0) for value in values]
+
+    def bump(self, tags):
+        pipe = self._redis.pipeline()
+        for tag in tags:
+            pipe.incr(f'{self.prefix}tag:{tag}')
+        pipe.execute()
+
+    def clear(self):
+        for key in self._redis.scan_iter(self.prefix + '*'):
+            self._redis.delete(key)
+
+
+class NullBackend:
+    """停用快取 (仍會產生 ETag / 304)"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, entry, ttl):
+        pass
+
+    def tag_versions(self, tags):
+        return [0 for _ in tags]
+
+    def bump(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+
+class ResponseCache:
+    """Flask-RESTx Resource 方法的回應快取 (在 extensions.py 建立，create_app 中 init_app)"""
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.default_ttl = 30
+        self._model_tags = {}
+        self._listeners = []
+        event.listen(Engine, 'commit', self._on_commit)
+        event.listen(Engine, 'rollback', self._on_rollback)
+        event.listen(Session, 'after_flush', self._on_flush)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        if backend == 'memory':
+            self.backend = MemoryBackend(
+                max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024),
+                max_bytes=app.config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024),
+            )
+        elif backend == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        elif backend in (None, 'null'):
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f'不支援的 CACHE_BACKEND: {backend}')
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 30)
+        app.extensions['response_cache'] = self
+
+    # --- 失效 ---
+
+    def invalidate_on_commit(self, conn, *tags):
+        """在目前交易 commit 之後讓這些標籤失效 (rollback 時取消)"""
+        conn.info.setdefault(_PENDING_TAGS, set()).update(tags)
+
+    def tag_model(self, model, *tags):
+        """ORM 寫入 (新增 / 修改 / 刪除) 這個模型時，commit 後讓這些標籤失效"""
+        self._model_tags.setdefault(model, set()).update(tags)
+
+    def on_invalidate(self, callback):
+        """註冊標籤失效時的通知 callback(tags) (例如即時推播)；在 commit 的執行緒中呼叫，應儘快返回"""
+        self._listeners.append(callback)
+        return callback
+
+    def invalidate(self, *tags):
+        """立即讓這些標籤失效"""
+        if tags:
+            tags = sorted(set(tags))
+            self.backend.bump(tags)
+            for callback in self._listeners:
+                callback(tags)
+
+    def _on_commit(self, conn):
+        tags = conn.info.pop(_PENDING_TAGS, None)
+        if tags:
+            self.invalidate(*tags)
+
+    def _on_rollback(self, conn):
+        conn.info.pop(_PENDING_TAGS, None)
+
+    def _on_flush(self, session, flush_context):
+        tags = set()
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            tags.update(self._model_tags.get(type(obj), ()))
+        if tags:
+            self.invalidate_on_commit(session.connection(), *tags)
+
+    # --- 讀取 ---
+
+    def _key(self, namespace, tags):
+        args = sorted(request.args.items(multi=True))
+        # 帶欄位遮罩的請求只回傳部分欄位，不可與完整回應共用快取項目
+        mask = request.headers.get(current_app.config.get('RESTX_MASK_HEADER', 'X-Fields'), '')
+        versions = '.'.join(str(version) for version in self.backend.tag_versions(tags))
+        return f'{namespace}:{request.path}?{urlencode(args)}|{mask}#{versions}'
+
+    def cached(self, namespace, tags, ttl=None):
+        """
+        快取 Resource 方法的回應 (必須放在 @ns.marshal_with 等裝飾器的最外層)。
+        只快取 2xx 的回應；命中時直接回傳已序列化的 JSON，不再執行查詢與 marshalling。
+        """
+        def decorator(method):
+            @wraps(method)
+            def wrapper(resource, *args, **kwargs):
+                key = self._key(namespace, tags)
+                entry = self.backend.get(key)
+                if entry is None:
+                    result = method(resource, *args, **kwargs)
+                    if isinstance(result, Response):
+                        response = result
+                    else:
+                        response = resource.api.make_response(*_unpack(result))
+                    if response.is_streamed or not 200 <= response.status_code < 300:
+                        return response
+                    body = response.get_data()
+                    entry = {
+                        'status': response.status_code,
+                        'body': body.decode('utf-8'),
+                        'etag': hashlib.sha1(body).hexdigest(),
+                        'headers': {name: value for name, value in response.headers.items()
+                                    if name.lower().startswith('x-')},
+                    }
+                    self.backend.set(key, entry, ttl or self.default_ttl)
+                return _respond(entry)
+            return wrapper
+        return decorator
+
+
+def _unpack(result):
+    if isinstance(result, tuple):
+        data = result[0]
+        code = result[1] if len(result) > 1 else 200
+        headers = result[2] if len(result) > 2 else None
+        return data, code, headers
+    return result, 200, None
+
+
+def _respond(entry):
+    headers = {**entry['headers'], 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains(entry['etag']):
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(entry['body'], status=entry['status'], mimetype='application/json', headers=headers)
+    response.set_etag(entry['etag'])
+    return response
@@ -0,0 +1,211 @@
+# backend/compliance.py
+# 廢水檢測項目的合格率統計 (/wastewater-reports/compliance)：
+# - 標準值是自由文字 ('<30'、'6-9'、'30 以下'...)，在寫入時解析成數值上下限存進
+#   standard_min / standard_max，統計查詢直接比較數值欄位，不必每次解析字串
+# - 依廠商 / 檢測項目分組的合格率、超標數、檢測值百分位數與每月趨勢都在 SQL 以 GROUP BY 計算；
+#   百分位數以視窗函式 (ROW_NUMBER / COUNT OVER) 取最近秩 (nearest-rank)，SQLite 與 PostgreSQL 通用
+
+import re
+from datetime import datetime, time, timedelta
+from sqlalchemy import select, update, func, case, or_, event
+from models import WastewaterReport, WastewaterReportItem
+import downsampling
+
+PERCENTILES = (50, 90, 95)
+GROUPINGS = {
+    'item': ('item_name',),
+    'vendor': ('vendor',),
+    'vendor_item': ('vendor', 'item_name'),
+}
+
+_item = WastewaterReportItem.__table__
+_report = WastewaterReport.__table__
+
+# --- 標準值解析 ---
+
+_NUMBER = r'[-+]?\d+(?:\.\d+)?'
+_FULLWIDTH = str.maketrans('０１２３４５６７８９．－～＜＞≦≧＝', '0123456789.-~<>≤≥=')
+_RANGE = re.compile(rf'^({_NUMBER})\s*(?:-|~|至|到)\s*({_NUMBER})')
+_UPPER = re.compile(rf'^(?:<=?|≤|=<|不超過|不大於|小於|低於)\s*({_NUMBER})|^({_NUMBER})\s*(?:以下|以內)')
+_LOWER = re.compile(rf'^(?:>=?|≥|=>|不低於|不小於|大於|高於)\s*({_NUMBER})|^({_NUMBER})\s*以上')
+_PLAIN = re.compile(rf'^({_NUMBER})(?![\d.])')
+
+
+def parse_standard(text):
+    """
+    把標準值文字解析成 (下限, 上限)，沒有的一邊為 None；無法解析時回傳 (None, None)。
+    支援 '<30'、'≤30'、'30以下'、'>5'、'5 以上'、'6-9'、'6~9'，全形字元與單位 ('30 mg/L') 皆可；
+    只有一個數字時視為最大限值 (放流水標準的慣例)。界限值本身視為符合標準。
+    """
+    if not text:
+        return None, None
+    value = text.translate(_FULLWIDTH).replace(',', '').strip()
+    match = _RANGE.match(value)
+    if match:
+        low, high = sorted((float(match.group(1)), float(match.group(2))))
+        return low, high
+    match = _UPPER.match(value)
+    if match:
+        return None, float(match.group(1) or match.group(2))
+    match = _LOWER.match(value)
+    if match:
+        return float(match.group(1) or match.group(2)), None
+    match = _PLAIN.match(value)
+    if match:
+        return None, float(match.group(1))
+    return None, None
+
+
+def standard_limits(text):
+    """寫入檢測項目時要一併存入的 {'standard_min', 'standard_max'}"""
+    low, high = parse_standard(text)
+    return {'standard_min': low, 'standard_max': high}
+
+
+@event.listens_for(WastewaterReportItem, 'before_insert')
+@event.listens_for(WastewaterReportItem, 'before_update')
+def _set_limits(mapper, connection, target):
+    # ORM 逐筆寫入 (新增報告) 時自動解析；批次 INSERT / UPDATE 由呼叫端以 standard_limits 帶入
+    target.standard_min, target.standard_max = parse_standard(target.standard)
+
+
+def backfill(session, batch_size=5000):
+    """重新解析所有檢測項目的標準值 (升級後補齊既有資料用)；回傳更新的筆數"""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(_item.c.id, _item.c.standard, _item.c.standard_min, _item.c.standard_max)
+            .where(_item.c.id > last_id).order_by(_item.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        changes = []
+        for row in rows:
+            low, high = parse_standard(row.standard)
+            if (low, high) != (row.standard_min, row.standard_max):
+                changes.append({'id': row.id, 'standard_min': low, 'standard_max': high})
+        if changes:
+            session.execute(update(WastewaterReportItem), changes)
+            updated += len(changes)
+        session.commit()
+        last_id = rows[-1].id
+
+
+# --- 統計 ---
+
+def _filters(start_date=None, end_date=None, vendor=None, item_name=None):
+    criteria = []
+    if start_date:
+        criteria.append(_report.c.report_date >= datetime.combine(start_date, time.min))
+    if end_date:
+        # 結束日期包含當天
+        criteria.append(_report.c.report_date < datetime.combine(end_date + timedelta(days=1), time.min))
+    if vendor:
+        criteria.append(_report.c.vendor == vendor)
+    if item_name:
+        criteria.append(_item.c.item_name == item_name)
+    return criteria
+
+
+def _columns(names):
+    return [(_report.c.vendor if name == 'vendor' else _item.c.item_name).label(name) for name in names]
+
+
+def _exceeded(value, standard_min, standard_max):
+    """檢測值超出解析出的上下限 (1 / 0)；沒有可解析標準值的項目不計入"""
+    return case((or_(value > standard_max, value < standard_min), 1), else_=0)
+
+
+def _rate(compliant, total):
+    return round(compliant / total, 4) if total else None
+
+
+def group_stats(conn, group_by='item', **filters):
+    """
+    依 group_by 分組的合格數、超標數與檢測值統計；回傳 [dict]。
+    各檢測項目的單位與標準不同，只依廠商分組時不計算檢測值的統計與百分位數。
+    """
+    names = GROUPINGS[group_by]
+    with_values = 'item_name' in names
+    keys = _columns(names)
+    source = select(
+        *keys, _item.c.value, _item.c.is_compliant, _item.c.standard_min, _item.c.standard_max,
+        *((
+            func.row_number().over(partition_by=keys, order_by=_item.c.value).label('rank'),
+            func.count().over(partition_by=keys).label('size'),
+        ) if with_values else ()),
+    ).select_from(_item.join(_report, _item.c.report_id == _report.c.id)).where(*_filters(**filters)).subquery()
+
+    group_keys = [source.c[name] for name in names]
+    columns = [
+        *group_keys,
+        func.count().label('total'),
+        func.sum(case((source.c.is_compliant.is_(False), 1), else_=0)).label('non_compliant'),
+        func.sum(_exceeded(source.c.value, source.c.standard_min, source.c.standard_max)).label('exceedances'),
+    ]
+    if with_values:
+        columns += [
+            func.avg(source.c.value).label('avg'), func.min(source.c.value).label('min'),
+            func.max(source.c.value).label('max'),
+            func.min(source.c.standard_min).label('standard_min'),
+            func.max(source.c.standard_max).label('standard_max'),
+            # 最近秩百分位數：排序後第 ceil(p * n / 100) 筆
+            *(func.max(case((source.c.rank == (p * source.c.size + 99) // 100, source.c.value))).label(f'p{p}')
+              for p in PERCENTILES),
+        ]
+    rows = conn.execute(select(*columns).group_by(*group_keys).order_by(*group_keys)).mappings()
+
+    groups = []
+    for row in rows:
+        total, non_compliant = row['total'], row['non_compliant'] or 0
+        entry = {name: row.get(name) for name in GROUPINGS['vendor_item']}
+        entry.update({
+            'total': total, 'compliant': total - non_compliant, 'non_compliant': non_compliant,
+            'compliance_rate': _rate(total - non_compliant, total), 'exceedances': row['exceedances'] or 0,
+            'values': None, 'standard_min': None, 'standard_max': None,
+        })
+        if with_values:
+            entry['values'] = {
+                'avg': round(row['avg'], 4), 'min': row['min'], 'max': row['max'],
+                'percentiles': {f'p{p}': row[f'p{p}'] for p in PERCENTILES},
+            }
+            entry['standard_min'], entry['standard_max'] = row['standard_min'], row['standard_max']
+        groups.append(entry)
+    return groups
+
+
+def monthly_trend(conn, group_by='item', **filters):
+    """依 group_by 分組、每月的合格率；回傳 {分組鍵 tuple: [dict (依月份排序)]}"""
+    names = GROUPINGS[group_by]
+    keys = _columns(names)
+    month = downsampling.bucket_expression(_report.c.report_date, 'month', conn.dialect.name).label('month')
+    stmt = (
+        select(
+            *keys, month, func.count().label('total'),
+            func.sum(case((_item.c.is_compliant.is_(False), 1), else_=0)).label('non_compliant'),
+            func.sum(_exceeded(_item.c.value, _item.c.standard_min, _item.c.standard_max)).label('exceedances'),
+        )
+        .select_from(_item.join(_report, _item.c.report_id == _report.c.id))
+        .where(*_filters(**filters))
+        .group_by(*keys, month)
+        .order_by(*keys, month)
+    )
+    trend = {}
+    for row in conn.execute(stmt).mappings():
+        total, non_compliant = row['total'], row['non_compliant'] or 0
+        trend.setdefault(tuple(row[name] for name in names), []).append({
+            'month': row['month'][:7], 'total': total, 'non_compliant': non_compliant,
+            'compliance_rate': _rate(total - non_compliant, total), 'exceedances': row['exceedances'] or 0,
+        })
+    return trend
+
+
+def summarize(conn, group_by='item', trend=True, **filters):
+    """合格率統計 API 的回應本體"""
+    groups = group_stats(conn, group_by, **filters)
+    if trend:
+        by_key = monthly_trend(conn, group_by, **filters)
+        for entry in groups:
+            entry['trend'] = by_key.get(tuple(entry[name] for name in GROUPINGS[group_by]), [])
+    return {'group_by': group_by, 'groups': groups}
@@ -0,0 +1,420 @@
+# backend/control_charts.py
+# 串流管制圖 (/control-charts)：每條產線的 metric_a / metric_b 在記憶體中保存串流統計，
+# 每筆新紀錄 O(1) 更新，不必為了判斷產線是否漂移而重新查詢歷史資料。
+# - 長期基準以 Welford 演算法累計平均與變異數；另有 EWMA 與最近 window 筆的移動視窗 (累計和 / 平方和)
+# - 每筆紀錄先以「更新前」的基準換算成標準化值 z，再評估設定中啟用的規則 (Western Electric 規則、EWMA、規格界限)；
+#   規則由未觸發變為觸發時寫一筆警報 (ControlChartAlert)，持續觸發期間不重複寫入
+# - 依 Sample.id 順序處理 (主鍵範圍查詢)：寫入 commit 後由背景執行緒處理新的紀錄，讀取 API 也會先補上尚未處理的部分，
+#   因此其他行程 (或其他 worker) 寫入的紀錄同樣會被處理
+# - 狀態連同處理到的 Sample.id 定期寫入檢查點 (ControlChartCheckpoint)；有警報的批次一定和檢查點在同一個交易中寫入，
+#   重新啟動後從檢查點重算尚未寫入的部分，得到相同的狀態，不會漏掉或重複警報
+# - 多個行程同時處理時，以檢查點的 version 做條件式 UPDATE；被搶先的一方放棄這一批並重新載入檢查點
+# 刪除或封存紀錄不會回溯修改統計 (串流統計描述的是寫入過的資料)。
+# 依 id 處理假設 id 依 commit 順序遞增 (SQLite 的寫入是序列化的)；刪除最新的紀錄使 id 被重複使用時，游標會退回目前的最大 id。
+
+import math
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.exc import IntegrityError
+from models import Sample, ControlChartCheckpoint, ControlChartAlert
+from extensions import db, cache
+from cache import TAG_SAMPLES
+
+METRICS = ('metric_a', 'metric_b')
+CHECKPOINT_ID = 1
+
+# 規則名稱 -> 說明
+RULES = {
+    'we1': '單點超出 3σ 管制界限',
+    'we2': '連續 3 點中有 2 點超出 2σ (同一側)',
+    'we3': '連續 5 點中有 4 點超出 1σ (同一側)',
+    'we4': '連續 8 點落在中心線同一側',
+    'ewma': 'EWMA 超出管制界限',
+    'spec': '超出規格界限',
+}
+# 0 ~ 31 的位元數 (最近 3 / 5 點的位元紀錄中有幾點超出)
+_BITS = [bin(mask).count('1') for mask in range(32)]
+
+Settings = namedtuple('Settings', 'rules min_samples window ewma_lambda ewma_width spec_limits')
+
+_checkpoint = ControlChartCheckpoint.__table__
+_alert = ControlChartAlert.__table__
+_COLUMNS = (Sample.id, Sample.line_name, Sample.timestamp, Sample.metric_a, Sample.metric_b)
+
+
+class MetricState:
+    """一條產線一個指標的串流統計；observe() 為 O(1)"""
+
+    def __init__(self, window, data=None):
+        data = data or {}
+        self.count = data.get('count', 0)
+        self.mean = data.get('mean', 0.0)
+        self.m2 = data.get('m2', 0.0)
+        self.ewma = data.get('ewma')
+        self.window = deque(data.get('window', ()), maxlen=window)
+        # Western Electric 規則的狀態：最近 3 點是否超出 ±2σ、最近 5 點是否超出 ±1σ (位元紀錄，最新一點在最低位)，
+        # 以及連續落在中心線同一側的點數 (正數為上側，負數為下側，最多記到 8)
+        self.high2 = data.get('high2', 0)
+        self.low2 = data.get('low2', 0)
+        self.high1 = data.get('high1', 0)
+        self.low1 = data.get('low1', 0)
+        self.run = data.get('run', 0)
+        self.active = set(data.get('active', ()))
+        if 'window_sum' in data and len(self.window) == len(data['window']):
+            # 沿用檢查點中的累計和，重新啟動後的結果與不中斷時完全相同
+            self.window_sum = data['window_sum']
+            self.window_sumsq = data['window_sumsq']
+            self._since_resum = data.get('since_resum', 0)
+        else:
+            self._resum()
+
+    def _resum(self):
+        # 移動視窗的累計和每滿一輪重新加總一次，避免長時間加減造成浮點誤差累積 (攤提後仍為 O(1))
+        self.window_sum = math.fsum(self.window)
+        self.window_sumsq = math.fsum(value * value for value in self.window)
+        self._since_resum = 0
+
+    @property
+    def sigma(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def ready(self, settings):
+        """累計筆數達到 min_samples 且有變異時才有管制界限"""
+        return self.count >= settings.min_samples and self.sigma > 0
+
+    def observe(self, value, settings, spec_limits=(None, None)):
+        """加入一筆值；回傳這一筆新觸發的 [(規則, 觸發時的值, 中心線, 標準差)]"""
+        center, sigma = self.mean, self.sigma
+        ready = self.ready(settings)
+        lam = settings.ewma_lambda
+        self.ewma = value if self.ewma is None else lam * value + (1 - lam) * self.ewma
+
+        firing = {}
+        rules = settings.rules
+        if ready:
+            z = (value - center) / sigma
+            self.high2 = ((self.high2 << 1) | (z > 2)) & 0b111
+            self.low2 = ((self.low2 << 1) | (z < -2)) & 0b111
+            self.high1 = ((self.high1 << 1) | (z > 1)) & 0b11111
+            self.low1 = ((self.low1 << 1) | (z < -1)) & 0b11111
+            if z > 0:
+                self.run = min(self.run, 7) + 1 if self.run > 0 else 1
+            elif z < 0:
+                self.run = max(self.run, -7) - 1 if self.run < 0 else -1
+            else:
+                self.run = 0
+            if 'we1' in rules and abs(z) > 3:
+                firing['we1'] = value
+            if 'we2' in rules and max(_BITS[self.high2], _BITS[self.low2]) >= 2:
+                firing['we2'] = value
+            if 'we3' in rules and max(_BITS[self.high1], _BITS[self.low1]) >= 4:
+                firing['we3'] = value
+            if 'we4' in rules and abs(self.run) >= 8:
+                firing['we4'] = value
+            # EWMA 的漸近管制界限：center ± L·σ·sqrt(λ / (2 - λ))
+            if 'ewma' in rules and abs(self.ewma - center) > settings.ewma_width * sigma * math.sqrt(lam / (2 - lam)):
+                firing['ewma'] = self.ewma
+        lsl, usl = spec_limits
+        if 'spec' in rules and ((lsl is not None and value < lsl) or (usl is not None and value > usl)):
+            firing['spec'] = value
+
+        # Welford：更新長期基準
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        if len(self.window) == self.window.maxlen:
+            oldest = self.window[0]
+            self.window_sum -= oldest
+            self.window_sumsq -= oldest * oldest
+        self.window.append(value)
+        self.window_sum += value
+        self.window_sumsq += value * value
+        self._since_resum += 1
+        if self._since_resum >= self.window.maxlen:
+            self._resum()
+
+        fired = [(rule, firing[rule], center if ready else None, sigma if ready else None)
+                 for rule in firing if rule not in self.active]
+        self.active = set(firing)
+        return fired
+
+    def summary(self, settings):
+        ready = self.ready(settings)
+        sigma = self.sigma
+        lam = settings.ewma_lambda
+        ewma_half_width = settings.ewma_width * sigma * math.sqrt(lam / (2 - lam))
+        size = len(self.window)
+        window_mean = self.window_sum / size if size else None
+        window_sigma = (math.sqrt(max(self.window_sumsq - size * window_mean ** 2, 0.0) / (size - 1))
+                        if size > 1 else None)
+        return {
+            'count': self.count,
+            'ready': ready,
+            'mean': self.mean if self.count else None,
+            'sigma': sigma if self.count > 1 else None,
+            'ucl': self.mean + 3 * sigma if ready else None,
+            'lcl': self.mean - 3 * sigma if ready else None,
+            'ewma': self.ewma,
+            'ewma_ucl': self.mean + ewma_half_width if ready else None,
+            'ewma_lcl': self.mean - ewma_half_width if ready else None,
+            'window': {'count': size, 'mean': window_mean, 'sigma': window_sigma},
+            'active_rules': sorted(self.active),
+        }
+
+    def to_dict(self):
+        return {
+            'count': self.count, 'mean': self.mean, 'm2': self.m2, 'ewma': self.ewma,
+            'window': list(self.window), 'window_sum': self.window_sum, 'window_sumsq': self.window_sumsq,
+            'since_resum': self._since_resum, 'high2': self.high2, 'low2': self.low2, 'high1': self.high1,
+            'low1': self.low1, 'run': self.run, 'active': sorted(self.active),
+        }
+
+
+class _Conflict(Exception):
+    """檢查點已被其他行程更新"""
+
+
+class ControlChartMonitor:
+    """
+    行程內的串流管制圖 (module 層級的 monitor，create_app 中 init_app)。
+    sync() 處理 id 大於游標的紀錄；notify() 在 Sample 寫入 commit 後喚醒背景執行緒 (CONTROL_CHARTS_BACKGROUND 開啟時)。
+    """
+
+    def __init__(self):
+        self.settings = Settings(tuple(RULES), 30, 50, 0.2, 3.0, {metric: (None, None) for metric in METRICS})
+        self.batch_size = 5000
+        self.checkpoint_seconds = 30
+        self.poll_interval = 5.0
+        self.background = False
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._app = None
+        self._reset_state()
+
+    def init_app(self, app):
+        spec_limits = app.config.get('ANALYSIS_SPEC_LIMITS') or {}
+        self.settings = Settings(
+            rules=tuple(app.config.get('CONTROL_RULES', self.settings.rules)),
+            min_samples=max(app.config.get('CONTROL_MIN_SAMPLES', self.settings.min_samples), 2),
+            window=app.config.get('CONTROL_WINDOW', self.settings.window),
+            ewma_lambda=app.config.get('CONTROL_EWMA_LAMBDA', self.settings.ewma_lambda),
+            ewma_width=app.config.get('CONTROL_EWMA_WIDTH', self.settings.ewma_width),
+            spec_limits={metric: tuple(spec_limits.get(metric) or (None, None)) for metric in METRICS},
+        )
+        unknown = set(self.settings.rules) - set(RULES)
+        if unknown:
+            raise ValueError(f"不支援的 CONTROL_RULES: {', '.join(sorted(unknown))} (可用: {', '.join(RULES)})")
+        self.batch_size = app.config.get('CONTROL_BATCH_SIZE', self.batch_size)
+        self.checkpoint_seconds = app.config.get('CONTROL_CHECKPOINT_SECONDS', self.checkpoint_seconds)
+        self.poll_interval = app.config.get('CONTROL_POLL_SECONDS', self.poll_interval)
+        self.background = app.config.get('CONTROL_CHARTS_BACKGROUND', self.background)
+        self._app = app
+        with self._lock:
+            self._loaded = False
+
+    def _reset_state(self):
+        self._lines = {}
+        self._cursor = 0
+        self._version = 0       # 0 = 資料庫中還沒有檢查點
+        self._bind = None
+        self._pending = 0       # 處理過但尚未寫入檢查點的筆數
+        self._last_checkpoint = time.monotonic()
+        self._loaded = False
+
+    # --- 背景處理 ---
+
+    def notify(self):
+        """有新的 Sample 寫入 commit 時呼叫 (只設旗標並確認背景執行緒在執行)"""
+        if not self.background or self._app is None:
+            return
+        self._wake.set()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='control-chart-monitor', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            app = self._app
+            try:
+                with app.app_context():
+                    self.sync(db.session)
+            except Exception:
+                app.logger.exception('control chart monitor failed')
+            # 也定期檢查一次，涵蓋其他行程的寫入並寫入到期的檢查點
+            self._wake.wait(timeout=self.poll_interval)
+            self._wake.clear()
+
+    # --- 處理 ---
+
+    def sync(self, session, max_rows=None, checkpoint=False):
+        """
+        處理尚未處理的紀錄 (最多 max_rows 筆)；checkpoint=True 時結束前一定寫入檢查點。
+        回傳 {'processed', 'alerts'}；與其他行程衝突時放棄未寫入的部分，下次呼叫從資料庫的檢查點接續。
+        """
+        processed = alerts = 0
+        with self._lock:
+            try:
+                self._refresh(session)
+                while max_rows is None or processed < max_rows:
+                    limit = self.batch_size if max_rows is None else min(self.batch_size, max_rows - processed)
+                    rows = session.execute(
+                        select(*_COLUMNS).where(Sample.id > self._cursor).order_by(Sample.id).limit(limit)
+                    ).all()
+                    session.rollback()  # 結束讀取交易，之後的寫入從新的交易開始
+                    if not rows:
+                        break
+                    new_alerts = self._apply(rows)
+                    processed += len(rows)
+                    if new_alerts or time.monotonic() - self._last_checkpoint >= self.checkpoint_seconds:
+                        self._write_checkpoint(session, new_alerts)
+                        alerts += len(new_alerts)
+                if checkpoint and (self._pending or not self._version):
+                    self._write_checkpoint(session, [])
+            except (_Conflict, IntegrityError):
+                session.rollback()
+                self._loaded = False
+            except Exception:
+                session.rollback()
+                self._loaded = False
+                raise
+        return {'processed': processed, 'alerts': alerts}
+
+    def _refresh(self, session):
+        """第一次使用、資料庫換了、或其他行程寫入了新的檢查點時重新載入"""
+        conn = session.connection()
+        bind = str(conn.engine.url)
+        version = conn.execute(select(_checkpoint.c.version).where(_checkpoint.c.id == CHECKPOINT_ID)).scalar() or 0
+        if not self._loaded or bind != self._bind or version != self._version:
+            self._load(conn, bind)
+        max_id = conn.execute(select(func.max(Sample.id))).scalar() or 0
+        if max_id < self._cursor:
+            # 最新的紀錄被刪除：之後寫入的紀錄可能重複使用這些 id
+            self._cursor = max_id
+            self._pending += 1
+
+    def _load(self, conn, bind):
+        self._reset_state()
+        row = conn.execute(select(_checkpoint).where(_checkpoint.c.id == CHECKPOINT_ID)).first()
+        if row is not None:
+            window = self.settings.window
+            self._lines = {
+                line_name: {metric: MetricState(window, metrics.get(metric)) for metric in METRICS}
+                for line_name, metrics in (row.state.get('lines') or {}).items()
+            }
+            self._cursor = row.last_sample_id
+            self._version = row.version
+        self._bind = bind
+        self._loaded = True
+
+    def _apply(self, rows):
+        alerts = []
+        settings = self.settings
+        for row in rows:
+            metrics = self._lines.get(row.line_name)
+            if metrics is None:
+                metrics = self._lines[row.line_name] = {metric: MetricState(settings.window) for metric in METRICS}
+            for metric in METRICS:
+                value = getattr(row, metric)
+                if value is None:
+                    continue
+                for rule, observed, center, sigma in metrics[metric].observe(value, settings, settings.spec_limits[metric]):
+                    alerts.append({
+                        'line_name': row.line_name, 'metric': metric, 'rule': rule,
+                        'sample_id': row.id, 'sample_timestamp': row.timestamp,
+                        'value': observed, 'center_line': center, 'sigma': sigma,
+                    })
+        self._cursor = rows[-1].id
+        self._pending += len(rows)
+        return alerts
+
+    def _write_checkpoint(self, session, alerts):
+        """把狀態與警報寫在同一個交易中；檢查點已被其他行程更新時拋出 _Conflict"""
+        conn = session.connection()
+        now = datetime.utcnow()
+        values = {
+            'last_sample_id': self._cursor,
+            'state': {'lines': {
+                line_name: {metric: state.to_dict() for metric, state in metrics.items()}
+                for line_name, metrics in self._lines.items()
+            }},
+            'version': self._version + 1,
+            'updated_at': now,
+        }
+        if self._version == 0:
+            conn.execute(insert(_checkpoint).values(id=CHECKPOINT_ID, **values))
+        elif conn.execute(
+            update(_checkpoint)
+            .where(_checkpoint.c.id == CHECKPOINT_ID, _checkpoint.c.version == self._version)
+            .values(**values)
+        ).rowcount != 1:
+            raise _Conflict()
+        if alerts:
+            conn.execute(insert(_alert), [dict(alert, created_at=now) for alert in alerts])
+        session.commit()
+        self._version += 1
+        self._pending = 0
+        self._last_checkpoint = time.monotonic()
+
+    # --- 讀取 / 管理 ---
+
+    def lines(self, line_name=None):
+        """目前各產線的統計摘要 (呼叫前先 sync)"""
+        with self._lock:
+            return {
+                'last_sample_id': self._cursor,
+                'lines': [
+                    {'line_name': name, **{metric: state.summary(self.settings) for metric, state in metrics.items()}}
+                    for name, metrics in sorted(self._lines.items())
+                    if line_name is None or name == line_name
+                ],
+            }
+
+    def reset(self, session, line_name=None):
+        """
+        清除一條產線的基準 (例如製程調整後)，之後的紀錄重新建立管制界限；回傳該產線是否存在。
+        line_name 為 None 時清除全部狀態與警報，從全部歷史重新計算 (flask control-charts --rebuild)。
+        """
+        with self._lock:
+            if line_name is None:
+                try:
+                    conn = session.connection()
+                    conn.execute(delete(_alert))
+                    conn.execute(delete(_checkpoint))
+                    session.commit()
+                finally:
+                    self._reset_state()
+                return True
+            for _ in range(3):
+                self.sync(session)
+                if not self._loaded:
+                    continue
+                if line_name not in self._lines:
+                    return False
+                del self._lines[line_name]
+                try:
+                    self._write_checkpoint(session, [])
+                    return True
+                except (_Conflict, IntegrityError):
+                    session.rollback()
+                    self._loaded = False
+                except Exception:
+                    session.rollback()
+                    self._loaded = False
+                    raise
+            raise RuntimeError('檢查點持續被其他行程更新，請稍後再試')
+
+
+monitor = ControlChartMonitor()
+
+
+@cache.on_invalidate
+def _wake_monitor(tags):
+    if TAG_SAMPLES in tags:
+        monitor.notify()
@@ -0,0 +1,97 @@
+# backend/downsampling.py
+# 圖表用的時間分桶與降採樣工具
+
+import numpy as np
+from sqlalchemy import func
+
+# 分桶粒度 -> SQLite strftime 格式；輸出一律是 ISO 8601 字串，方便直接當作圖表 X 軸標籤
+_SQLITE_BUCKET_FORMATS = {
+    'minute': '%Y-%m-%dT%H:%M:00',
+    'hour': '%Y-%m-%dT%H:00:00',
+    'day': '%Y-%m-%dT00:00:00',
+    'month': '%Y-%m-01T00:00:00',
+}
+BUCKETS = tuple(_SQLITE_BUCKET_FORMATS)
+
+
+def bucket_expression(column, bucket, dialect_name):
+    """回傳把時間欄位截斷到指定粒度的 SQL 運算式 (結果為 ISO 8601 字串)"""
+    if bucket not in _SQLITE_BUCKET_FORMATS:
+        raise ValueError(f'不支援的分桶粒度: {bucket}')
+    if dialect_name == 'postgresql':
+        return func.to_char(func.date_trunc(bucket, column), 'YYYY-MM-DD"T"HH24:MI:SS')
+    return func.strftime(_SQLITE_BUCKET_FORMATS[bucket], column)
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降採樣。
+    points 為依 x 排序的 [(x, y, ...), ...]，x 必須是數值 (例如 epoch 秒)，其後可附帶任意資料；
+    回傳最多 threshold 個點，保留頭尾兩點以及視覺上最重要的轉折點。
+    """
+    n = len(points)
+    if threshold >= n:
+        return list(points)
+    threshold = max(threshold, 3)
+
+    sampled = [points[0]]
+    # 扣掉頭尾兩點，剩下的點平均分成 threshold - 2 個桶
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # 下一個桶的平均點，作為三角形的第三個頂點
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        next_slice = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(p[0] for p in next_slice) / len(next_slice)
+        avg_y = sum(p[1] for p in next_slice) / len(next_slice)
+
+        # 在目前的桶中，找出與前一個選中點、下一桶平均點構成最大三角形面積的點
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = points[a][0], points[a][1]
+        best_area = -1.0
+        best_index = start
+        for j in range(start, end):
+            x, y = points[j][0], points[j][1]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best_index = j
+        sampled.append(points[best_index])
+        a = best_index
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def lttb_indices(x, y, threshold):
+    """
+    lttb 的 NumPy 版本，給大量的原始紀錄使用：x (已排序的數值) 與 y 為等長陣列，
+    回傳保留點的索引陣列 (分桶與選點規則與 lttb 相同)。
+    """
+    n = x.size
+    if threshold >= n:
+        return np.arange(n)
+    threshold = max(threshold, 3)
+    # 以第一點為原點，累加和才不會因為 epoch 秒太大而失去精度
+    x = x - x[0]
+    every = (n - 2) / (threshold - 2)
+    # 第 k 個桶是 [edges[k], edges[k + 1])；最後一個「下一桶」截到 n
+    edges = np.minimum((np.arange(threshold) * every).astype(np.int64) + 1, n)
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = edges[2:] - edges[1:-1]
+    avg_x = (sum_x[edges[2:]] - sum_x[edges[1:-1]]) / sizes
+    avg_y = (sum_y[edges[2:]] - sum_y[edges[1:-1]]) / sizes
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - avg_x[i]) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y[i] - ay))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
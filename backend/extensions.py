@@ -1,9 +1,34 @@
 # backend/extensions.py (正確且完整的版本)
 
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
+from flask_migrate import Migrate
+from sqlalchemy import event
 from flask_jwt_extended import JWTManager
+from cache import ResponseCache
+from passwords import PasswordHasher
+from profiling import RequestProfiler
+from archive import ArchiveStore
 
 db = SQLAlchemy()
-bcrypt = Bcrypt()
-jwt = JWTManager()
\ No newline at end of file
+migrate = Migrate()
+jwt = JWTManager()
+cache = ResponseCache()
+hasher = PasswordHasher()
+profiler = RequestProfiler()
+sample_archive = ArchiveStore()
+
+
+def configure_sqlite(app):
+    """在每個新的 SQLite 連線上套用 Config.SQLITE_PRAGMAS (必須在 db.init_app 之後呼叫)"""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
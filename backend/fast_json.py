@@ -0,0 +1,108 @@
+# backend/fast_json.py
+# 大量資料列表的快速序列化路徑：
+# - 直接 select 欄位 (Row tuple)，依 Flask-RESTx model 的欄位型別轉成 dict，不建立 ORM 物件、
+#   也不經過 marshal() 逐欄位建立 OrderedDict
+# - 有安裝 orjson 時以 orjson 編碼，否則退回標準函式庫 json
+# - 輸出內容與 marshal() 相同；Swagger 文件以 documented() 標註與 marshal_with 相同的回應模型
+# - 用戶端帶 X-Fields 欄位遮罩時，退回 marshal() 以維持原本的遮罩行為
+
+import json
+from datetime import date, datetime
+from flask import Response, current_app, request
+from flask_restx import fields, marshal
+from flask_restx.utils import merge
+from profiling import track_serialization
+
+try:
+    import orjson
+except ImportError:  # orjson 為選用套件
+    orjson = None
+
+
+def dumps(data):
+    """編碼為 UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _isoformat(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        # 與 fields.DateTime 相同：date 先轉成當天 00:00 的 datetime
+        return datetime(value.year, value.month, value.day).isoformat()
+    return value
+
+
+def _converter(field):
+    if isinstance(field, fields.DateTime):
+        return _isoformat
+    if isinstance(field, fields.Boolean):
+        return bool
+    if isinstance(field, fields.Integer):
+        return int
+    if isinstance(field, fields.Float):
+        return float
+    if isinstance(field, fields.String):
+        return str
+    return None
+
+
+def row_encoder(model):
+    """
+    依 model 的 (非巢狀) 欄位產生 encode(row) -> dict 的函式；row 為 Row 或 mapping，
+    欄位名稱 (或 field.attribute) 必須與 select 的欄位 label 一致。
+    """
+    plan = []
+    for name, field in model.items():
+        if isinstance(field, type):
+            field = field()  # model 中可以直接寫 fields.String 這類未實例化的欄位
+        if isinstance(field, (fields.Nested, fields.List)):
+            continue
+        plan.append((name, field.attribute or name, _converter(field), field.default))
+
+    def encode(row):
+        mapping = row._mapping if hasattr(row, '_mapping') else row
+        record = {}
+        for name, key, convert, default in plan:
+            value = mapping.get(key)
+            if value is None:
+                # 與 marshal() 相同：缺少或為 None 時輸出欄位的預設值
+                record[name] = default
+            else:
+                record[name] = value if convert is None else convert(value)
+        return record
+
+    return encode
+
+
+def columnar(records, model):
+    """把 [{欄位: 值}, ...] 轉成 {欄位: [值, ...]} (圖表用戶端較方便、也更小)"""
+    names = [name for name, field in model.items() if not isinstance(field, (fields.Nested, fields.List))]
+    return {name: [record[name] for record in records] for name in names}
+
+
+def documented(model, as_list=False, code=200, description=None):
+    """在 Swagger 文件中標註與 ns.marshal_with / marshal_list_with 相同的回應模型 (不做 marshalling)"""
+    def wrapper(func):
+        doc = {
+            'responses': {str(code): (description, [model] if as_list else model, {})},
+            '__mask__': True,
+        }
+        func.__apidoc__ = merge(getattr(func, '__apidoc__', {}), doc)
+        return func
+    return wrapper
+
+
+def response(data, model=None, status=200, headers=None):
+    """
+    把已轉成 JSON 相容型別的資料編碼成回應。
+    model 為這份資料的 restx model (列表時傳 [model])；用戶端帶 X-Fields 時依 model 套用遮罩。
+    """
+    mask = request.headers.get(current_app.config['RESTX_MASK_HEADER'])
+    with track_serialization():
+        if mask and model is not None:
+            data = marshal(data, model[0] if isinstance(model, list) else model, mask=mask)
+        body = dumps(data)
+    return Response(body, status=status, headers=headers, mimetype='application/json')
@@ -0,0 +1,121 @@
+# backend/ingest.py
+# 產線紀錄的批次寫入：
+# 以純 Python 驗證每一筆資料 (不建立 RESTx model / ORM 物件)，
+# 再以 Core insert() executemany 分段寫入，每一段是一個短交易。
+
+import math
+from datetime import datetime, timezone
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from models import Sample
+import sample_writes
+
+_sample = Sample.__table__
+
+# 字串欄位 -> 最大長度 (與 models.Sample 的欄位定義一致)
+_STRING_FIELDS = {'line_name': 50, 'product_name': 100, 'operator': 50}
+_FLOAT_FIELDS = ('metric_a', 'metric_b')
+ALLOWED_FIELDS = set(_STRING_FIELDS) | set(_FLOAT_FIELDS) | {'timestamp'}
+
+
+def _parse_timestamp(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+    if not isinstance(value, str):
+        raise ValueError
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        # 資料庫內一律存 UTC naive datetime (與 Sample.timestamp 的 default=datetime.utcnow 一致)
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def validate_sample(record, now=None):
+    """驗證單筆輸入；回傳 (可寫入的 dict, 錯誤訊息列表)"""
+    if not isinstance(record, dict):
+        return None, ['每一筆資料必須是 JSON 物件']
+
+    errors = []
+    unknown = set(record) - ALLOWED_FIELDS
+    if unknown:
+        errors.append(f"不支援的欄位: {', '.join(sorted(unknown))}")
+
+    row = {}
+    for name, max_length in _STRING_FIELDS.items():
+        value = record.get(name)
+        if value is None:
+            if name == 'line_name':
+                errors.append('line_name 為必填')
+            row[name] = None
+        elif not isinstance(value, str) or not value.strip():
+            errors.append(f'{name} 必須是非空字串')
+        elif len(value) > max_length:
+            errors.append(f'{name} 長度不可超過 {max_length}')
+        else:
+            row[name] = value
+
+    for name in _FLOAT_FIELDS:
+        value = record.get(name)
+        if value is None:
+            row[name] = None
+        elif isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            errors.append(f'{name} 必須是有限的數值')
+        else:
+            row[name] = float(value)
+
+    if record.get('timestamp') is None:
+        row['timestamp'] = now or datetime.utcnow()
+    else:
+        try:
+            row['timestamp'] = _parse_timestamp(record['timestamp'])
+        except (ValueError, OverflowError, OSError):
+            errors.append('timestamp 必須是 ISO 8601 字串或 Unix 秒數')
+
+    return (None if errors else row), errors
+
+
+def insert_samples(session, records, chunk_size=1000):
+    """
+    驗證並分段寫入產線紀錄。
+    records 可以是任何可迭代物件 (例如逐行解析 NDJSON 的 generator)，元素為 (index, record)。
+    回傳 (成功筆數, 拒絕列表 [{'index': ..., 'errors': [...]}])。
+    """
+    inserted = 0
+    rejects = []
+    chunk = []
+    now = datetime.utcnow()
+
+    def flush():
+        nonlocal inserted
+        indexes = [index for index, _ in chunk]
+        rows = [row for _, row in chunk]
+        try:
+            conn = session.connection()
+            # executemany + RETURNING：一次取回整段的 id，讓累計表與彙總表可以在同一個交易中更新
+            ids = conn.execute(
+                insert(_sample).returning(_sample.c.id, sort_by_parameter_order=True),
+                rows,
+            ).scalars().all()
+            for row, new_id in zip(rows, ids):
+                row['id'] = new_id
+            sample_writes.samples_inserted(conn, rows)
+            session.commit()
+            inserted += len(rows)
+        except SQLAlchemyError as e:
+            session.rollback()
+            message = f'寫入資料庫失敗: {e.__class__.__name__}'
+            rejects.extend({'index': index, 'errors': [message]} for index in indexes)
+        chunk.clear()
+
+    for index, record in records:
+        row, errors = validate_sample(record, now=now)
+        if errors:
+            rejects.append({'index': index, 'errors': errors})
+            continue
+        chunk.append((index, row))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    return inserted, rejects
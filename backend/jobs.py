@@ -0,0 +1,593 @@
+# backend/jobs.py
+# 背景工作佇列：大量匯入、匯出、批次刪除與各種重建 / 回填，API (/jobs) 只建立一筆排隊中的 Job 就回應，
+# 由另外啟動的 flask worker 行程以執行緒池執行，不佔用 API 的請求執行緒與記憶體。
+# - 工作類型以 @job_type 註冊，每個類型屬於一個群組；JOB_CONCURRENCY 限制各群組同時執行的數量 (所有 worker 合計)。
+#   領取時以一個條件式 UPDATE 同時檢查「仍在排隊」與「群組未滿」，SQLite 的寫入是序列化的，多個 worker 不會超領
+#   (PostgreSQL 的 READ COMMITTED 下兩個 worker 同時領取同一群組時，最多可能短暫多執行一個)
+# - worker 的心跳執行緒定期把各工作的進度寫回資料庫並讀回取消要求；handler 呼叫 ctx.progress() 時遇到取消要求
+#   會拋出 JobCancelled (已提交的批次不會還原，與 CLI 中途中斷相同)
+# - 心跳逾時 (worker 被強制結束) 的工作標記為失敗，不會自動重試 (匯入等工作重跑會重複寫入)；
+#   結束超過 JOB_RETENTION_DAYS 天的工作連同上傳檔與結果檔一併清除
+
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import OperationalError
+from models import Job, Sample
+from extensions import db, sample_archive
+import aggregates
+import batch_delete
+import compliance
+import report_import
+import retention
+import rollups
+import sample_export
+import search_index
+
+STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+# 單一工作最多可刪除的 id 數
+MAX_DELETE_IDS = 1_000_000
+# 匯入結果最多保留的錯誤列數
+MAX_IMPORT_ERRORS = 1000
+
+_job = Job.__table__
+
+
+class JobCancelled(Exception):
+    """工作收到取消要求 (由 ctx.progress / ctx.check_cancelled 拋出)"""
+
+
+class InvalidParams(ValueError):
+    """工作類型不存在或參數不正確"""
+
+
+JobType = namedtuple('JobType', 'name group handler validate upload description')
+JOB_TYPES = {}
+
+
+def job_type(name, group, validate=None, upload=False):
+    """註冊工作類型；handler(ctx, params) 回傳可序列化成 JSON 的結果。upload 類型的輸入檔由專用的上傳 API 建立"""
+    def register(handler):
+        JOB_TYPES[name] = JobType(name, group, handler, validate or _no_params, upload,
+                                  (handler.__doc__ or '').strip())
+        return handler
+    return register
+
+
+def group_types(group):
+    return [spec.name for spec in JOB_TYPES.values() if spec.group == group]
+
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+def job_directory(job_id, app=None):
+    """工作的上傳檔與結果檔所在的目錄"""
+    return os.path.join((app or current_app).config['JOBS_DIR'], job_id)
+
+
+def submit(session, name, params=None, job_id=None):
+    """驗證參數並建立排隊中的工作 (由呼叫端 commit)；類型不存在或參數不正確時拋出 InvalidParams"""
+    spec = JOB_TYPES.get(name)
+    if spec is None:
+        raise InvalidParams(f'未知的工作類型: {name}')
+    if not isinstance(params or {}, dict):
+        raise InvalidParams('params 必須是物件')
+    job = Job(id=job_id or new_id(), job_type=name, status='queued', params=spec.validate(params or {}),
+              progress=0.0, cancel_requested=False, created_at=datetime.utcnow())
+    session.add(job)
+    return job
+
+
+def request_cancel(session, job_id):
+    """
+    排隊中的工作直接取消；執行中的工作標記取消要求，由 worker 在 handler 下次回報進度時停止。
+    回傳是否受理 (已結束的工作回傳 False)；由呼叫端 commit。
+    """
+    conn = session.connection()
+    cancelled = conn.execute(
+        update(_job).where(_job.c.id == job_id, _job.c.status == 'queued')
+        .values(status='cancelled', cancel_requested=True, finished_at=datetime.utcnow())
+    ).rowcount
+    if cancelled:
+        return True
+    return bool(conn.execute(
+        update(_job).where(_job.c.id == job_id, _job.c.status == 'running').values(cancel_requested=True)
+    ).rowcount)
+
+
+def result_path(job, app=None):
+    """工作結果檔的完整路徑；沒有結果檔時回傳 None"""
+    if not job.result_file:
+        return None
+    return os.path.join(job_directory(job.id, app), job.result_file)
+
+
+# --- 參數 ---
+
+def _no_params(params):
+    return {}
+
+
+def _int_param(params, name, default=None, minimum=1):
+    value = params.get(name, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise InvalidParams(f'{name} 必須是不小於 {minimum} 的整數')
+    return value
+
+
+def _time_param(params, name):
+    """ISO 8601 時間 (帶時區時轉成 UTC naive)；以字串存回參數，執行時再以 parse_time 轉換"""
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return parse_time(value).isoformat()
+    except (TypeError, ValueError):
+        raise InvalidParams(f'{name} 必須是 ISO 8601 時間')
+
+
+def parse_time(value):
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _time_window(params):
+    window = {'start_time': _time_param(params, 'start_time'), 'end_time': _time_param(params, 'end_time')}
+    if window['start_time'] and window['end_time'] and window['start_time'] >= window['end_time']:
+        raise InvalidParams('start_time 必須早於 end_time')
+    return window
+
+
+# --- 執行環境 ---
+
+class JobContext:
+    """傳給 handler 的執行環境：參數、工作目錄、進度回報與取消檢查"""
+
+    def __init__(self, job_id, job_type, params, directory):
+        self.job_id = job_id
+        self.job_type = job_type
+        self.params = params
+        self.directory = directory
+        self.fraction = 0.0
+        self.message = None
+        self.result_file = None
+        self.result_mimetype = None
+        self.cancel_event = threading.Event()
+
+    def progress(self, fraction, message=None):
+        """回報進度 (0 ~ 1，由心跳執行緒定期寫回資料庫)；已收到取消要求時拋出 JobCancelled"""
+        self.fraction = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self.message = message[:200]
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def path(self, filename):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, filename)
+
+    def set_result_file(self, filename, mimetype):
+        self.result_file, self.result_mimetype = filename, mimetype
+
+
+# --- worker ---
+
+class Worker:
+    """領取並執行排隊中的工作 (flask worker)；每個工作在執行緒池中以自己的 app context / session 執行"""
+
+    def __init__(self, app, threads=None, worker_id=None):
+        config = app.config
+        self.app = app
+        self.threads = threads or config['JOB_WORKER_THREADS']
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_seconds = config['JOB_POLL_SECONDS']
+        self.heartbeat_seconds = config['JOB_HEARTBEAT_SECONDS']
+        self.stale_seconds = config['JOB_STALE_SECONDS']
+        self.retention_days = config['JOB_RETENTION_DAYS']
+        self.concurrency = config['JOB_CONCURRENCY']
+        self._running = {}  # job_id -> JobContext
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """不再領取新的工作；執行中的工作完成後 run() 才會結束"""
+        self._stop.set()
+
+    def run(self, burst=False, log=None):
+        """持續領取並執行工作直到 stop()；burst 時佇列中沒有可執行的工作就結束"""
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(heartbeat_stop,),
+                                     name='job-heartbeat', daemon=True)
+        heartbeat.start()
+        next_housekeeping = 0.0
+        try:
+            with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='job') as executor:
+                while not self._stop.is_set():
+                    if time.monotonic() >= next_housekeeping:
+                        self.housekeeping(log)
+                        next_housekeeping = time.monotonic() + max(self.stale_seconds / 2, 1)
+                    with self._lock:
+                        free = self.threads - len(self._running)
+                    claimed = self.claim(free) if free > 0 else []
+                    for ctx in claimed:
+                        if log:
+                            log(f'[{ctx.job_id}] {ctx.job_type} started')
+                        executor.submit(self._execute, ctx, log)
+                    if burst and not claimed:
+                        with self._lock:
+                            idle = not self._running
+                        if idle:
+                            break
+                    if not claimed:
+                        self._stop.wait(self.poll_seconds)
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+
+    def claim(self, count):
+        """依建立順序領取最多 count 個排隊中、且所屬群組未達同時執行上限的工作；回傳 [JobContext]"""
+        claimed, full_groups = [], set()
+        with self.app.app_context():
+            candidates = db.session.execute(
+                select(_job.c.id, _job.c.job_type, _job.c.params)
+                .where(_job.c.status == 'queued').order_by(_job.c.created_at).limit(max(count, 1) * 10)
+            ).all()
+            db.session.rollback()
+            for job_id, name, params in candidates:
+                if len(claimed) >= count:
+                    break
+                spec = JOB_TYPES.get(name)
+                if spec is None:
+                    self._finish(job_id, status='failed', error=f'未知的工作類型: {name}')
+                    continue
+                if spec.group in full_groups:
+                    continue
+                running = (
+                    select(func.count()).select_from(_job)
+                    .where(_job.c.status == 'running', _job.c.job_type.in_(group_types(spec.group)))
+                    .scalar_subquery()
+                )
+                now = datetime.utcnow()
+                with db.engine.begin() as conn:
+                    taken = conn.execute(
+                        update(_job)
+                        .where(_job.c.id == job_id, _job.c.status == 'queued',
+                               running < self.concurrency.get(spec.group, 1))
+                        .values(status='running', started_at=now, heartbeat_at=now, worker_id=self.worker_id)
+                    ).rowcount
+                if not taken:
+                    # 群組已滿 (或已被其他 worker 領走 / 取消)：這一輪不再嘗試同群組的工作
+                    full_groups.add(spec.group)
+                    continue
+                ctx = JobContext(job_id, name, params or {}, job_directory(job_id, self.app))
+                with self._lock:
+                    self._running[job_id] = ctx
+                claimed.append(ctx)
+        return claimed
+
+    def _execute(self, ctx, log=None):
+        spec = JOB_TYPES[ctx.job_type]
+        with self.app.app_context():
+            try:
+                result = spec.handler(ctx, ctx.params)
+                values = {'status': 'succeeded', 'progress': 1.0, 'result': result,
+                          'result_file': ctx.result_file, 'result_mimetype': ctx.result_mimetype}
+            except JobCancelled:
+                db.session.rollback()
+                values = {'status': 'cancelled', 'progress': ctx.fraction}
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception('job %s (%s) failed', ctx.job_id, ctx.job_type)
+                values = {'status': 'failed', 'progress': ctx.fraction, 'error': f'{e.__class__.__name__}: {e}'}
+            finally:
+                db.session.remove()
+            values.setdefault('progress_message', ctx.message)
+            self._finish(ctx.job_id, **values)
+        with self._lock:
+            self._running.pop(ctx.job_id, None)
+        if log:
+            log(f"[{ctx.job_id}] {ctx.job_type} {values['status']}")
+
+    def _finish(self, job_id, **values):
+        # 只更新仍在執行 / 排隊中的工作 (心跳逾時已被標記失敗的不覆寫)
+        with self.app.app_context(), db.engine.begin() as conn:
+            conn.execute(
+                update(_job).where(_job.c.id == job_id, _job.c.status.in_(('queued', 'running')))
+                .values(finished_at=datetime.utcnow(), **values)
+            )
+
+    def _heartbeat_loop(self, stop):
+        while not stop.wait(self.heartbeat_seconds):
+            try:
+                self.heartbeat()
+            except OperationalError:
+                # 資料庫暫時被鎖住 (例如大量寫入中)：下一次心跳再更新
+                self.app.logger.warning('job heartbeat skipped (database busy)')
+
+    def heartbeat(self):
+        """把執行中工作的進度寫回資料庫，並讀回取消要求"""
+        with self._lock:
+            contexts = dict(self._running)
+        if not contexts:
+            return
+        now = datetime.utcnow()
+        with self.app.app_context(), db.engine.begin() as conn:
+            for job_id, ctx in contexts.items():
+                conn.execute(
+                    update(_job).where(_job.c.id == job_id, _job.c.status == 'running')
+                    .values(heartbeat_at=now, progress=ctx.fraction, progress_message=ctx.message)
+                )
+            cancelled = conn.execute(
+                select(_job.c.id).where(_job.c.id.in_(list(contexts)), _job.c.cancel_requested.is_(True))
+            ).scalars().all()
+        for job_id in cancelled:
+            contexts[job_id].cancel_event.set()
+
+    def housekeeping(self, log=None):
+        """把心跳逾時的工作標記為失敗，並清除過期的工作與檔案"""
+        now = datetime.utcnow()
+        with self.app.app_context():
+            with db.engine.begin() as conn:
+                stale = conn.execute(
+                    update(_job)
+                    .where(_job.c.status == 'running', _job.c.heartbeat_at < now - timedelta(seconds=self.stale_seconds))
+                    .values(status='failed', finished_at=now, error='worker 中斷 (心跳逾時)')
+                ).rowcount
+            purged = purge(db.session, now - timedelta(days=self.retention_days), self.app)
+        if log and (stale or purged):
+            log(f'{stale} stale jobs marked failed, {purged} expired jobs purged')
+
+
+def purge(session, before, app=None):
+    """刪除 before 之前結束的工作與它們的檔案；回傳刪除的工作數"""
+    ids = session.execute(
+        select(_job.c.id).where(_job.c.status.in_(FINISHED), _job.c.finished_at < before)
+    ).scalars().all()
+    for chunk in batch_delete.chunks(ids):
+        session.execute(delete(_job).where(_job.c.id.in_(chunk)))
+        session.commit()
+        for job_id in chunk:
+            shutil.rmtree(job_directory(job_id, app), ignore_errors=True)
+    session.rollback()
+    return len(ids)
+
+
+# --- 工作類型 ---
+
+def _import_params(params):
+    file_format = params.get('format')
+    if file_format not in (None, 'csv', 'xlsx'):
+        raise InvalidParams('format 只能是 csv 或 xlsx')
+    filename = params.get('file')
+    if not filename or os.path.basename(filename) != filename:
+        raise InvalidParams('缺少上傳檔')
+    return {'file': filename, 'filename': params.get('filename') or filename, 'format': file_format}
+
+
+@job_type('import-reports', group='import', validate=_import_params, upload=True)
+def import_reports(ctx, params):
+    """匯入廢水報告 (CSV / XLSX，由 POST /jobs/report-imports 上傳)"""
+    path = ctx.path(params['file'])
+    size = os.path.getsize(path) or 1
+    with open(path, 'rb') as f:
+        rows = report_import.iter_rows(f, filename=params['filename'], file_format=params['format'])
+
+        def tracked():
+            for count, row in enumerate(rows, 1):
+                if count % 1000 == 0:
+                    ctx.progress(f.tell() / size, f'已讀取 {count} 列')
+                yield row
+
+        result = report_import.import_reports(
+            db.session, tracked(), chunk_size=current_app.config['REPORT_IMPORT_CHUNK_SIZE']
+        )
+    result['errors_truncated'] = len(result['errors']) > MAX_IMPORT_ERRORS
+    result['errors'] = result['errors'][:MAX_IMPORT_ERRORS]
+    return result
+
+
+def _export_params(params):
+    file_format = params.get('format', 'ndjson')
+    if file_format not in sample_export.FORMATS:
+        raise InvalidParams(f"format 只能是 {' / '.join(sample_export.FORMATS)}")
+    line_name = params.get('line_name')
+    if line_name is not None and not isinstance(line_name, str):
+        raise InvalidParams('line_name 必須是字串')
+    return {'line_name': line_name, 'format': file_format, **_time_window(params)}
+
+
+@job_type('export-samples', group='export', validate=_export_params)
+def export_samples(ctx, params):
+    """匯出產線紀錄成結果檔 (NDJSON / CSV，篩選條件與 /samples/export 相同)"""
+    args = {'line_name': params.get('line_name'), 'start_time': parse_time(params.get('start_time')),
+            'end_time': parse_time(params.get('end_time'))}
+    total = db.session.execute(
+        sample_export.apply_filters(select(func.count()).select_from(Sample), args)
+    ).scalar()
+    if sample_export.reads_archive(args):
+        total += sample_archive.count(args['start_time'], args['end_time'], args['line_name'])
+
+    extension, mimetype = sample_export.FORMATS[params['format']]
+    filename = f'samples.{extension}'
+    written = 0
+
+    def tracked():
+        nonlocal written
+        for batch in sample_export.batches(args):
+            yield batch
+            written += len(batch)
+            ctx.progress(written / total if total else 1.0, f'已匯出 {written} / {total} 筆')
+
+    with open(ctx.path(filename), 'w', encoding='utf-8', newline='') as f:
+        for chunk in sample_export.encode(tracked(), params['format']):
+            f.write(chunk)
+    ctx.set_result_file(filename, mimetype)
+    return {'rows': written, 'bytes': os.path.getsize(ctx.path(filename))}
+
+
+def _ids_param(params):
+    ids = params.get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise InvalidParams('ids 必須是非空的整數列表')
+    if len(ids) > MAX_DELETE_IDS:
+        raise InvalidParams(f'ids 最多 {MAX_DELETE_IDS} 筆')
+    if any(isinstance(value, bool) or not isinstance(value, int) for value in ids):
+        raise InvalidParams('ids 必須是整數')
+    return sorted(set(ids))
+
+
+def _delete_samples_params(params):
+    if params.get('ids') is not None:
+        return {'ids': _ids_param(params)}
+    line_name = params.get('line_name')
+    if line_name is not None and not isinstance(line_name, str):
+        raise InvalidParams('line_name 必須是字串')
+    window = _time_window(params)
+    if not (line_name or window['start_time'] or window['end_time']):
+        raise InvalidParams('請提供 ids，或 line_name / start_time / end_time 篩選條件')
+    try:
+        batch_delete.check_not_archived(line_name, parse_time(window['start_time']), parse_time(window['end_time']))
+    except batch_delete.ArchivedRangeError as e:
+        raise InvalidParams(str(e))
+    return {'line_name': line_name, **window}
+
+
+def _delete_progress(ctx, unit):
+    return lambda done, total: ctx.progress(done / total if total else 1.0, f'已刪除 {done} / {total} {unit}')
+
+
+@job_type('delete-samples', group='delete', validate=_delete_samples_params)
+def delete_samples(ctx, params):
+    """批次刪除產線紀錄 (依 ids，或依 line_name / start_time / end_time；分批在短交易中刪除)"""
+    if 'ids' in params:
+        deleted = batch_delete.delete_sample_ids(db.session, params['ids'], progress=_delete_progress(ctx, '個 id'))
+    else:
+        deleted = batch_delete.delete_sample_range(
+            db.session, line_name=params['line_name'], start_time=parse_time(params['start_time']),
+            end_time=parse_time(params['end_time']), batch_size=current_app.config['DELETE_BATCH_SIZE'],
+            progress=_delete_progress(ctx, '筆'),
+        )
+    return {'deleted': deleted}
+
+
+def _date_param(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise InvalidParams(f'{name} 必須是 YYYY-MM-DD 格式的日期')
+
+
+def _delete_reports_params(params):
+    if params.get('ids') is not None:
+        return {'ids': _ids_param(params)}
+    filters = {name: params.get(name) for name in ('vendor', 'status')}
+    if any(value is not None and not isinstance(value, str) for value in filters.values()):
+        raise InvalidParams('vendor / status 必須是字串')
+    filters.update({name: _date_param(params, name) for name in ('start_date', 'end_date')})
+    if not any(filters.values()):
+        raise InvalidParams('請提供 ids，或 vendor / status / start_date / end_date 篩選條件')
+    return filters
+
+
+@job_type('delete-reports', group='delete', validate=_delete_reports_params)
+def delete_reports(ctx, params):
+    """批次刪除廢水報告與其檢測項目 (依 ids，或依 vendor / status / start_date / end_date)"""
+    if 'ids' in params:
+        return batch_delete.delete_report_ids(db.session, params['ids'], progress=_delete_progress(ctx, '個 id'))
+    dates = {name: date.fromisoformat(params[name]) if params[name] else None for name in ('start_date', 'end_date')}
+    return batch_delete.delete_report_range(
+        db.session, vendor=params['vendor'], status=params['status'], **dates, progress=_delete_progress(ctx, '份'),
+    )
+
+
+@job_type('rebuild-aggregates', group='maintenance')
+def rebuild_aggregates(ctx, params):
+    """重算 /statistics 使用的累計表 (同 flask rebuild-aggregates)"""
+    values = aggregates.rebuild(db.session.connection())
+    db.session.commit()
+    return {'total_count': values['total_count']}
+
+
+def _backfill_rollups_params(params):
+    return {**_time_window(params), 'days_per_batch': _int_param(params, 'days_per_batch', 7)}
+
+
+@job_type('backfill-rollups', group='maintenance', validate=_backfill_rollups_params)
+def backfill_rollups(ctx, params):
+    """從原始紀錄重建時間粒度彙總 (同 flask backfill-rollups)"""
+    start, end = parse_time(params.get('start_time')), parse_time(params.get('end_time'))
+    first, last = db.session.execute(select(func.min(Sample.timestamp), func.max(Sample.timestamp))).one()
+    origin, span = start or first, None
+    if origin and (end or last):
+        span = ((end or last) - origin).total_seconds() or None
+
+    def progress(batch_start, batch_end):
+        fraction = (batch_end - origin).total_seconds() / span if span else 0.0
+        ctx.progress(fraction, f'{batch_start:%Y-%m-%d} ~ {batch_end:%Y-%m-%d}')
+
+    rollups.backfill(db.session, start=start, end=end, days_per_batch=params['days_per_batch'], progress=progress)
+    return {'start_time': params.get('start_time'), 'end_time': params.get('end_time')}
+
+
+def _archive_params(params):
+    return {'retention_days': _int_param(params, 'retention_days', minimum=0),
+            'batch_size': _int_param(params, 'batch_size')}
+
+
+@job_type('archive-samples', group='maintenance', validate=_archive_params)
+def archive_samples(ctx, params):
+    """把超過保留期限的產線紀錄搬進封存區 (同 flask archive-samples)"""
+    config = current_app.config
+    retention_days = params['retention_days'] if params['retention_days'] is not None else config['SAMPLE_RETENTION_DAYS']
+    before = retention.cutoff(datetime.utcnow(), retention_days, sample_archive.partition)
+    total = retention.pending_count(db.session, before)
+    archived = 0
+
+    def progress(entry):
+        nonlocal archived
+        archived += entry['rows']
+        ctx.progress(archived / total if total else 1.0, f"{entry['partition']}: 已封存 {archived} / {total} 筆")
+
+    result = retention.archive_samples(
+        db.session, sample_archive, retention_days,
+        batch_size=params['batch_size'] or config['ARCHIVE_BATCH_SIZE'], progress=progress,
+    )
+    return {**result, 'cutoff': result['cutoff'].isoformat()}
+
+
+@job_type('backfill-standard-limits', group='maintenance')
+def backfill_standard_limits(ctx, params):
+    """重新解析所有檢測項目的標準值上下限 (同 flask backfill-standard-limits)"""
+    return {'updated': compliance.backfill(db.session)}
+
+
+@job_type('rebuild-search-index', group='maintenance')
+def rebuild_search_index(ctx, params):
+    """重建廢水報告的全文檢索索引 (同 flask rebuild-search-index)"""
+    total = search_index.rebuild(db.session.connection())
+    db.session.commit()
+    return {'reports': total}
@@ -0,0 +1,162 @@
+# backend/live_metrics.py
+# 即時儀表板的推播中心 (Server-Sent Events)：
+# - 單一 producer 執行緒：Sample 寫入 commit 後 (或每 poll_interval 秒檢查一次，涵蓋其他行程的寫入)
+#   計算一次更新，序列化一次，再分送給所有訂閱者；訂閱者數量不會增加資料庫查詢
+# - 每個訂閱者有一個有上限的佇列；跟不上的連線會被清空佇列，改送一份完整快照 (不會拖慢其他人)
+# - 佇列空閒 heartbeat 秒就送出一行 SSE 註解，讓代理伺服器與瀏覽器知道連線仍然存活
+# - 沒有訂閱者時 producer 會自行結束，下一個訂閱者出現時再啟動
+
+import json
+import queue
+import threading
+import time
+
+
+def format_event(event, data):
+    """組成一則 SSE 訊息"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+HEARTBEAT = ': heartbeat\n\n'
+
+
+class _Subscriber:
+    def __init__(self, max_queue):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.closed = False
+
+
+class LiveMetricsHub:
+    """
+    produce(state) 由 producer 執行緒在 app context 中呼叫：
+    state 是 producer 自己保存的 dict (跨次呼叫保留)，回傳要推送的 [(event, data), ...]；
+    snapshot(state) 回傳新訂閱者 (或跟不上的訂閱者) 需要的完整狀態 [(event, data), ...]。
+    """
+
+    def __init__(self, produce, snapshot):
+        self._produce = produce
+        self._snapshot = snapshot
+        self.max_queue = 64
+        self.heartbeat = 15
+        self.poll_interval = 2.0
+        self.min_interval = 0.5
+        self.max_subscribers = 200
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._ready = threading.Event()
+        self._state = {}
+        self._snapshot_messages = []
+        self._thread = None
+        self._app = None
+
+    def init_app(self, app):
+        self.max_queue = app.config.get('LIVE_QUEUE_SIZE', self.max_queue)
+        self.heartbeat = app.config.get('LIVE_HEARTBEAT_SECONDS', self.heartbeat)
+        self.poll_interval = app.config.get('LIVE_POLL_SECONDS', self.poll_interval)
+        self.min_interval = app.config.get('LIVE_MIN_INTERVAL_SECONDS', self.min_interval)
+        self.max_subscribers = app.config.get('LIVE_MAX_SUBSCRIBERS', self.max_subscribers)
+
+    def notify(self):
+        """有新的 Sample 寫入 commit 時呼叫 (只設旗標，不在寫入的執行緒中計算)"""
+        self._wake.set()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, app):
+        """建立訂閱並回傳 SSE 產生器；超過上限時回傳 None"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscriber = _Subscriber(self.max_queue)
+            self._subscribers.add(subscriber)
+            self._app = app
+            if self._thread is None or not self._thread.is_alive():
+                # producer 停過一段時間，之前保存的狀態已經過時，從頭建立基準
+                self._state = {}
+                self._ready.clear()
+                self._thread = threading.Thread(target=self._run, name='live-metrics-producer', daemon=True)
+                self._thread.start()
+        return self._stream(subscriber)
+
+    def _stream(self, subscriber):
+        try:
+            # 第一份快照由 producer 算好後共用，不為每個連線各查一次
+            self._ready.wait(timeout=self.heartbeat)
+            with self._lock:
+                initial = list(self._snapshot_messages)
+            yield 'retry: 3000\n\n'
+            for message in initial:
+                yield message
+            while not subscriber.closed:
+                try:
+                    message = subscriber.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield HEARTBEAT
+                    continue
+                yield message
+        finally:
+            self._unsubscribe(subscriber)
+
+    def _unsubscribe(self, subscriber):
+        subscriber.closed = True
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _publish(self, messages):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            snapshot = list(self._snapshot_messages)
+        for subscriber in subscribers:
+            for message in messages:
+                try:
+                    subscriber.queue.put_nowait(message)
+                except queue.Full:
+                    # 背壓：這個連線跟不上，丟掉它累積的增量，改以完整快照重新同步
+                    self._resync(subscriber, snapshot)
+                    break
+
+    def _resync(self, subscriber, snapshot):
+        while True:
+            try:
+                subscriber.queue.get_nowait()
+            except queue.Empty:
+                break
+        for message in [format_event('resync', {})] + snapshot:
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                break
+
+    def _run(self):
+        last_run = 0.0
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+                app = self._app
+            try:
+                with app.app_context():
+                    updates = self._produce(self._state)
+                    snapshot = self._snapshot(self._state)
+            except Exception:
+                app.logger.exception('live metrics producer failed')
+                updates, snapshot = [], None
+            if snapshot is not None:
+                with self._lock:
+                    self._snapshot_messages = [format_event(event, data) for event, data in snapshot]
+            self._ready.set()
+            if updates:
+                self._publish([format_event(event, data) for event, data in updates])
+
+            # 合併短時間內連續的寫入：兩次計算之間至少間隔 min_interval 秒
+            last_run = time.monotonic()
+            self._wake.wait(timeout=self.poll_interval)
+            self._wake.clear()
+            delay = self.min_interval - (time.monotonic() - last_run)
+            if delay > 0:
+                time.sleep(delay)
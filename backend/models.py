@@ -2,13 +2,29 @@
 
 from extensions import db
 from datetime import datetime
-from extensions import bcrypt
+from extensions import hasher
 
 class Sample(db.Model):
     """產線紀錄模型"""
     
     # __tablename__ = 'samples' # 可選：明確指定資料表名稱
 
+    # 列表 API 以 (排序欄位, id) 做 keyset 分頁，可選擇再加上 line_name 篩選；
+    # 每一種組合都需要一個對應的複合索引，才能直接從索引位置往後讀取
+    __table_args__ = (
+        db.Index('ix_sample_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_sample_product_name_id', 'product_name', 'id'),
+        db.Index('ix_sample_metric_a_id', 'metric_a', 'id'),
+        db.Index('ix_sample_metric_b_id', 'metric_b', 'id'),
+        db.Index('ix_sample_operator_id', 'operator', 'id'),
+        db.Index('ix_sample_line_name_id', 'line_name', 'id'),
+        db.Index('ix_sample_line_name_timestamp_id', 'line_name', 'timestamp', 'id'),
+        db.Index('ix_sample_line_name_product_name_id', 'line_name', 'product_name', 'id'),
+        db.Index('ix_sample_line_name_metric_a_id', 'line_name', 'metric_a', 'id'),
+        db.Index('ix_sample_line_name_metric_b_id', 'line_name', 'metric_b', 'id'),
+        db.Index('ix_sample_line_name_operator_id', 'line_name', 'operator', 'id'),
+    )
+
     # 定義資料表欄位
     id = db.Column(db.Integer, primary_key=True)
     line_name = db.Column(db.String(50), nullable=False)
@@ -21,9 +37,63 @@ class Sample(db.Model):
     def __repr__(self):
         """定義物件的文字表示法，方便除錯"""
         return f'<Sample id={self.id} line_name={self.line_name}>'
-    
+
+
+class SampleAggregate(db.Model):
+    """產線紀錄的累計統計 (只有一列)，讓儀表板不必每次全表掃描"""
+    id = db.Column(db.Integer, primary_key=True)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    # metric_a / metric_b 可能為 NULL，因此總和與非空筆數要分開記錄，才能算出和 AVG() 相同的平均
+    sum_metric_a = db.Column(db.Float, nullable=False, default=0.0)
+    sum_metric_b = db.Column(db.Float, nullable=False, default=0.0)
+    count_metric_a = db.Column(db.Integer, nullable=False, default=0)
+    count_metric_b = db.Column(db.Integer, nullable=False, default=0)
+    # 最新一筆紀錄 (依 timestamp、再依 id)，用來計算「排除最新一筆」的前期平均
+    latest_sample_id = db.Column(db.Integer, nullable=True)
+    latest_timestamp = db.Column(db.DateTime, nullable=True)
+    latest_metric_a = db.Column(db.Float, nullable=True)
+    latest_metric_b = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f'<SampleAggregate total_count={self.total_count}>'
+
+
+class SampleRollup(db.Model):
+    """產線紀錄的時間粒度彙總 (minute / hour / day)，讓長區間的查詢不必掃描原始紀錄"""
+    id = db.Column(db.Integer, primary_key=True)
+    grain = db.Column(db.String(10), nullable=False)  # minute, hour, day
+    line_name = db.Column(db.String(50), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    # 每個指標都存 非空筆數 / 總和 / 平方和 / 最小值 / 最大值，足以合併出平均與標準差
+    count_metric_a = db.Column(db.Integer, nullable=False, default=0)
+    sum_metric_a = db.Column(db.Float, nullable=False, default=0.0)
+    sumsq_metric_a = db.Column(db.Float, nullable=False, default=0.0)
+    min_metric_a = db.Column(db.Float, nullable=True)
+    max_metric_a = db.Column(db.Float, nullable=True)
+    count_metric_b = db.Column(db.Integer, nullable=False, default=0)
+    sum_metric_b = db.Column(db.Float, nullable=False, default=0.0)
+    sumsq_metric_b = db.Column(db.Float, nullable=False, default=0.0)
+    min_metric_b = db.Column(db.Float, nullable=True)
+    max_metric_b = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('grain', 'line_name', 'bucket_start', name='uq_sample_rollup_bucket'),
+        db.Index('ix_sample_rollup_grain_bucket', 'grain', 'bucket_start'),
+    )
+
+    def __repr__(self):
+        return f'<SampleRollup {self.grain} {self.line_name} {self.bucket_start}>'
+
 class WastewaterReport(db.Model):
     """廢水報告模型 (一)"""
+
+    # 列表依 (report_date DESC, id DESC) 排序並以日期區間篩選，可再加上狀態篩選
+    __table_args__ = (
+        db.Index('ix_wastewater_report_report_date_id', 'report_date', 'id'),
+        db.Index('ix_wastewater_report_status_report_date_id', 'status', 'report_date', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     report_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     vendor = db.Column(db.String(100), nullable=False)
@@ -40,11 +110,24 @@ class WastewaterReport(db.Model):
 
 class WastewaterReportItem(db.Model):
     """廢水報告的檢測項目模型 (多)"""
+
+    # 依報告載入項目、摘要列表的 LEFT JOIN 與刪除報告時的串聯刪除都以 report_id 查詢；
+    # 加上 is_compliant 讓摘要的不合格數可以只讀索引算出
+    # 合格率統計依檢測項目分組、依檢測值排序 (百分位數)，以涵蓋索引依序讀取，不必排序也不必回表
+    __table_args__ = (
+        db.Index('ix_wastewater_report_item_report_id_is_compliant', 'report_id', 'is_compliant'),
+        db.Index('ix_wastewater_report_item_item_name_value', 'item_name', 'value', 'is_compliant',
+                 'standard_min', 'standard_max', 'report_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     item_name = db.Column(db.String(100), nullable=False)
     value = db.Column(db.Float, nullable=False)
     unit = db.Column(db.String(50))
     standard = db.Column(db.String(50))
+    # 由 standard 在寫入時解析出的數值上下限 (見 compliance.parse_standard)，無法解析的一邊為 NULL
+    standard_min = db.Column(db.Float)
+    standard_max = db.Column(db.Float)
     is_compliant = db.Column(db.Boolean, default=True)
 
     # 建立「外鍵 (Foreign Key)」，指向 wastewater_report 表格的 id 欄位
@@ -62,12 +145,83 @@ class User(db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
 
     def set_password(self, password):
-        """使用 bcrypt 來設定密碼的雜湊值"""
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        """使用 bcrypt 來設定密碼的雜湊值 (在雜湊工作池中計算，見 passwords.py)"""
+        self.password_hash = hasher.hash(password)
 
     def check_password(self, password):
         """使用 bcrypt 來檢查密碼是否正確"""
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return hasher.check(self.password_hash, password)
 
     def __repr__(self):
         return f'<User {self.username}>'
+
+
+class Job(db.Model):
+    """背景工作 (見 jobs.py)：由 /jobs API 建立，flask worker 領取執行"""
+
+    # worker 依建立順序領取排隊中的工作，並以 (類型, 狀態) 計算執行中的數量 (同時執行上限)；
+    # 列表依建立時間由新到舊，可再以狀態篩選
+    __table_args__ = (
+        db.Index('ix_job_status_created_at', 'status', 'created_at'),
+        db.Index('ix_job_job_type_status', 'job_type', 'status'),
+        db.Index('ix_job_created_at', 'created_at'),
+    )
+
+    # uuid hex；結果下載只憑 id，不可使用可猜測的流水號
+    id = db.Column(db.String(32), primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    progress = db.Column(db.Float, nullable=False, default=0.0)  # 0 ~ 1
+    progress_message = db.Column(db.String(200))
+    result = db.Column(db.JSON)
+    result_file = db.Column(db.String(255))  # 結果檔 (工作目錄內的檔名)
+    result_mimetype = db.Column(db.String(100))
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    worker_id = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # 執行中的工作定期更新；太久沒更新代表 worker 已中斷
+
+    def __repr__(self):
+        return f'<Job id={self.id} job_type={self.job_type} status={self.status}>'
+
+
+class ControlChartCheckpoint(db.Model):
+    """串流管制圖的檢查點 (只有一列，見 control_charts.py)：重新啟動時從這裡接續，不必重新掃描全部歷史"""
+    id = db.Column(db.Integer, primary_key=True)
+    # 已處理到的最大 Sample.id；之後只需處理 id 更大的紀錄
+    last_sample_id = db.Column(db.Integer, nullable=False, default=0)
+    # 各產線 / 指標的統計狀態 (Welford、EWMA、移動視窗、最近的標準化值、觸發中的規則)
+    state = db.Column(db.JSON, nullable=False, default=dict)
+    # 每次寫入加一；多個行程同時處理時，以條件式 UPDATE 確認沒有被其他行程搶先寫入
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ControlChartCheckpoint last_sample_id={self.last_sample_id} version={self.version}>'
+
+
+class ControlChartAlert(db.Model):
+    """串流管制圖的警報：規則由未觸發變為觸發時記錄一筆"""
+
+    # 警報列表依 id 由新到舊 (或依 after 由舊到新) 讀取，可再以產線篩選
+    __table_args__ = (
+        db.Index('ix_control_chart_alert_line_name_id', 'line_name', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    line_name = db.Column(db.String(50), nullable=False)
+    metric = db.Column(db.String(20), nullable=False)   # metric_a, metric_b
+    rule = db.Column(db.String(20), nullable=False)     # 見 control_charts.RULES
+    sample_id = db.Column(db.Integer, nullable=False)   # 觸發規則的紀錄 (不設外鍵：紀錄刪除或封存後警報仍保留)
+    sample_timestamp = db.Column(db.DateTime, nullable=False)
+    value = db.Column(db.Float, nullable=False)         # 觸發時的值 (ewma 規則為 EWMA 值)
+    center_line = db.Column(db.Float)                   # 觸發時的中心線與標準差 (基準尚未建立時為 NULL)
+    sigma = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ControlChartAlert {self.line_name} {self.metric} {self.rule} sample_id={self.sample_id}>'
@@ -0,0 +1,91 @@
+# backend/passwords.py
+# 密碼雜湊 (bcrypt) 的工作池：
+# - bcrypt 刻意很慢，交班時大量同時登入會讓每個 worker 都卡在雜湊上；
+#   這裡把雜湊與比對交給固定數量的背景執行緒 (bcrypt 計算時會釋放 GIL)，同時計算的數量不超過 BCRYPT_WORKERS
+# - 排隊中的工作最多 BCRYPT_MAX_PENDING 個；等不到空位超過 BCRYPT_WAIT_SECONDS 秒時丟出 HashingBusy，
+#   API 回傳 503 讓用戶端稍後重試，而不是把所有請求執行緒都堵住
+# - 登入成功時若雜湊的 cost 與目前設定 (BCRYPT_LOG_ROUNDS) 不同，可自動以新的 cost 重新雜湊
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+# bcrypt 只會使用前 72 bytes，新版的 bcrypt 套件對更長的密碼直接拒絕
+MAX_PASSWORD_BYTES = 72
+
+
+class HashingBusy(RuntimeError):
+    """雜湊工作池已滿"""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        # 雜湊格式錯誤，或密碼超過 72 bytes
+        return False
+
+
+def hash_cost(password_hash):
+    """取出 bcrypt 雜湊中的 cost ($2b$<cost>$...)；無法解析時回傳 None"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """在 extensions.py 建立，create_app 中 init_app；未初始化時直接在目前的執行緒計算"""
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.rehash_on_login = True
+        self.wait_seconds = 5.0
+        self._executor = None
+        self._slots = None
+        self._dummy_hash = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        workers = app.config.get('BCRYPT_WORKERS') or min(4, os.cpu_count() or 1)
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.rehash_on_login = app.config.get('BCRYPT_REHASH_ON_LOGIN', self.rehash_on_login)
+        self.wait_seconds = app.config.get('BCRYPT_WAIT_SECONDS', self.wait_seconds)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + app.config.get('BCRYPT_MAX_PENDING', 32))
+        self._dummy_hash = None
+        app.extensions['password_hasher'] = self
+
+    def _run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise HashingBusy('密碼驗證的請求過多，請稍後再試')
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def check(self, password_hash, password):
+        """比對密碼；password_hash 為 None (查無使用者) 時仍以假的雜湊比對一次，讓回應時間不洩漏帳號是否存在"""
+        if password_hash is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self._run(_hash, 'dummy-password', self.rounds)
+            self._run(_check, self._dummy_hash, password)
+            return False
+        return self._run(_check, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return self.rehash_on_login and hash_cost(password_hash) != self.rounds
@@ -0,0 +1,236 @@
+# backend/profiling.py
+# 每個請求的查詢量測 (選用，PROFILING_ENABLED 開啟)：
+# - 以 SQLAlchemy engine 事件計算每個請求送出的 SQL 數量與總執行時間
+# - 以 Flask 請求生命週期計算總耗時、JSON 序列化時間與回應大小，並在回應加上 Server-Timing 標頭
+#   (瀏覽器開發者工具的 Timing 分頁可直接看到)
+# - 依端點 (路由規則 + 方法) 累計，在 /metrics 以 Prometheus 文字格式輸出；
+#   統計只存在目前的行程中，多個 worker 時 Prometheus 需要分別抓取每個行程
+# - 超過 PROFILING_SLOW_REQUEST_MS 的請求，連同它送出的 SQL (不含參數值) 一起寫入 log
+
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+# 請求耗時分布的區間 (秒)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_QUERY_START = 'request_profiler_query_start'
+
+
+class _Profile:
+    """單一請求的量測結果 (存放在 flask.g)"""
+
+    __slots__ = ('started', 'queries', 'db_seconds', 'serialize_seconds', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.statements = []
+
+
+class _EndpointStats:
+    __slots__ = ('requests', 'statuses', 'buckets', 'duration', 'queries', 'db', 'serialize', 'bytes', 'slow')
+
+    def __init__(self):
+        self.requests = 0
+        self.statuses = {}
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.duration = 0.0
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.bytes = 0
+        self.slow = 0
+
+
+def _current():
+    if has_request_context():
+        return g.get('_request_profile')
+    return None
+
+
+@contextmanager
+def track_serialization():
+    """量測區塊內的序列化時間，計入目前請求的 serialize；未啟用量測或不在請求中時不做任何事"""
+    profile = _current()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.serialize_seconds += time.perf_counter() - started
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestProfiler:
+    """在 extensions.py 建立，create_app 中以 init_app(app, db) 初始化；PROFILING_ENABLED 為 False 時不掛上任何 hook"""
+
+    def __init__(self, app=None, db=None):
+        self.enabled = False
+        self.slow_seconds = None
+        self.max_statements = 50
+        self.server_timing = True
+        self._stats = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.extensions['request_profiler'] = self
+        self.enabled = app.config.get('PROFILING_ENABLED', False)
+        if not self.enabled:
+            return
+        slow_ms = app.config.get('PROFILING_SLOW_REQUEST_MS', 500)
+        self.slow_seconds = slow_ms / 1000 if slow_ms else None
+        self.max_statements = app.config.get('PROFILING_MAX_STATEMENTS', 50)
+        self.server_timing = app.config.get('PROFILING_SERVER_TIMING', True)
+        self._stats = {}
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+        metrics_path = app.config.get('PROFILING_METRICS_PATH', '/metrics')
+        if metrics_path:
+            app.add_url_rule(metrics_path, 'metrics', self._metrics_view)
+
+    # --- SQL ---
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if _current() is not None:
+            conn.info.setdefault(_QUERY_START, []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = _current()
+        starts = conn.info.get(_QUERY_START)
+        if profile is None or not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        profile.queries += 1
+        profile.db_seconds += elapsed
+        if len(profile.statements) < self.max_statements:
+            profile.statements.append((elapsed, statement))
+
+    # --- 請求生命週期 ---
+
+    def _start(self):
+        if request.endpoint != 'metrics':
+            g._request_profile = _Profile()
+
+    def _finish(self, response):
+        profile = g.pop('_request_profile', None)
+        if profile is None:
+            return response
+        total = time.perf_counter() - profile.started
+        # 串流回應 (匯出 / SSE) 的內容在此之後才產生，大小未知；耗時也只計算到開始傳送為止
+        size = 0 if response.is_streamed else response.calculate_content_length() or 0
+        endpoint = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        slow = self.slow_seconds is not None and total >= self.slow_seconds
+
+        self._record(endpoint, request.method, response.status_code, total, profile, size, slow)
+        if self.server_timing:
+            response.headers['Server-Timing'] = ', '.join((
+                f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.queries} queries"',
+                f'serialize;dur={profile.serialize_seconds * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ))
+        if slow:
+            self._log_slow(response, total, profile)
+        return response
+
+    def _record(self, endpoint, method, status, total, profile, size, slow):
+        with self._lock:
+            stats = self._stats.get((endpoint, method))
+            if stats is None:
+                stats = self._stats[(endpoint, method)] = _EndpointStats()
+            stats.requests += 1
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if total <= bound:
+                    stats.buckets[index] += 1
+            stats.duration += total
+            stats.queries += profile.queries
+            stats.db += profile.db_seconds
+            stats.serialize += profile.serialize_seconds
+            stats.bytes += size
+            stats.slow += slow
+
+    def _log_slow(self, response, total, profile):
+        from flask import current_app
+
+        lines = [
+            f'slow request: {request.method} {request.full_path.rstrip("?")} -> {response.status_code} '
+            f'total={total * 1000:.1f}ms db={profile.db_seconds * 1000:.1f}ms ({profile.queries} queries) '
+            f'serialize={profile.serialize_seconds * 1000:.1f}ms'
+        ]
+        for elapsed, statement in profile.statements:
+            lines.append(f'  [{elapsed * 1000:.1f}ms] {" ".join(statement.split())}')
+        if profile.queries > len(profile.statements):
+            lines.append(f'  ... 另有 {profile.queries - len(profile.statements)} 個查詢未列出')
+        current_app.logger.warning('\n'.join(lines))
+
+    # --- /metrics ---
+
+    def render_metrics(self):
+        """以 Prometheus 文字格式 (0.0.4) 輸出目前行程的累計統計"""
+        with self._lock:
+            snapshot = sorted(self._stats.items())
+            snapshot = [(key, stats.statuses.copy(), list(stats.buckets), stats.requests, stats.duration,
+                         stats.queries, stats.db, stats.serialize, stats.bytes, stats.slow)
+                        for key, stats in snapshot]
+
+        out = []
+
+        def header(name, kind, help_text):
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} {kind}')
+
+        def labels(endpoint, method, **extra):
+            pairs = [('endpoint', endpoint), ('method', method), *extra.items()]
+            return '{' + ','.join(f'{name}="{_label(value)}"' for name, value in pairs) + '}'
+
+        header('cm_http_requests_total', 'counter', 'Requests handled, by endpoint and status.')
+        for (endpoint, method), statuses, *_ in snapshot:
+            for status, count in sorted(statuses.items()):
+                out.append(f'cm_http_requests_total{labels(endpoint, method, status=status)} {count}')
+
+        header('cm_http_request_duration_seconds', 'histogram', 'Request duration until the response is returned.')
+        for (endpoint, method), _, buckets, requests, duration, *_ in snapshot:
+            for bound, count in zip(DURATION_BUCKETS, buckets):
+                out.append(f'cm_http_request_duration_seconds_bucket{labels(endpoint, method, le=bound)} {count}')
+            out.append(f'cm_http_request_duration_seconds_bucket{labels(endpoint, method, le="+Inf")} {requests}')
+            out.append(f'cm_http_request_duration_seconds_sum{labels(endpoint, method)} {duration:.6f}')
+            out.append(f'cm_http_request_duration_seconds_count{labels(endpoint, method)} {requests}')
+
+        counters = (
+            ('cm_db_queries_total', 'SQL statements executed.', 5, '{}'),
+            ('cm_db_duration_seconds_total', 'Time spent executing SQL.', 6, '{:.6f}'),
+            ('cm_serialize_duration_seconds_total', 'Time spent encoding JSON responses.', 7, '{:.6f}'),
+            ('cm_http_response_bytes_total', 'Response body bytes (streamed responses excluded).', 8, '{}'),
+            ('cm_http_slow_requests_total', 'Requests slower than PROFILING_SLOW_REQUEST_MS.', 9, '{}'),
+        )
+        for name, help_text, index, fmt in counters:
+            header(name, 'counter', help_text)
+            for row in snapshot:
+                (endpoint, method) = row[0]
+                out.append(f'{name}{labels(endpoint, method)} {fmt.format(row[index])}')
+        return '\n'.join(out) + '\n'
+
+    def _metrics_view(self):
+        return Response(self.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
@@ -0,0 +1,178 @@
+# backend/query_plans.py
+# 查詢計畫的回歸檢查 (flask check-query-plans)：
+# 在暫存的 SQLite 資料庫中以遷移檔建立資料表、寫入接近實際規模的資料 (seed_data.py) 並 ANALYZE，
+# 再以 test client 呼叫每個讀取型 API，攔截它們送出的 SELECT，以 EXPLAIN QUERY PLAN 確認
+# 大表 (Sample / 報告 / 檢測項目 / 彙總表) 都有以條件在索引上定位 (SEARCH)：
+# - SCAN <表> 是全表掃描；
+# - SCAN <表> USING [COVERING] INDEX 是從頭走完整個索引，只有未篩選、依索引順序讀 LIMIT 筆的第一頁可以接受，
+#   這類情境在 Scenario.index_walks 列出；有篩選條件或 cursor 的情境一律必須是 SEARCH。
+# cursor 分頁除了第一頁，也檢查第二頁與深處的一頁 (Scenario.cursor_from)。
+# 任何一個 API 不符時 CLI (flask check-query-plans) 以非零結束碼結束；tests/test_query_plans.py 在測試中執行同一份檢查。
+
+import re
+from collections import namedtuple
+from contextlib import contextmanager
+from urllib.parse import urlencode
+from datetime import timedelta
+from sqlalchemy import event
+from seed_data import LINES
+
+# 不允許全表掃描的資料表
+WATCHED_TABLES = ('sample', 'sample_rollup', 'wastewater_report', 'wastewater_report_item', 'job', 'control_chart_alert')
+
+_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?(.*)$')
+
+# full_scans / index_walks：允許全表掃描 / 從頭走索引的資料表；
+# cursor_from：先以這個 URL 取得 next_cursor 再帶入 url (檢查第二頁之後的查詢)
+Scenario = namedtuple('Scenario', 'name url full_scans index_walks cursor_from', defaults=((), (), None))
+
+
+def scenarios(now, deep_rows):
+    """
+    Scenario 列表；日期以種子資料的結束時間 now 為基準，deep_rows 為 cursor 分頁「深處的一頁」之前的筆數。
+    依主鍵 (rowid) 或索引順序讀 LIMIT 筆的未篩選第一頁在計畫中顯示為 SCAN，但讀到 LIMIT 筆就停止，
+    這類情境在 full_scans / index_walks 列出允許的資料表。
+    """
+    day = timedelta(days=1)
+    week_ago = (now - 7 * day).isoformat()
+    yesterday = (now - day).isoformat()
+    month_ago_date = (now - 30 * day).date().isoformat()
+    today = now.date().isoformat()
+    items = [
+        ('samples: 時間區間', f'/api/v1/samples/?per_page=20&start_time={week_ago}&end_time={yesterday}'),
+        ('samples: 依產線篩選', f'/api/v1/samples/?per_page=20&line_name={LINES[0]}'),
+        ('samples: 產線 + cursor', f'/api/v1/samples/?pagination=cursor&per_page=50&line_name={LINES[1]}'),
+        ('samples: 匯出區間', f'/api/v1/samples/export?line_name={LINES[0]}&start_time={yesterday}'),
+        ('statistics: main-metrics', '/api/v1/statistics/main-metrics'),
+        ('statistics: line-metrics', f'/api/v1/statistics/line-metrics?from={week_ago}&to={yesterday}'),
+        ('charts: 原始區間', f'/api/v1/charts/line-comparison?from={yesterday}'),
+        ('charts: 小時分桶', f'/api/v1/charts/line-comparison?from={week_ago}&bucket=hour'),
+        ('charts: 分鐘分桶 (全部歷史)', '/api/v1/charts/line-comparison?bucket=minute'),
+        ('analysis: 各產線統計', f'/api/v1/analysis/lines?from={week_ago}&to={yesterday}'),
+        ('analysis: 單一產線', f'/api/v1/analysis/lines?from={week_ago}&line_name={LINES[2]}'),
+        ('reports: 狀態 + 日期', f'/api/v1/wastewater-reports/?per_page=20&status=合格&start_date={month_ago_date}&end_date={today}'),
+        ('reports: 摘要 + 狀態', '/api/v1/wastewater-reports/summary?per_page=20&status=部分項目不合格'),
+        ('reports: 合格率 (廠商 + 日期)', f'/api/v1/wastewater-reports/compliance?group_by=vendor&start_date={month_ago_date}&end_date={today}'),
+        ('reports: 合格率 (單一項目)', '/api/v1/wastewater-reports/compliance?item_name=COD&group_by=vendor_item'),
+        ('reports: 全文檢索', '/api/v1/wastewater-reports/search?q=廠商1'),
+        ('reports: 列表 + 關鍵字', '/api/v1/wastewater-reports/?per_page=20&search=COD'),
+        ('reports: 單筆', '/api/v1/wastewater-reports/1'),
+        ('jobs: 依狀態', '/api/v1/jobs/?status=queued&limit=20'),
+        ('control-charts: 產線統計', '/api/v1/control-charts/lines'),
+        ('control-charts: 警報 (產線)', f'/api/v1/control-charts/alerts?line_name={LINES[0]}&limit=50'),
+        ('control-charts: 警報輪詢', '/api/v1/control-charts/alerts?after=0&limit=50'),
+    ]
+    items = [Scenario(name, url) for name, url in items]
+    # 未篩選的第一頁：依索引順序讀 LIMIT 筆
+    items += [
+        Scenario('samples: 預設列表', '/api/v1/samples/?per_page=20', index_walks=('sample',)),
+        Scenario('samples: cursor 分頁', '/api/v1/samples/?pagination=cursor&per_page=50', index_walks=('sample',)),
+        Scenario('charts: 最新 30 筆', '/api/v1/charts/line-comparison', index_walks=('sample',)),
+        Scenario('reports: 列表分頁', '/api/v1/wastewater-reports/?per_page=20', index_walks=('wastewater_report',)),
+        Scenario('reports: 摘要', '/api/v1/wastewater-reports/summary?per_page=20', index_walks=('wastewater_report',)),
+        Scenario('jobs: 列表', '/api/v1/jobs/?limit=20', index_walks=('job',)),
+        # 管制圖依 Sample.id 處理新紀錄，警報列表依 id 排序
+        Scenario('control-charts: 警報列表', '/api/v1/control-charts/alerts?limit=50', full_scans=('control_chart_alert',)),
+        # 全部歷史依檢測項目彙總：本來就要讀過每一個項目，以最窄的覆蓋索引讀取
+        Scenario('reports: 合格率 (檢測項目)', '/api/v1/wastewater-reports/compliance',
+                 index_walks=('wastewater_report_item',)),
+    ]
+
+    # cursor 分頁：第一頁可以從索引開頭讀，第二頁與深處的一頁都必須直接定位到 cursor 的位置
+    for column in ('id', 'line_name', 'product_name', 'timestamp', 'metric_a', 'metric_b', 'operator'):
+        for order in ('asc', 'desc'):
+            for line_name in (None, LINES[0]):
+                query = {'pagination': 'cursor', 'sort_by': column, 'order': order}
+                if line_name:
+                    query['line_name'] = line_name
+                label = f'samples: 依 {column} {order} 排序' + (' + 產線' if line_name else '')
+                url = '/api/v1/samples/?' + urlencode({**query, 'per_page': 20})
+                if not line_name:
+                    items.append(Scenario(f'{label} (cursor)', url, full_scans=('sample',) if column == 'id' else (),
+                                          index_walks=('sample',)))
+                items.append(Scenario(f'{label} (cursor 第二頁)', url, cursor_from=url))
+                items.append(Scenario(f'{label} (cursor 深處)', url,
+                                      cursor_from='/api/v1/samples/?' + urlencode({**query, 'per_page': deep_rows})))
+    return items
+
+
+@contextmanager
+def capture_statements(engine):
+    """攔截期間內送出的 SELECT (statement, parameters)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def explain(engine, statement, parameters):
+    with engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        try:
+            return [row[3] for row in cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        finally:
+            cursor.close()
+
+
+def full_scans(plan, full_scans=(), index_walks=()):
+    """回傳計畫中掃描受監看資料表的步驟：SCAN <表> (全表) 與 SCAN <表> USING [COVERING] INDEX (整個索引)，
+    分別扣掉 full_scans / index_walks 中允許的資料表"""
+    details = []
+    for detail in plan:
+        match = _SCAN.match(detail)
+        if not match or match.group(1) not in WATCHED_TABLES:
+            continue
+        allowed = index_walks if 'USING' in match.group(2) else full_scans
+        if match.group(1) not in allowed:
+            details.append(detail)
+    return details
+
+
+def _with_cursor(client, scenario):
+    """cursor_from 的回應中的 next_cursor 帶入 url；沒有 next_cursor (資料不足) 時回傳 None"""
+    if scenario.cursor_from is None:
+        return scenario.url
+    cursor = client.get(scenario.cursor_from).get_json()['pagination']['next_cursor']
+    if cursor is None:
+        return None
+    return f"{scenario.url}&{urlencode({'cursor': cursor})}"
+
+
+def check(app, now):
+    """逐一呼叫每個情境的 API 並檢查查詢計畫；回傳 [{name, url, status, statements, scans, sorts}]"""
+    from sqlalchemy import select, func
+    from extensions import db
+    from models import Sample
+
+    results = []
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+        # 「深處的一頁」取在單一產線的中段，依產線篩選時也還有下一頁
+        deep_rows = max(1, db.session.execute(select(func.count()).select_from(Sample)).scalar() // (2 * len(LINES)))
+    for scenario in scenarios(now, deep_rows):
+        url = _with_cursor(client, scenario)
+        if url is None:
+            results.append({'name': scenario.name, 'url': scenario.cursor_from, 'status': 404,
+                            'statements': 0, 'scans': ['資料不足，沒有下一頁'], 'sorts': []})
+            continue
+        with capture_statements(engine) as statements:
+            response = client.get(url)
+            response.get_data()  # 串流回應 (匯出) 也要讀完，查詢才會真的執行
+        scans, sorts = [], []
+        for statement, parameters in statements:
+            plan = explain(engine, statement, parameters)
+            scans.extend(full_scans(plan, scenario.full_scans, scenario.index_walks))
+            sorts.extend(detail for detail in plan if 'TEMP B-TREE' in detail)
+        results.append({
+            'name': scenario.name, 'url': url, 'status': response.status_code,
+            'statements': len(statements), 'scans': scans, 'sorts': sorts,
+        })
+    return results
@@ -0,0 +1,256 @@
+# backend/report_import.py
+# 廢水檢驗報告的批次匯入 (CSV / XLSX)。
+# 檔案格式：每一列是一個檢測項目，同一份報告的項目以 (報告編號) 或 (廠商, 報告日期) 歸為一組，
+# 不需要連續排列。檔案以串流方式逐列讀取，每 chunk_size 列以 executemany 寫入並提交一次。
+
+import csv
+import io
+from datetime import date, datetime
+from sqlalchemy import insert, update, case, exists, and_
+from sqlalchemy.exc import SQLAlchemyError
+from models import WastewaterReport, WastewaterReportItem
+from extensions import cache
+from cache import TAG_WASTEWATER_REPORTS
+import search_index
+import compliance
+
+_report = WastewaterReport.__table__
+_item = WastewaterReportItem.__table__
+
+# 欄位名稱 (可使用英文或中文標題) -> 內部欄位
+COLUMN_ALIASES = {
+    'report_no': 'report_no', '報告編號': 'report_no',
+    'vendor': 'vendor', '廠商': 'vendor', '廠商名稱': 'vendor',
+    'report_date': 'report_date', '報告日期': 'report_date', '日期': 'report_date',
+    'status': 'status', '狀態': 'status', '總體狀態': 'status',
+    'item_name': 'item_name', '項目': 'item_name', '項目名稱': 'item_name', '檢測項目': 'item_name',
+    'value': 'value', '檢測值': 'value', '數值': 'value',
+    'unit': 'unit', '單位': 'unit',
+    'standard': 'standard', '標準': 'standard', '標準值': 'standard',
+    'is_compliant': 'is_compliant', '是否合格': 'is_compliant', '合格': 'is_compliant',
+}
+_TRUE_VALUES = {'true', '1', 'y', 'yes', 't', '是', '合格', 'v'}
+_FALSE_VALUES = {'false', '0', 'n', 'no', 'f', '否', '不合格', 'x'}
+_MAX_LENGTHS = {'vendor': 100, 'status': 50, 'item_name': 100, 'unit': 50, 'standard': 50}
+
+
+class ImportFormatError(ValueError):
+    """檔案本身無法解析 (例如缺少必要欄位、格式不支援)"""
+
+
+# --- 讀取檔案 ---
+
+def _normalize_header(header):
+    mapping = {}
+    for index, name in enumerate(header):
+        name = str(name or '').strip()
+        key = COLUMN_ALIASES.get(name.lower()) or COLUMN_ALIASES.get(name)
+        if key:
+            mapping[index] = key
+    missing = {'vendor', 'report_date', 'item_name', 'value', 'is_compliant'} - set(mapping.values())
+    if missing:
+        raise ImportFormatError(f"缺少必要欄位: {', '.join(sorted(missing))}")
+    return mapping
+
+
+def iter_csv_rows(binary_stream):
+    """逐列讀取 CSV (UTF-8，可含 BOM)，產生 (列號, {欄位: 值})；列號從 2 起算 (第 1 列為標題)"""
+    reader = csv.reader(io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline=''))
+    header = next(reader, None)
+    if header is None:
+        raise ImportFormatError('檔案是空的')
+    mapping = _normalize_header(header)
+    for row_number, values in enumerate(reader, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        yield row_number, {key: values[index] if index < len(values) else None for index, key in mapping.items()}
+
+
+def iter_xlsx_rows(binary_stream):
+    """逐列讀取 XLSX 的第一個工作表 (需安裝 openpyxl，以 read_only 模式串流讀取)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError('伺服器未安裝 openpyxl，無法匯入 .xlsx 檔案，請改用 CSV')
+
+    workbook = load_workbook(binary_stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ImportFormatError('檔案是空的')
+        mapping = _normalize_header(header)
+        for row_number, values in enumerate(rows, start=2):
+            if not any(value not in (None, '') for value in values):
+                continue
+            yield row_number, {key: values[index] if index < len(values) else None for index, key in mapping.items()}
+    finally:
+        workbook.close()
+
+
+def iter_rows(binary_stream, filename=None, file_format=None):
+    file_format = (file_format or (filename or '').rsplit('.', 1)[-1]).lower()
+    if file_format == 'csv':
+        return iter_csv_rows(binary_stream)
+    if file_format in ('xlsx', 'xlsm'):
+        return iter_xlsx_rows(binary_stream)
+    raise ImportFormatError('只支援 .csv 與 .xlsx 檔案')
+
+
+# --- 驗證 ---
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    text = _text(value)
+    for fmt in ('%Y-%m-%d', '%Y/%m/%d', '%Y%m%d'):
+        try:
+            return datetime.strptime(text, fmt)
+        except (TypeError, ValueError):
+            continue
+    raise ValueError
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = (_text(value) or '').lower()
+    if text in _TRUE_VALUES:
+        return True
+    if text in _FALSE_VALUES:
+        return False
+    raise ValueError
+
+
+def validate_row(raw):
+    """驗證一列資料；回傳 (報告欄位, 項目欄位, 錯誤訊息列表)"""
+    errors = []
+    values = {name: _text(raw.get(name)) for name in _MAX_LENGTHS}
+    for name in ('vendor', 'item_name'):
+        if not values[name]:
+            errors.append(f'{name} 為必填')
+    for name, max_length in _MAX_LENGTHS.items():
+        if values[name] and len(values[name]) > max_length:
+            errors.append(f'{name} 長度不可超過 {max_length}')
+
+    report_date = value = is_compliant = None
+    try:
+        report_date = _parse_date(raw.get('report_date'))
+    except ValueError:
+        errors.append('report_date 必須是 YYYY-MM-DD 格式的日期')
+    try:
+        value = float(raw.get('value'))
+        if value != value or value in (float('inf'), float('-inf')):
+            raise ValueError
+    except (TypeError, ValueError):
+        errors.append('value 必須是數值')
+    try:
+        is_compliant = _parse_bool(raw.get('is_compliant'))
+    except ValueError:
+        errors.append('is_compliant 必須是 是/否、合格/不合格 或 true/false')
+
+    if errors:
+        return None, None, errors
+    report = {
+        'key': _text(raw.get('report_no')) or (values['vendor'], report_date),
+        'vendor': values['vendor'],
+        'report_date': report_date,
+        'status': values['status'],
+    }
+    item = {
+        'item_name': values['item_name'], 'value': value, 'unit': values['unit'],
+        'standard': values['standard'], 'is_compliant': is_compliant,
+        **compliance.standard_limits(values['standard']),
+    }
+    return report, item, []
+
+
+# --- 寫入 ---
+
+def import_reports(session, rows, chunk_size=2000):
+    """
+    批次匯入報告；rows 為 (列號, 原始資料) 的可迭代物件。
+    回傳 {'reports_created', 'items_inserted', 'rejected', 'errors': [{'row', 'errors'}]}。
+    """
+    report_ids = {}          # 報告分組鍵 -> 已寫入的報告 id (跨 chunk 使用)
+    derived_status = set()   # 檔案中沒有指定狀態、需依項目結果推算狀態的報告
+    result = {'reports_created': 0, 'items_inserted': 0, 'rejected': 0, 'errors': []}
+    chunk = []
+
+    def flush():
+        new_reports = {}
+        for _, report, _ in chunk:
+            if report['key'] not in report_ids and report['key'] not in new_reports:
+                new_reports[report['key']] = report
+        try:
+            conn = session.connection()
+            if new_reports:
+                # executemany + RETURNING 一次取回這一批新報告的 id
+                ids = conn.execute(
+                    insert(_report).returning(_report.c.id, sort_by_parameter_order=True),
+                    [{'vendor': r['vendor'], 'report_date': r['report_date'], 'status': r['status'] or '合格'}
+                     for r in new_reports.values()],
+                ).scalars().all()
+                created = dict(zip(new_reports, ids))
+            else:
+                created = {}
+            item_rows = [
+                {**item, 'report_id': created.get(report['key']) or report_ids[report['key']]}
+                for _, report, item in chunk
+            ]
+            conn.execute(insert(_item), item_rows)
+            touched = {row['report_id'] for row in item_rows}
+            search_index.reindex(conn, touched)
+            cache.invalidate_on_commit(conn, TAG_WASTEWATER_REPORTS)
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            message = f'寫入資料庫失敗: {e.__class__.__name__}'
+            result['errors'].extend({'row': row_number, 'errors': [message]} for row_number, _, _ in chunk)
+            result['rejected'] += len(chunk)
+        else:
+            report_ids.update(created)
+            derived_status.update(created[key] for key, r in new_reports.items() if not r['status'])
+            result['reports_created'] += len(created)
+            result['items_inserted'] += len(chunk)
+        chunk.clear()
+
+    for row_number, raw in rows:
+        report, item, errors = validate_row(raw)
+        if errors:
+            result['errors'].append({'row': row_number, 'errors': errors})
+            result['rejected'] += 1
+            continue
+        chunk.append((row_number, report, item))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    _derive_statuses(session, derived_status)
+    return result
+
+
+def _derive_statuses(session, report_ids):
+    """檔案沒有指定狀態的報告：依是否有不合格項目決定狀態 (每批一個 UPDATE)"""
+    report_ids = sorted(report_ids)
+    if not report_ids:
+        return
+    has_failure = exists().where(and_(_item.c.report_id == _report.c.id, _item.c.is_compliant.is_(False)))
+    for start in range(0, len(report_ids), 500):
+        session.connection().execute(
+            update(_report)
+            .where(_report.c.id.in_(report_ids[start:start + 500]))
+            .values(status=case((has_failure, '部分項目不合格'), else_='合格'))
+        )
+    cache.invalidate_on_commit(session.connection(), TAG_WASTEWATER_REPORTS)
+    session.commit()
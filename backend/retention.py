@@ -0,0 +1,104 @@
+# backend/retention.py
+# 產線紀錄的保留政策 (flask archive-samples)：把早於保留期限的 Sample 從熱資料表搬進封存區 (archive.py)，
+# 讓列表排序、COUNT 與寫入時的索引維護只面對最近的資料。
+# - 期限對齊到分區 (ARCHIVE_PARTITION) 的起點，搬完的分區就是完整的；之後才補寫的舊紀錄在下次執行時另寫成片段
+# - 每個片段最多 batch_size 筆、一個短交易：寫檔 (pending) -> 依 id 分批刪除熱資料表的紀錄 -> commit -> committed；
+#   中途中斷留下的 pending 片段在下次執行時依熱資料表是否還有那些紀錄決定撤銷或確認
+# - 累計表與彙總表描述的是完整歷史 (含封存的紀錄)，搬移時不扣除；重算時也會把封存區算進去
+
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func
+from models import Sample
+from extensions import cache
+from cache import TAG_SAMPLES
+import rollups
+
+# 每個 DELETE ... IN 的 id 數 (SQLite 的參數數量有上限)
+DELETE_CHUNK = 500
+
+_sample = Sample.__table__
+_COLUMNS = (_sample.c.id, _sample.c.line_name, _sample.c.product_name, _sample.c.timestamp,
+            _sample.c.metric_a, _sample.c.metric_b, _sample.c.operator)
+
+
+def cutoff(now, retention_days, partition):
+    """早於這個時間的紀錄要封存 (對齊到分區起點)"""
+    return rollups.truncate(now - timedelta(days=retention_days), partition)
+
+
+def _partition_end(start, partition):
+    if partition == 'day':
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _chunks(ids):
+    for offset in range(0, len(ids), DELETE_CHUNK):
+        yield ids[offset:offset + DELETE_CHUNK]
+
+
+def reconcile(session, store):
+    """處理上次中斷留下的 pending 片段：熱資料表還有那些紀錄就撤銷片段，否則確認；回傳 (撤銷數, 確認數)"""
+    discarded = committed = 0
+    for entry in store.segments(state='pending'):
+        ids = store.load(entry)['id'].tolist()
+        remaining = sum(
+            session.execute(select(func.count()).select_from(_sample).where(_sample.c.id.in_(chunk))).scalar()
+            for chunk in _chunks(ids)
+        )
+        if remaining:
+            store.discard_segment(entry)
+            discarded += 1
+        else:
+            store.commit_segment(entry)
+            committed += 1
+    session.rollback()
+    return discarded, committed
+
+
+def pending_count(session, before):
+    return session.execute(select(func.count()).select_from(_sample).where(_sample.c.timestamp < before)).scalar()
+
+
+def archive_samples(session, store, retention_days, batch_size=50000, now=None, progress=None):
+    """
+    把 timestamp 早於保留期限的紀錄搬進封存區；回傳 {'cutoff', 'archived', 'segments'}。
+    progress(片段的 manifest 項目) 在每個片段 commit 之後呼叫。
+    """
+    if not store.enabled:
+        raise RuntimeError('封存區未啟用 (ARCHIVE_DIR 未設定)')
+    reconcile(session, store)
+    before = cutoff(now or datetime.utcnow(), retention_days, store.partition)
+    result = {'cutoff': before, 'archived': 0, 'segments': 0}
+
+    while True:
+        first = session.execute(select(func.min(_sample.c.timestamp)).where(_sample.c.timestamp < before)).scalar()
+        if first is None:
+            break
+        partition_start = rollups.truncate(first, store.partition)
+        partition_end = min(_partition_end(partition_start, store.partition), before)
+        rows = session.execute(
+            select(*_COLUMNS)
+            .where(_sample.c.timestamp >= partition_start, _sample.c.timestamp < partition_end)
+            .order_by(_sample.c.timestamp, _sample.c.id)
+            .limit(batch_size)
+        ).all()
+
+        entry = store.write_segment(rows)
+        try:
+            conn = session.connection()
+            for chunk in _chunks([row.id for row in rows]):
+                conn.execute(delete(_sample).where(_sample.c.id.in_(chunk)))
+            cache.invalidate_on_commit(conn, TAG_SAMPLES)
+            session.commit()
+        except Exception:
+            session.rollback()
+            store.discard_segment(entry)
+            raise
+        store.commit_segment(entry)
+
+        result['archived'] += len(rows)
+        result['segments'] += 1
+        if progress:
+            progress(entry)
+    return result
@@ -0,0 +1,341 @@
+# backend/rollups.py
+# 維護 SampleRollup 彙總表 (每條產線 x 每個時間粒度 一列)，並提供「用最粗的彙總」回答區間查詢的讀取函式。
+# - 新增：在 Python 中把新紀錄分桶後，以 col = col + delta 的方式 upsert (min/max 取較小/較大者)
+# - 刪除 / 修改：min/max 無法遞減維護，因此把受影響的「整天」從原始紀錄重新彙總一次
+
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, select, delete, insert, update, case, and_, inspect
+from models import Sample, SampleRollup
+from extensions import sample_archive
+import downsampling
+
+GRAINS = ('minute', 'hour', 'day')  # 由細到粗
+METRICS = ('metric_a', 'metric_b')
+
+_rollup = SampleRollup.__table__
+_sample = Sample.__table__
+_KEY_COLUMNS = ('grain', 'line_name', 'bucket_start')
+_ADDITIVE_FIELDS = ('sample_count',) + tuple(
+    f'{stat}_{metric}' for metric in METRICS for stat in ('count', 'sum', 'sumsq')
+)
+
+
+# --- 時間分桶 ---
+
+def truncate(timestamp, grain):
+    """把時間截斷到粒度的起點 (grain 可以是 minute / hour / day / month)"""
+    if grain == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if grain == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if grain == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if grain == 'month':
+        return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f'不支援的粒度: {grain}')
+
+
+def _step(grain):
+    return {'minute': timedelta(minutes=1), 'hour': timedelta(hours=1), 'day': timedelta(days=1)}[grain]
+
+
+def _ceil(timestamp, grain):
+    if timestamp is None:
+        return None
+    start = truncate(timestamp, grain)
+    return start if start == timestamp else start + _step(grain)
+
+
+def _floor(timestamp, grain):
+    return None if timestamp is None else truncate(timestamp, grain)
+
+
+def cover(start, end, grains=GRAINS):
+    """
+    把 [start, end) 拆成「中間用最粗的粒度、兩端逐步變細」的區段：
+    回傳 [(粒度 或 None, 區段起點, 區段終點), ...]，None 表示必須讀原始紀錄 (不足一分鐘的邊緣)。
+    start / end 為 None 代表不設限。
+    """
+    if start is not None and end is not None and start >= end:
+        return []
+    if not grains:
+        return [(None, start, end)]
+
+    grain, finer = grains[-1], grains[:-1]
+    inner_start, inner_end = _ceil(start, grain), _floor(end, grain)
+    if inner_start is not None and inner_end is not None and inner_start >= inner_end:
+        return cover(start, end, finer)
+
+    segments = []
+    if start is not None:
+        segments += cover(start, inner_start, finer)
+    segments.append((grain, inner_start, inner_end))
+    if end is not None:
+        segments += cover(inner_end, end, finer)
+    return segments
+
+
+# --- 統計值的合併 ---
+
+def empty_stats():
+    stats = {name: 0 for name in _ADDITIVE_FIELDS}
+    for metric in METRICS:
+        stats[f'min_{metric}'] = None
+        stats[f'max_{metric}'] = None
+    return stats
+
+
+def merge(into, other):
+    for name in _ADDITIVE_FIELDS:
+        into[name] += other[name]
+    for metric in METRICS:
+        for name, pick in ((f'min_{metric}', min), (f'max_{metric}', max)):
+            if other[name] is not None:
+                into[name] = other[name] if into[name] is None else pick(into[name], other[name])
+    return into
+
+
+def _row_stats(row):
+    stats = empty_stats()
+    stats['sample_count'] = 1
+    for metric in METRICS:
+        value = row[metric]
+        if value is not None:
+            stats[f'count_{metric}'] = 1
+            stats[f'sum_{metric}'] = value
+            stats[f'sumsq_{metric}'] = value * value
+            stats[f'min_{metric}'] = value
+            stats[f'max_{metric}'] = value
+    return stats
+
+
+def summarize(stats, metric):
+    """把合併後的統計值換算成 筆數 / 平均 / 標準差 (樣本) / 最小 / 最大"""
+    n = stats[f'count_{metric}']
+    if not n:
+        return {'count': 0, 'avg': None, 'std': None, 'min': None, 'max': None}
+    mean = stats[f'sum_{metric}'] / n
+    variance = (stats[f'sumsq_{metric}'] - n * mean * mean) / (n - 1) if n > 1 else 0.0
+    return {
+        'count': n,
+        'avg': mean,
+        'std': math.sqrt(max(variance, 0.0)),
+        'min': stats[f'min_{metric}'],
+        'max': stats[f'max_{metric}'],
+    }
+
+
+# --- 從原始紀錄彙總 ---
+
+def _raw_minute_stats(conn, start=None, end=None, line_name=None, criterion=None):
+    """
+    在 SQL 中以 (產線, 分鐘) GROUP BY 原始紀錄，回傳 {(產線, 分鐘起點): stats}；
+    沒有額外條件時也併入區間內已封存的紀錄 (重算彙總時不會漏掉搬走的資料)
+    """
+    minute = downsampling.bucket_expression(_sample.c.timestamp, 'minute', conn.dialect.name).label('minute')
+    columns = [minute, _sample.c.line_name, func.count(_sample.c.id)]
+    for metric in METRICS:
+        column = _sample.c[metric]
+        columns += [func.count(column), func.sum(column), func.sum(column * column), func.min(column), func.max(column)]
+
+    stmt = select(*columns).group_by(_sample.c.line_name, minute)
+    if start is not None:
+        stmt = stmt.where(_sample.c.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(_sample.c.timestamp < end)
+    if line_name is not None:
+        stmt = stmt.where(_sample.c.line_name == line_name)
+    if criterion is not None:
+        stmt = stmt.where(criterion)
+
+    result = {}
+    for row in conn.execute(stmt):
+        stats = {'sample_count': row[2]}
+        for offset, metric in zip((3, 8), METRICS):
+            count, total, total_sq, low, high = row[offset:offset + 5]
+            stats.update({
+                f'count_{metric}': count, f'sum_{metric}': total or 0.0, f'sumsq_{metric}': total_sq or 0.0,
+                f'min_{metric}': low, f'max_{metric}': high,
+            })
+        result[(row.line_name, datetime.fromisoformat(row.minute))] = stats
+    if criterion is None:
+        for key, stats in sample_archive.minute_stats(start, end, line_name).items():
+            merge(result.setdefault(key, empty_stats()), stats)
+    return result
+
+
+def _roll_up(minute_stats):
+    """{(產線, 分鐘): stats} -> {(粒度, 產線, 桶起點): stats}，涵蓋所有粒度"""
+    keyed = defaultdict(empty_stats)
+    for (line_name, minute), stats in minute_stats.items():
+        for grain in GRAINS:
+            merge(keyed[(grain, line_name, truncate(minute, grain))], stats)
+    return keyed
+
+
+# --- 寫入彙總表 ---
+
+def _least_or_greatest(current, incoming, pick_lower):
+    better = incoming < current if pick_lower else incoming > current
+    return case((current.is_(None), incoming), (incoming.is_(None), current), (better, incoming), else_=current)
+
+
+def _upsert_add(conn, keyed_stats):
+    """把增量累加進彙總表 (桶不存在時新增)"""
+    if not keyed_stats:
+        return
+    rows = [dict(zip(_KEY_COLUMNS, key), **stats) for key, stats in keyed_stats.items()]
+
+    if conn.dialect.name in ('sqlite', 'postgresql'):
+        if conn.dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(_rollup)
+        excluded = stmt.excluded
+        set_ = {name: _rollup.c[name] + excluded[name] for name in _ADDITIVE_FIELDS}
+        for metric in METRICS:
+            set_[f'min_{metric}'] = _least_or_greatest(_rollup.c[f'min_{metric}'], excluded[f'min_{metric}'], True)
+            set_[f'max_{metric}'] = _least_or_greatest(_rollup.c[f'max_{metric}'], excluded[f'max_{metric}'], False)
+        conn.execute(stmt.on_conflict_do_update(index_elements=list(_KEY_COLUMNS), set_=set_), rows)
+        return
+
+    # 其他資料庫：逐桶 UPDATE，沒有對應的桶時再 INSERT
+    for row in rows:
+        values = {name: _rollup.c[name] + row[name] for name in _ADDITIVE_FIELDS}
+        for metric in METRICS:
+            for name, lower in ((f'min_{metric}', True), (f'max_{metric}', False)):
+                if row[name] is not None:
+                    values[name] = _least_or_greatest(_rollup.c[name], row[name], lower)
+        where = and_(*(_rollup.c[name] == row[name] for name in _KEY_COLUMNS))
+        if conn.execute(update(_rollup).where(where).values(**values)).rowcount == 0:
+            conn.execute(insert(_rollup).values(**row))
+
+
+def recompute_range(conn, start, end, line_name=None):
+    """把 [start, end) (需對齊到整天) 的彙總刪掉，再從原始紀錄重新彙總"""
+    stmt = delete(_rollup).where(_rollup.c.bucket_start >= start, _rollup.c.bucket_start < end)
+    if line_name is not None:
+        stmt = stmt.where(_rollup.c.line_name == line_name)
+    conn.execute(stmt)
+
+    keyed = _roll_up(_raw_minute_stats(conn, start, end, line_name=line_name))
+    if keyed:
+        conn.execute(insert(_rollup), [dict(zip(_KEY_COLUMNS, key), **stats) for key, stats in keyed.items()])
+
+
+def apply_insert(conn, rows):
+    """在同一個交易中，把新寫入的紀錄 (需含 line_name/timestamp/metric_a/metric_b) 累加進彙總表"""
+    keyed = defaultdict(empty_stats)
+    for row in rows:
+        stats = _row_stats(row)
+        for grain in GRAINS:
+            merge(keyed[(grain, row['line_name'], truncate(row['timestamp'], grain))], stats)
+    _upsert_add(conn, keyed)
+
+
+def prepare_delete(conn, criterion):
+    """在刪除之前呼叫：找出受影響的 (產線, 日期)"""
+    day = downsampling.bucket_expression(_sample.c.timestamp, 'day', conn.dialect.name)
+    rows = conn.execute(select(_sample.c.line_name, day).where(criterion).distinct()).all()
+    return sorted((line_name, datetime.fromisoformat(label)) for line_name, label in rows)
+
+
+def apply_delete(conn, affected_days):
+    """在刪除之後 (同一個交易中) 呼叫：把受影響的日期重新彙總，連續的日期合併成一個區段"""
+    day = timedelta(days=1)
+    ranges = []
+    for line_name, start in affected_days:
+        if ranges and ranges[-1][0] == line_name and ranges[-1][2] == start:
+            ranges[-1][2] = start + day
+        else:
+            ranges.append([line_name, start, start + day])
+    for line_name, start, end in ranges:
+        recompute_range(conn, start, end, line_name=line_name)
+
+
+def backfill(session, start=None, end=None, days_per_batch=7, progress=None):
+    """從原始紀錄重建 [start, end) 的彙總；每個批次 (days_per_batch 天) 一個交易"""
+    conn = session.connection()
+    bounds = select(func.min(_sample.c.timestamp), func.max(_sample.c.timestamp))
+    if start is not None:
+        bounds = bounds.where(_sample.c.timestamp >= start)
+    if end is not None:
+        bounds = bounds.where(_sample.c.timestamp < end)
+    first, last = conn.execute(bounds).one()
+
+    # 範圍內沒有原始資料時，仍要清掉殘留的彙總
+    window_start = truncate(start or first or datetime.utcnow(), 'day')
+    window_end = _ceil(end or (last + timedelta(microseconds=1) if last else window_start), 'day')
+    step = timedelta(days=days_per_batch)
+
+    while window_start < window_end:
+        batch_end = min(window_start + step, window_end)
+        recompute_range(session.connection(), window_start, batch_end)
+        session.commit()
+        if progress:
+            progress(window_start, batch_end)
+        window_start = batch_end
+
+
+# --- 讀取 ---
+
+def query_stats(conn, start=None, end=None, line_name=None, max_grain='day', group_grain=None):
+    """
+    以能涵蓋 [start, end) 的最粗彙總回答查詢；回傳 {(產線, 群組起點): stats}。
+    group_grain 為 None 時整段區間合併成一組 (群組起點為 None)；
+    max_grain 限制可使用的最粗粒度 (例如以小時分組時最粗只能用小時彙總)。
+    """
+    grains = GRAINS[:GRAINS.index(max_grain) + 1]
+    grouped = defaultdict(empty_stats)
+
+    def add(line, bucket_start, stats):
+        key = truncate(bucket_start, group_grain) if group_grain else None
+        merge(grouped[(line, key)], stats)
+
+    for grain, segment_start, segment_end in cover(start, end, grains):
+        if grain is None:
+            for (line, minute), stats in _raw_minute_stats(conn, segment_start, segment_end, line_name=line_name).items():
+                add(line, minute, stats)
+            continue
+
+        stmt = select(_rollup).where(_rollup.c.grain == grain)
+        if segment_start is not None:
+            stmt = stmt.where(_rollup.c.bucket_start >= segment_start)
+        if segment_end is not None:
+            stmt = stmt.where(_rollup.c.bucket_start < segment_end)
+        if line_name is not None:
+            stmt = stmt.where(_rollup.c.line_name == line_name)
+        for row in conn.execute(stmt).mappings():
+            add(row['line_name'], row['bucket_start'], row)
+    return grouped
+
+
+# --- ORM 單筆寫入的自動維護 ---
+
+def _snapshot(target):
+    return {name: getattr(target, name) for name in ('line_name', 'timestamp') + METRICS}
+
+
+@event.listens_for(Sample, 'after_insert')
+def _sample_inserted(mapper, connection, target):
+    apply_insert(connection, [_snapshot(target)])
+
+
+@event.listens_for(Sample, 'after_delete')
+def _sample_deleted(mapper, connection, target):
+    apply_delete(connection, [(target.line_name, truncate(target.timestamp, 'day'))])
+
+
+@event.listens_for(Sample, 'after_update')
+def _sample_updated(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in ('line_name', 'timestamp') + METRICS):
+        return
+    affected = {(target.line_name, truncate(target.timestamp, 'day'))}
+    old_line = state.attrs.line_name.history.deleted
+    old_time = state.attrs.timestamp.history.deleted
+    affected.add((old_line[0] if old_line else target.line_name, truncate(old_time[0] if old_time else target.timestamp, 'day')))
+    apply_delete(connection, sorted(affected))
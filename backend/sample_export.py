@@ -0,0 +1,107 @@
+# backend/sample_export.py
+# 產線紀錄的串流匯出 (NDJSON / CSV)：/samples/export 直接串流給用戶端，背景工作 export-samples (jobs.py) 寫成結果檔。
+# 依 (timestamp, id) 以 server-side cursor 分批讀取，記憶體用量只與批次大小有關；
+# 篩選範圍涵蓋封存區時 (未指定時間區間即為全部歷史) 與封存紀錄依序合併。
+
+import csv
+import heapq
+import io
+import json
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import select
+from models import Sample
+from extensions import db, sample_archive
+
+# 每批從資料庫讀取的筆數 (server-side cursor)
+EXPORT_BATCH_SIZE = 5000
+# 列表與匯出只選取這些欄位 (Row tuple)，不建立 ORM 物件
+SAMPLE_COLUMNS = (Sample.id, Sample.line_name, Sample.product_name, Sample.timestamp,
+                  Sample.metric_a, Sample.metric_b, Sample.operator)
+EXPORT_FIELDS = [column.key for column in SAMPLE_COLUMNS]
+# 格式 -> (副檔名, MIME type)
+FORMATS = {
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'csv': ('csv', 'text/csv'),
+}
+
+
+def apply_filters(query, args):
+    """把 line_name / 時間區間篩選套用到 Query 或 select() 上"""
+    if args.get('line_name'):
+        query = query.where(Sample.line_name == args['line_name'])
+    if args.get('start_time'):
+        query = query.where(Sample.timestamp >= args['start_time'])
+    if args.get('end_time'):
+        query = query.where(Sample.timestamp < args['end_time'])
+    return query
+
+
+def reads_archive(args, require_window=False):
+    """
+    篩選條件 (產線 / 時間區間) 和封存片段有交集時讀封存區；未指定時間區間代表全部歷史，所有片段都要讀 (仍依產線剪枝)。
+    列表 API 以 require_window=True 呼叫：未指定時間區間的列表只列熱資料表 (最近的資料)，總筆數也只算熱資料表，
+    不必為了第一頁展開整個封存區；要翻到封存的紀錄請指定時間區間。
+    """
+    if require_window and not (args.get('start_time') or args.get('end_time')):
+        return False
+    return bool(sample_archive.segments(args.get('start_time'), args.get('end_time'), args.get('line_name')))
+
+
+def _stream_rows(stmt):
+    """以 yield_per 分批讀取，記憶體用量只與批次大小有關，與總筆數無關"""
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    try:
+        for batch in result.partitions():
+            yield batch
+    finally:
+        result.close()
+
+
+def batches(args):
+    """依 (timestamp, id) 順序分批產生符合篩選條件的紀錄；區間涵蓋封存區時，與封存紀錄依序合併 (一次只展開一組封存片段)"""
+    # 只選取欄位 (不建立 ORM 物件)，依 (timestamp, id) 排序以走複合索引
+    stmt = apply_filters(select(*SAMPLE_COLUMNS), args).order_by(Sample.timestamp.asc(), Sample.id.asc())
+    if not reads_archive(args):
+        yield from _stream_rows(stmt)
+        return
+    hot = (row for batch in _stream_rows(stmt) for row in batch)
+    archived = sample_archive.iter_rows(args.get('start_time'), args.get('end_time'), args.get('line_name'))
+    merged = heapq.merge(archived, hot, key=lambda row: (row.timestamp, row.id))
+    while True:
+        batch = list(islice(merged, EXPORT_BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def ndjson(batches):
+    for batch in batches:
+        lines = []
+        for row in batch:
+            record = row._asdict()
+            record['timestamp'] = record['timestamp'].isoformat() if record['timestamp'] else None
+            lines.append(json.dumps(record, ensure_ascii=False))
+        yield '\n'.join(lines) + '\n'
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for batch in batches:
+        for row in batch:
+            writer.writerow(
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def encode(batches, file_format):
+    """依格式把批次轉成字串片段的產生器"""
+    return csv_chunks(batches) if file_format == 'csv' else ndjson(batches)
@@ -0,0 +1,37 @@
+# backend/sample_writes.py
+# 批次寫入 Sample 的共用入口。
+# ORM 的單筆寫入會由 aggregates / rollups 的 mapper 事件自動維護衍生資料；
+# Core 的批次 INSERT / DELETE 不會觸發那些事件，因此一律經過這裡，在同一個交易中更新衍生資料，
+# 並標記 commit 後要失效的回應快取。
+
+from sqlalchemy import delete
+from models import Sample
+from extensions import cache
+from cache import TAG_SAMPLES
+import aggregates
+import rollups
+
+
+def samples_inserted(conn, rows):
+    """批次寫入後呼叫 (rows 需含 id/line_name/timestamp/metric_a/metric_b)"""
+    aggregates.apply_insert(conn, rows)
+    rollups.apply_insert(conn, rows)
+    cache.invalidate_on_commit(conn, TAG_SAMPLES)
+
+
+def delete_samples(session, criterion):
+    """依條件批次刪除 Sample，並在同一個交易中更新衍生資料；回傳刪除筆數 (由呼叫端 commit)"""
+    conn = session.connection()
+    aggregate_state = aggregates.prepare_delete(conn, criterion)
+    if aggregate_state is None:
+        return 0
+    affected_days = rollups.prepare_delete(conn, criterion)
+
+    num_deleted = session.execute(
+        delete(Sample).where(criterion).execution_options(synchronize_session=False)
+    ).rowcount
+
+    aggregates.apply_delete(conn, aggregate_state)
+    rollups.apply_delete(conn, affected_days)
+    cache.invalidate_on_commit(conn, TAG_SAMPLES)
+    return num_deleted
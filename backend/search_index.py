@@ -0,0 +1,175 @@
+# backend/search_index.py
+# 廢水報告的全文檢索索引 (SQLite FTS5)，涵蓋廠商名稱與檢測項目名稱。
+# - 每份報告在 FTS 表中一列，rowid = 報告 id
+# - 中文沒有空白分詞，因此寫入與查詢時都把每個 CJK 字元拆成獨立的 token，
+#   查詢時再以片語 (連續 token) 比對，達到「任意位置的中文子字串 + 英數字首」的搜尋
+# - ORM 寫入由 session 的 after_flush 事件自動同步；Core 批次寫入必須自行呼叫 reindex() / remove()
+# - 非 SQLite 或索引表尚未建立時，search_criterion() 會退回原本的 LIKE 篩選
+
+import re
+from sqlalchemy import event, text, select, inspect, Integer
+from sqlalchemy.orm import Session
+from models import WastewaterReport, WastewaterReportItem
+from extensions import db
+
+FTS_TABLE = 'wastewater_report_fts'
+# vendor 欄位的權重高於檢測項目 (bm25 分數越小代表越相關)
+VENDOR_WEIGHT = 10.0
+ITEMS_WEIGHT = 1.0
+
+# CJK 統一漢字 (含擴充 A)、相容漢字、日文假名、韓文音節
+_CJK = re.compile(r'([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af])')
+
+
+def _segment(value):
+    """在每個 CJK 字元兩側加上空白，讓 unicode61 tokenizer 把它們當成獨立的 token"""
+    return _CJK.sub(r' \1 ', value or '')
+
+
+def build_match_query(term):
+    """把使用者輸入轉成 FTS5 查詢：空白分隔的每個詞都要出現 (AND)，每個詞的最後一個 token 做字首比對"""
+    phrases = []
+    for word in term.split():
+        tokens = [token for token in re.split(r'[\W_]+', _segment(word)) if token]
+        if tokens:
+            phrases.append('"' + ' '.join(token.replace('"', '""') for token in tokens) + '"*')
+    return ' AND '.join(phrases) or None
+
+
+def create(conn):
+    """建立 FTS5 索引表 (僅 SQLite)；已存在時不做任何事"""
+    if conn.dialect.name != 'sqlite':
+        return False
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(vendor, items, tokenize='unicode61')"
+    ))
+    return True
+
+
+def is_available(conn):
+    if conn.dialect.name != 'sqlite':
+        return False
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).first() is not None
+
+
+def remove(conn, report_ids):
+    report_ids = list(report_ids)
+    if report_ids and is_available(conn):
+        for start in range(0, len(report_ids), 500):
+            chunk = report_ids[start:start + 500]
+            conn.execute(
+                text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(str(int(i)) for i in chunk)})")
+            )
+
+
+def reindex(conn, report_ids):
+    """從資料表重新產生指定報告的索引內容 (已不存在的報告會從索引中移除)"""
+    report_ids = sorted(set(report_ids))
+    if not report_ids or not is_available(conn):
+        return
+    remove(conn, report_ids)
+
+    for start in range(0, len(report_ids), 500):
+        chunk = report_ids[start:start + 500]
+        documents = {}
+        rows = conn.execute(
+            select(WastewaterReport.id, WastewaterReport.vendor, WastewaterReportItem.item_name)
+            .outerjoin(WastewaterReportItem, WastewaterReportItem.report_id == WastewaterReport.id)
+            .where(WastewaterReport.id.in_(chunk))
+        )
+        for report_id, vendor, item_name in rows:
+            document = documents.setdefault(report_id, {'vendor': vendor, 'items': []})
+            if item_name:
+                document['items'].append(item_name)
+        if documents:
+            conn.execute(
+                text(f"INSERT INTO {FTS_TABLE} (rowid, vendor, items) VALUES (:id, :vendor, :items)"),
+                [
+                    {'id': report_id, 'vendor': _segment(doc['vendor']), 'items': _segment(' '.join(doc['items']))}
+                    for report_id, doc in documents.items()
+                ],
+            )
+
+
+def rebuild(conn, batch_size=1000):
+    """清空並重建整個索引；回傳索引的報告數"""
+    if not create(conn):
+        return 0
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    total = 0
+    last_id = 0
+    while True:
+        ids = conn.execute(
+            select(WastewaterReport.id).where(WastewaterReport.id > last_id)
+            .order_by(WastewaterReport.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return total
+        reindex(conn, ids)
+        total += len(ids)
+        last_id = ids[-1]
+
+
+def search(conn, term, limit=50):
+    """依相關度回傳 [(報告 id, 分數), ...]；索引不可用時回傳 None"""
+    query = build_match_query(term)
+    if query is None:
+        return []
+    if not is_available(conn):
+        return None
+    rows = conn.execute(
+        text(
+            f"SELECT rowid, bm25({FTS_TABLE}, :vendor_weight, :items_weight) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :query ORDER BY score LIMIT :limit"
+        ),
+        {'vendor_weight': VENDOR_WEIGHT, 'items_weight': ITEMS_WEIGHT, 'query': query, 'limit': limit},
+    )
+    return [(row.rowid, row.score) for row in rows]
+
+
+def search_criterion(conn, term):
+    """給列表查詢使用的篩選條件：索引可用時以 FTS 子查詢比對，否則退回廠商名稱 LIKE"""
+    query = build_match_query(term)
+    if query is None or not is_available(conn):
+        return WastewaterReport.vendor.like(f"%{term}%")
+    matched = text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_query").bindparams(fts_query=query)
+    return WastewaterReport.id.in_(matched.columns(rowid=Integer))
+
+
+def include_in_migrations(name, type_, parent_names):
+    """給 Alembic autogenerate 使用：FTS5 虛擬表與其影子表不在 metadata 中，不要產生 DROP TABLE"""
+    return not (type_ == 'table' and name and name.startswith(FTS_TABLE))
+
+
+# --- ORM 寫入的自動同步 ---
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_index_table(target, connection, **kw):
+    create(connection)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_after_flush(session, flush_context):
+    touched, removed = set(), set()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, WastewaterReport):
+            touched.add(obj.id)
+        elif isinstance(obj, WastewaterReportItem):
+            touched.add(obj.report_id)
+            # 項目換到其他報告時，舊報告也要重新索引
+            history = inspect(obj).attrs.report_id.history
+            touched.update(value for value in history.deleted if value is not None)
+    for obj in session.deleted:
+        if isinstance(obj, WastewaterReport):
+            removed.add(obj.id)
+        elif isinstance(obj, WastewaterReportItem):
+            touched.add(obj.report_id)
+
+    touched.discard(None)
+    touched -= removed
+    if touched or removed:
+        conn = session.connection()
+        remove(conn, removed)
+        reindex(conn, touched)
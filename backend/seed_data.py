@@ -0,0 +1,90 @@
+# backend/seed_data.py
+# 合成測試資料 (flask seed-db、flask check-query-plans 與 flask benchmark 共用)：
+# - N 筆產線紀錄平均分布在最近 days 天、各產線之間
+# - M 份廢水報告，每份 2~6 個檢測項目，檢測值落在標準值附近 (約一成不合格)
+# 都經過一般的寫入路徑 (ingest / report_import)，累計表、彙總表與全文索引會一併建立；
+# 以生成器逐筆產生，千萬筆等級也不會一次放進記憶體。
+
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import text
+import aggregates
+import ingest
+import report_import
+
+LINES = ('產線A', '產線B', '產線C')
+PRODUCT_COUNT = 20
+OPERATOR_COUNT = 30
+VENDOR_COUNT = 200
+
+# 檢測項目 -> (單位, 標準值, 典型值)
+ITEMS = {
+    'COD': ('mg/L', '<100', 60.0),
+    'BOD': ('mg/L', '<30', 18.0),
+    'SS': ('mg/L', '<30', 15.0),
+    'pH': ('', '6-9', 7.5),
+    '氨氮': ('mg/L', '<10', 5.0),
+    '總磷': ('mg/L', '<4', 2.0),
+}
+ITEM_NAMES = tuple(ITEMS)
+
+
+def sample_records(count, now, days=90, rng=None):
+    """產生 (index, 產線紀錄 dict)，時間由舊到新"""
+    rng = rng or random.Random(42)
+    span = timedelta(days=days).total_seconds()
+    for index in range(count):
+        yield index, {
+            'line_name': LINES[index % len(LINES)],
+            'product_name': f'產品{rng.randint(1, PRODUCT_COUNT)}',
+            'timestamp': (now - timedelta(seconds=span * (count - index) / count)).isoformat(),
+            'metric_a': round(rng.gauss(50, 5), 3),
+            'metric_b': round(rng.gauss(1.2, 0.1), 4) if rng.random() > 0.05 else None,
+            'operator': f'OP{rng.randint(1, OPERATOR_COUNT):02d}',
+        }
+
+
+def _item_value(rng, item_name):
+    unit, standard, typical = ITEMS[item_name]
+    if item_name == 'pH':
+        value = rng.gauss(typical, 0.8)
+        return value, 6 <= value <= 9
+    value = max(0.0, rng.gauss(typical, typical * 0.35))
+    return value, value < float(standard.lstrip('<'))
+
+
+def report_rows(count, now, days=365, rng=None):
+    """產生 (列號, 報告匯入列 dict)，每份報告 2~6 列 (與 CSV 匯入的格式相同)"""
+    rng = rng or random.Random(42)
+    row_number = 1
+    for report in range(count):
+        report_date = (now - timedelta(days=rng.randint(0, days))).date().isoformat()
+        vendor = f'廠商{rng.randint(1, VENDOR_COUNT)}'
+        for item_name in rng.sample(ITEM_NAMES, rng.randint(2, len(ITEM_NAMES))):
+            row_number += 1
+            value, compliant = _item_value(rng, item_name)
+            unit, standard, _ = ITEMS[item_name]
+            yield row_number, {
+                'report_no': f'R{report}',
+                'vendor': vendor,
+                'report_date': report_date,
+                'item_name': item_name,
+                'value': f'{value:.2f}',
+                'unit': unit,
+                'standard': standard,
+                'is_compliant': 'true' if compliant else 'false',
+            }
+
+
+def seed(session, samples=10000, reports=500, now=None, seed_value=42, days=90):
+    """寫入 samples 筆產線紀錄與 reports 份廢水報告；回傳 (寫入的紀錄數, 匯入結果)"""
+    rng = random.Random(seed_value)
+    now = now or datetime.utcnow().replace(microsecond=0)
+
+    inserted, _ = ingest.insert_samples(session, sample_records(samples, now, days, rng), chunk_size=5000)
+    imported = report_import.import_reports(session, report_rows(reports, now, rng=rng), chunk_size=5000)
+    # 與大量匯入後執行 flask rebuild-aggregates 相同，先建好累計表 (否則第一次讀取會掃描整張 Sample)
+    aggregates.rebuild(session.connection())
+    session.connection().execute(text('ANALYZE'))
+    session.commit()
+    return inserted, imported
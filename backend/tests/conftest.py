@@ -0,0 +1,30 @@
+# backend/tests/conftest.py
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path):
+    from flask_migrate import upgrade
+    from app import create_app, MIGRATIONS_DIR
+    from extensions import db
+
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+        'ARCHIVE_DIR': str(tmp_path / 'archive'),
+    })
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,45 @@
+# backend/tests/test_aggregates.py
+
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from extensions import db
+from models import Sample, SampleAggregate
+import aggregates
+
+
+def _samples(count, start=datetime(2024, 1, 1)):
+    return [Sample(line_name='產線A', timestamp=start + timedelta(minutes=n), metric_a=float(n), metric_b=1.0)
+            for n in range(count)]
+
+
+def test_multi_row_flush_without_aggregate_row_is_not_double_counted(app):
+    """累計列尚未建立時，一次 flush 多筆的 after_insert 不可重算後又各自累加"""
+    with app.app_context():
+        db.session.add_all(_samples(5))
+        db.session.commit()
+
+        aggregate = aggregates.get_or_rebuild(db.session)
+        assert aggregate.total_count == 5
+        assert aggregate.sum_metric_a == 0 + 1 + 2 + 3 + 4
+        assert aggregates.verify(db.session.connection()) == {}
+
+
+def test_multi_row_flush_and_delete_keep_aggregate_consistent(app):
+    with app.app_context():
+        aggregates.get_or_rebuild(db.session)
+        db.session.add_all(_samples(5))
+        db.session.commit()
+        assert aggregates.verify(db.session.connection()) == {}
+
+        # 刪除最新的一筆：最新紀錄要重新找出
+        newest = db.session.query(Sample).order_by(Sample.timestamp.desc()).first()
+        db.session.delete(newest)
+        db.session.commit()
+        assert aggregates.verify(db.session.connection()) == {}
+        assert db.session.get(SampleAggregate, aggregates.AGGREGATE_ID).total_count == 4
+
+        # 累計列不存在時的刪除不處理，讀取時重算
+        db.session.execute(delete(SampleAggregate))
+        db.session.delete(db.session.query(Sample).first())
+        db.session.commit()
+        assert aggregates.get_or_rebuild(db.session).total_count == 3
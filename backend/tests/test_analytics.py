@@ -0,0 +1,107 @@
+# backend/tests/test_analytics.py
+
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from extensions import db
+import analytics
+import ingest
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(7)
+    values = rng.normal(10.0, 2.0, 400)
+    values[::37] = np.nan
+    timestamps = np.array([START + timedelta(minutes=n) for n in range(values.size)], dtype='datetime64[us]')
+    return timestamps, values
+
+
+def test_metric_stats_match_numpy_reference(series):
+    timestamps, values = series
+    stats = analytics.metric_stats(timestamps, values, window=20, lsl=4.0, usl=15.0, max_points=10000)
+    clean = values[~np.isnan(values)]
+
+    mean, std = clean.mean(), clean.std(ddof=1)
+    sigma_within = np.abs(np.diff(clean)).mean() / 1.128
+    assert stats['count'] == clean.size
+    assert stats['mean'] == pytest.approx(mean)
+    assert stats['std'] == pytest.approx(std)
+    assert (stats['min'], stats['max']) == (clean.min(), clean.max())
+    assert list(stats['percentiles'].values()) == pytest.approx(np.percentile(clean, [5, 25, 50, 75, 95]))
+
+    control = stats['control']
+    assert control['sigma_within'] == pytest.approx(sigma_within)
+    assert (control['ucl'], control['lcl']) == pytest.approx((mean + 3 * sigma_within, mean - 3 * sigma_within))
+    assert control['out_of_control'] == np.count_nonzero((clean > control['ucl']) | (clean < control['lcl']))
+
+    capability = stats['capability']
+    assert capability['cp'] == pytest.approx((15.0 - 4.0) / (6 * sigma_within))
+    assert capability['cpk'] == pytest.approx(min(15.0 - mean, mean - 4.0) / (3 * sigma_within))
+    assert capability['pp'] == pytest.approx((15.0 - 4.0) / (6 * std))
+    assert capability['ppk'] == pytest.approx(min(15.0 - mean, mean - 4.0) / (3 * std))
+
+    rolling = np.convolve(clean, np.ones(20) / 20, mode='valid')
+    assert stats['rolling']['values'] == pytest.approx(rolling)
+    assert stats['rolling']['timestamps'][0] == timestamps[~np.isnan(values)][19].item().isoformat()
+
+
+def test_one_sided_spec_and_empty_input(series):
+    timestamps, values = series
+    stats = analytics.metric_stats(timestamps, values, usl=15.0)
+    capability = stats['capability']
+    assert capability['cp'] is None and capability['pp'] is None
+    assert capability['cpk'] == pytest.approx((15.0 - np.nanmean(values)) / (3 * stats['control']['sigma_within']))
+    assert analytics.metric_stats(timestamps, values)['capability'] is None
+    assert analytics.metric_stats(timestamps[:0], values[:0])['count'] == 0
+
+
+def test_correlation_matches_numpy(series):
+    _, metric_a = series
+    rng = np.random.default_rng(11)
+    metric_b = 0.5 * metric_a + rng.normal(0, 1, metric_a.size)
+    metric_b[::53] = np.nan
+    both = ~np.isnan(metric_a) & ~np.isnan(metric_b)
+    assert analytics.correlation(metric_a, metric_b) == pytest.approx(np.corrcoef(metric_a[both], metric_b[both])[0, 1])
+    assert analytics.correlation(metric_a, np.full(metric_a.size, 3.0)) is None
+    assert analytics.correlation(metric_a[:2], metric_b[:2]) is None
+
+
+def _ingest(rows):
+    inserted, rejects = ingest.insert_samples(db.session, enumerate(rows))
+    assert not rejects
+    return inserted
+
+
+def test_analyze_memo_is_invalidated_when_the_window_changes(app):
+    analytics.memo.clear()
+    end = START + timedelta(days=1)
+    with app.app_context():
+        rng = np.random.default_rng(3)
+        _ingest([
+            {'line_name': '產線A', 'timestamp': (START + timedelta(minutes=n)).isoformat(),
+             'metric_a': float(value), 'metric_b': float(value) * 2 + 1}
+            for n, value in enumerate(rng.normal(5, 1, 200))
+        ])
+        now = end + timedelta(days=1)
+        first = analytics.analyze(db.session, START, end, spec_limits={'metric_a': (2.0, 8.0)}, now=now)
+        assert first['closed']
+        [line] = first['lines']
+        assert line['total_records'] == 200
+        assert line['correlation'] == pytest.approx(1.0)
+        # 已結束的區間：資料沒有變動時直接回傳 memo 中的結果
+        assert analytics.analyze(db.session, START, end, spec_limits={'metric_a': (2.0, 8.0)}, now=now) is first
+
+        # 補寫一筆舊資料：彙總表的指紋改變，重新計算
+        _ingest([{'line_name': '產線A', 'timestamp': (START + timedelta(hours=5)).isoformat(), 'metric_a': 50.0}])
+        second = analytics.analyze(db.session, START, end, spec_limits={'metric_a': (2.0, 8.0)}, now=now)
+        assert second is not first
+        assert second['lines'][0]['total_records'] == 201
+        assert second['lines'][0]['metric_a']['max'] == 50.0
+
+        # 尚未結束的區間不寫入 memo
+        open_window = analytics.analyze(db.session, START, end, now=START + timedelta(hours=12))
+        assert not open_window['closed']
+        assert analytics.analyze(db.session, START, end, now=START + timedelta(hours=12)) is not open_window
@@ -0,0 +1,26 @@
+# backend/tests/test_auth.py
+
+
+def _register(client, username, email, password='pw'):
+    return client.post('/api/v1/auth/register', json={'username': username, 'email': email, 'password': password})
+
+
+def test_login_by_username_or_email_picks_one_account(client):
+    assert _register(client, 'amy', 'amy@example.com', 'pw-amy').status_code == 201
+    assert _register(client, 'bob', 'bob@example.com', 'pw-bob').status_code == 201
+
+    for login in ('amy', 'amy@example.com'):
+        assert client.post('/api/v1/auth/login', json={'username': login, 'password': 'pw-amy'}).status_code == 200
+    # 包含 @ 的只比對電子郵件，不會找到使用者名稱
+    assert client.post('/api/v1/auth/login', json={'username': 'amy@', 'password': 'pw-amy'}).status_code == 401
+
+
+def test_register_blocks_cross_field_collisions(client):
+    assert _register(client, 'amy', 'amy@example.com').status_code == 201
+    # 使用者名稱若可以是另一個帳號的電子郵件，登入時就無法確定是哪一個帳號
+    response = _register(client, 'amy@example.com', 'other@example.com')
+    assert response.status_code == 400
+    assert '@' in response.get_json()['message']
+    assert _register(client, 'carol', 'amy').status_code == 400
+    assert _register(client, 'amy', 'amy2@example.com').status_code == 400
+    assert _register(client, 'amy2', 'amy@example.com').status_code == 400
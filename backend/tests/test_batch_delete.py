@@ -0,0 +1,54 @@
+# backend/tests/test_batch_delete.py
+
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, func
+from extensions import db, sample_archive
+from models import Sample
+import batch_delete
+import jobs
+import retention
+
+NOW = datetime(2024, 3, 1)
+
+
+def _seed(app):
+    """產線A 每天一筆、共 120 天，超過保留期限 (30 天，對齊到分區起點) 的搬進封存區"""
+    with app.app_context():
+        db.session.add_all([
+            Sample(line_name='產線A', timestamp=NOW - timedelta(days=day), metric_a=1.0, metric_b=1.0)
+            for day in range(1, 121)
+        ])
+        db.session.commit()
+        retention.archive_samples(db.session, sample_archive, 30, now=NOW, batch_size=1000)
+        return db.session.execute(select(func.count()).select_from(Sample)).scalar()
+
+
+def _hot_count():
+    return db.session.execute(select(func.count()).select_from(Sample)).scalar()
+
+
+def test_range_delete_overlapping_archive_is_rejected_without_partial_purge(app, client):
+    hot = _seed(app)
+    assert 0 < hot < 120
+    body = {'line_name': '產線A', 'start_time': (NOW - timedelta(days=100)).isoformat()}
+
+    response = client.delete('/api/v1/samples/', json=body)
+    assert response.status_code == 409
+    assert '封存' in response.get_json()['message']
+
+    with app.app_context():
+        with pytest.raises(batch_delete.ArchivedRangeError):
+            batch_delete.delete_sample_range(db.session, line_name='產線A', start_time=NOW - timedelta(days=100))
+        with pytest.raises(jobs.InvalidParams):
+            jobs.submit(db.session, 'delete-samples', body)
+        assert _hot_count() == hot
+
+
+def test_range_delete_within_hot_table_still_works(app, client):
+    hot = _seed(app)
+    response = client.delete('/api/v1/samples/', json={'start_time': (NOW - timedelta(days=10)).isoformat()})
+    assert response.status_code == 200
+    assert response.get_json()['deleted'] == 10
+    with app.app_context():
+        assert _hot_count() == hot - 10
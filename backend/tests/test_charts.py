@@ -0,0 +1,40 @@
+# backend/tests/test_charts.py
+
+from datetime import datetime, timedelta
+from extensions import db
+from models import Sample
+
+
+def _seed(app, minutes):
+    with app.app_context():
+        start = datetime(2024, 1, 1)
+        db.session.add_all([
+            Sample(line_name='產線A', timestamp=start + timedelta(minutes=n), metric_a=float(n % 7), metric_b=1.0)
+            for n in range(minutes)
+        ])
+        db.session.commit()
+
+
+def test_bucketed_series_is_capped_by_max_points(app, client):
+    """分桶查詢也受點數上限限制：分鐘桶超過上限時改用較粗的粒度"""
+    app.config['CHART_MAX_POINTS'] = 50
+    _seed(app, 6 * 60)
+    response = client.get('/api/v1/charts/line-comparison', query_string={'bucket': 'minute'})
+    labels = response.get_json()['labels']
+    assert response.status_code == 200
+    assert 0 < len(labels) <= 50
+    # 6 小時的分鐘資料 -> 小時桶
+    assert labels[0] == '2024-01-01T00:00:00' and labels[1] == '2024-01-01T01:00:00'
+
+    response = client.get('/api/v1/charts/line-comparison', query_string={'bucket': 'minute', 'max_points': 1000})
+    assert len(response.get_json()['labels']) == 6 * 60
+
+
+def test_raw_series_is_downsampled(app, client):
+    app.config['CHART_MAX_POINTS'] = 40
+    _seed(app, 500)
+    response = client.get('/api/v1/charts/line-comparison', query_string={'from': '2024-01-01T00:00:00'})
+    body = response.get_json()
+    assert len(body['labels']) == 40
+    # 保留頭尾兩點
+    assert body['labels'][0] == '2024-01-01T00:00:00' and body['labels'][-1] == '2024-01-01T08:19:00'
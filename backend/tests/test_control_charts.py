@@ -0,0 +1,136 @@
+# backend/tests/test_control_charts.py
+
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+from extensions import db
+from models import Sample, ControlChartAlert
+from control_charts import MetricState, Settings, RULES, monitor
+
+NOW = datetime(2024, 6, 1)
+# 基準：9 / 11 交替 200 筆 (平均 10、標準差約 1)，且不會連續落在中心線同一側
+BASELINE = [9.0, 11.0] * 100
+
+
+def _settings(*rules):
+    return Settings(rules=rules or tuple(RULES), min_samples=30, window=50, ewma_lambda=0.2, ewma_width=3.0,
+                    spec_limits={})
+
+
+def _observe(state, values, settings, spec_limits=(None, None)):
+    """逐筆加入，回傳每一筆新觸發的規則名稱"""
+    return [[rule for rule, *_ in state.observe(value, settings, spec_limits)] for value in values]
+
+
+def _baseline(settings):
+    state = MetricState(settings.window)
+    assert not any(_observe(state, BASELINE, settings))
+    assert state.ready(settings)
+    return state
+
+
+@pytest.mark.parametrize('rule, values, expected', [
+    # 單點超出 3σ；持續超出期間只警報一次，回到管制內之後再超出才再警報
+    ('we1', [20, 20, 10, 20], [1, 0, 0, 1]),
+    # 連續 3 點中有 2 點超出 2σ：第 2 點觸發，位元紀錄清空前不重複
+    ('we2', [12.5, 12.5, 12.5, 10, 10, 10, 12.5, 12.5], [0, 1, 0, 0, 0, 0, 0, 1]),
+    # 連續 5 點中有 4 點超出 1σ (下側)
+    ('we3', [8.5] * 6 + [10] * 2 + [8.5] * 4, [0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1]),
+    # 連續 8 點落在中心線同一側 (基準最後一點 11 已在上側)；之後仍在同一側不重複，換到另一側後重新計數
+    ('we4', [10.5] * 10 + [9.5] * 8, [0] * 6 + [1, 0, 0, 0] + [0] * 7 + [1]),
+])
+def test_western_electric_rules_alert_once_while_active(rule, values, expected):
+    settings = _settings(rule)
+    state = _baseline(settings)
+    fired = _observe(state, values, settings)
+    assert [len(rules) for rules in fired] == expected
+    assert all(rules == [rule] for rules in fired if rules)
+
+
+def test_ewma_alerts_once_per_excursion():
+    settings = _settings('ewma')
+    state = _baseline(settings)
+    center, sigma = state.mean, state.sigma
+    half_width = settings.ewma_width * sigma * (settings.ewma_lambda / (2 - settings.ewma_lambda)) ** 0.5
+
+    fired = state.observe(12, settings)
+    assert fired == []
+    alerts = []
+    for value in [12] * 9 + [8] * 15:
+        alerts += state.observe(value, settings)
+    # 上側持續超出期間只有一筆，EWMA 回落後超出下側界限再一筆；警報的值為 EWMA 值
+    assert [alert[0] for alert in alerts] == ['ewma', 'ewma']
+    assert alerts[0][1] > center + half_width
+    assert alerts[1][1] < alerts[1][2] - half_width
+    assert alerts[0][2] == pytest.approx(center, abs=0.1)
+
+
+def test_spec_limits_apply_before_baseline_is_ready():
+    settings = _settings('spec')
+    state = MetricState(settings.window)
+    alerts = [state.observe(value, settings, (5, 15)) for value in (10, 16, 17, 10, 4, 3)]
+    assert [[alert[0] for alert in fired] for fired in alerts] == [[], ['spec'], [], [], ['spec'], []]
+    # 基準尚未建立時沒有中心線與標準差
+    assert alerts[1] == [('spec', 16, None, None)]
+    assert not state.ready(settings)
+
+
+def test_state_round_trip_continues_identically():
+    settings = _settings()
+    state = _baseline(settings)
+    _observe(state, [12.5, 20, 8.5, 10.5], settings)
+    restored = MetricState(settings.window, state.to_dict())
+    values = [12.5, 12.5, 8.5, 8.5, 8.5, 8.5, 20] + [10.5] * 9
+    assert _observe(restored, values, settings) == _observe(state, values, settings)
+    assert restored.to_dict() == state.to_dict()
+
+
+def _seed(app):
+    """兩條產線交錯寫入：基準之後依序出現單點異常、2σ 偏移、持續偏移與超出規格的紀錄"""
+    rng = random.Random(24)
+    rows = []
+    for i in range(600):
+        value = 10 + rng.gauss(0, 1)
+        if i in (250, 251, 420):
+            value += 6
+        elif 300 <= i < 340:
+            value += 1.5
+        elif 500 <= i < 520:
+            value -= 2.5
+        rows.append(Sample(line_name='產線A' if i % 2 else '產線B', timestamp=NOW + timedelta(minutes=i),
+                           metric_a=value, metric_b=None if i % 7 == 0 else 20 + rng.gauss(0, 1)))
+    with app.app_context():
+        db.session.add_all(rows)
+        db.session.commit()
+
+
+def _alerts():
+    return sorted(
+        (alert.line_name, alert.metric, alert.rule, alert.sample_id, alert.value, alert.center_line, alert.sigma)
+        for alert in db.session.execute(select(ControlChartAlert)).scalars()
+    )
+
+
+def test_restart_from_checkpoint_reproduces_state_without_duplicate_alerts(app):
+    app.config['ANALYSIS_SPEC_LIMITS'] = {'metric_a': (None, None), 'metric_b': (None, 22.0)}
+    monitor.init_app(app)
+    _seed(app)
+    with app.app_context():
+        # 對照組：一次處理全部紀錄
+        assert monitor.sync(db.session, checkpoint=True)['processed'] == 600
+        expected_lines = monitor.lines()
+        expected_alerts = _alerts()
+        assert {alert[2] for alert in expected_alerts} >= {'we1', 'we2', 'we4', 'ewma', 'spec'}
+
+        # 清除後分段處理：每段先寫入檢查點，再多處理一些沒有寫入檢查點的紀錄 (除非有警報)，
+        # 接著模擬重新啟動 (丟棄記憶體中的狀態，從資料庫的檢查點載入)
+        monitor.reset(db.session)
+        while monitor.sync(db.session, max_rows=45, checkpoint=True)['processed']:
+            monitor.sync(db.session, max_rows=30)
+            monitor.init_app(app)
+        assert monitor.lines() == expected_lines
+        alerts = _alerts()
+
+    assert alerts == expected_alerts
+    assert len({alert[:4] for alert in alerts}) == len(alerts)
@@ -0,0 +1,102 @@
+# backend/tests/test_ingest.py
+
+import json
+from datetime import datetime
+import pytest
+from sqlalchemy import select, func
+from extensions import db
+from models import Sample
+import aggregates
+import ingest
+
+
+def _count():
+    return db.session.execute(select(func.count()).select_from(Sample)).scalar()
+
+
+@pytest.mark.parametrize('value', ['1.5', True, float('nan'), float('inf'), [1], {'v': 1}])
+def test_non_numeric_metrics_are_rejected(value):
+    row, errors = ingest.validate_sample({'line_name': '產線A', 'metric_a': value})
+    assert row is None
+    assert errors == ['metric_a 必須是有限的數值']
+
+
+def test_validate_sample_collects_every_error():
+    row, errors = ingest.validate_sample({'product_name': '', 'operator': 'x' * 51, 'timestamp': 'yesterday', 'color': 'red'})
+    assert row is None
+    assert errors == [
+        '不支援的欄位: color',
+        'line_name 為必填',
+        'product_name 必須是非空字串',
+        'operator 長度不可超過 50',
+        'timestamp 必須是 ISO 8601 字串或 Unix 秒數',
+    ]
+    assert ingest.validate_sample(['not', 'an', 'object']) == (None, ['每一筆資料必須是 JSON 物件'])
+
+
+def test_validate_sample_normalizes_values():
+    now = datetime(2024, 1, 1, 12)
+    row, errors = ingest.validate_sample({'line_name': '產線A', 'metric_a': 3, 'timestamp': '2024-01-01T08:00:00+08:00'})
+    assert errors == []
+    assert row['metric_a'] == 3.0 and isinstance(row['metric_a'], float)
+    assert row['timestamp'] == datetime(2024, 1, 1, 0, 0)  # 轉成 UTC naive
+    assert ingest.validate_sample({'line_name': '產線A', 'timestamp': 0})[0]['timestamp'] == datetime(1970, 1, 1)
+    assert ingest.validate_sample({'line_name': '產線A'}, now=now)[0]['timestamp'] == now
+
+
+def test_ingest_reports_per_row_errors_and_writes_the_rest(app, client):
+    app.config['INGEST_CHUNK_SIZE'] = 2
+    with app.app_context():
+        aggregates.get_or_rebuild(db.session)
+        db.session.commit()
+    records = [
+        {'line_name': '產線A', 'metric_a': 1.0},
+        {'line_name': '產線A', 'metric_a': 'abc'},
+        {'metric_b': 2.0},
+        {'line_name': '產線B', 'metric_b': 2.5},
+        {'line_name': '產線B', 'metric_a': 4, 'metric_b': None},
+    ]
+    response = client.post('/api/v1/samples/ingest', json={'samples': records})
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['inserted'] == 3
+    assert body['rejected'] == 2
+    assert body['rejects'] == [
+        {'index': 1, 'errors': ['metric_a 必須是有限的數值']},
+        {'index': 2, 'errors': ['line_name 為必填']},
+    ]
+    with app.app_context():
+        assert _count() == 3
+        # 分段寫入時累計表也同步更新
+        assert aggregates.verify(db.session.connection()) == {}
+
+
+def test_ingest_without_valid_rows_is_a_bad_request(app, client):
+    assert client.post('/api/v1/samples/ingest', json={'line_name': '產線A'}).status_code == 400
+    response = client.post('/api/v1/samples/ingest', json=[{'line_name': 1}, {'metric_a': 'x'}])
+    assert response.status_code == 400
+    assert response.get_json()['rejected'] == 2
+    with app.app_context():
+        assert _count() == 0
+
+
+def test_oversized_json_batch_is_rejected_before_writing(app, client):
+    app.config['INGEST_MAX_ROWS'] = 3
+    response = client.post('/api/v1/samples/ingest', json=[{'line_name': '產線A'}] * 4)
+    assert response.status_code == 413
+    with app.app_context():
+        assert _count() == 0
+
+
+def test_ndjson_stops_at_the_row_limit_and_reports_bad_lines(app, client):
+    app.config['INGEST_MAX_ROWS'] = 3
+    lines = [json.dumps({'line_name': '產線A', 'metric_a': n}) for n in range(2)] + ['{not json'] + \
+        [json.dumps({'line_name': '產線A'})] * 2
+    response = client.post('/api/v1/samples/ingest', data='\n'.join(lines) + '\n', content_type='application/x-ndjson')
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['inserted'] == 2
+    assert body['rejects'][0] == {'index': 2, 'errors': ['每一筆資料必須是 JSON 物件']}
+    assert body['rejects'][1]['index'] == 3 and '上限' in body['rejects'][1]['errors'][0]
+    with app.app_context():
+        assert _count() == 2
@@ -0,0 +1,145 @@
+# backend/tests/test_jobs.py
+
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+from extensions import db
+from models import Job
+import jobs
+
+NOW = datetime(2024, 6, 1)
+
+
+@pytest.fixture
+def job_types(monkeypatch):
+    """測試用的工作類型：'test' 群組上限 1 (未列在 JOB_CONCURRENCY)，'test-wide' 群組上限 2"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def quick(ctx, params):
+        return {'ok': True}
+
+    def blocking(ctx, params):
+        started.set()
+        release.wait(5)
+        ctx.progress(0.5, '執行中')
+        return {'ok': True}
+
+    for name, group, handler in (('test-quick', 'test', quick), ('test-block', 'test', blocking),
+                                 ('test-wide', 'test-wide', quick)):
+        monkeypatch.setitem(jobs.JOB_TYPES, name, jobs.JobType(name, group, handler, jobs._no_params, False, ''))
+    return started, release
+
+
+@pytest.fixture
+def worker(app, tmp_path):
+    app.config['JOBS_DIR'] = str(tmp_path / 'jobs')
+    app.config['JOB_CONCURRENCY'] = {**app.config['JOB_CONCURRENCY'], 'test-wide': 2}
+    return jobs.Worker(app, threads=4, worker_id='test-worker')
+
+
+def _submit(app, name, minutes):
+    """依 minutes 排定建立時間，讓領取順序固定"""
+    with app.app_context():
+        job = jobs.submit(db.session, name)
+        job.created_at = NOW + timedelta(minutes=minutes)
+        db.session.commit()
+        return job.id
+
+
+def _job(app, job_id):
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        db.session.expunge(job)
+        return job
+
+
+def test_full_group_keeps_second_job_queued(app, job_types, worker):
+    first = _submit(app, 'test-quick', 0)
+    second = _submit(app, 'test-quick', 1)
+    wide = [_submit(app, 'test-wide', minutes) for minutes in (2, 3, 4)]
+
+    claimed = worker.claim(10)
+    # 'test' 群組只能有 1 個執行中，'test-wide' 群組 2 個；其餘留在佇列
+    assert [ctx.job_id for ctx in claimed] == [first] + wide[:2]
+    assert _job(app, first).status == 'running'
+    assert _job(app, first).worker_id == 'test-worker'
+    assert _job(app, second).status == 'queued'
+    assert _job(app, wide[2]).status == 'queued'
+    assert worker.claim(10) == []
+
+    # 同群組的工作結束後，下一輪才領取排隊中的工作
+    worker._execute(claimed[0])
+    assert _job(app, first).status == 'succeeded'
+    assert _job(app, first).result == {'ok': True}
+    assert [ctx.job_id for ctx in worker.claim(10)] == [second]
+
+
+def test_cancel_queued_job(app, job_types, worker):
+    job_id = _submit(app, 'test-quick', 0)
+    with app.app_context():
+        assert jobs.request_cancel(db.session, job_id)
+        db.session.commit()
+
+    job = _job(app, job_id)
+    assert job.status == 'cancelled'
+    assert job.finished_at is not None
+    assert worker.claim(10) == []
+    # 已結束的工作不再受理取消
+    with app.app_context():
+        assert not jobs.request_cancel(db.session, job_id)
+        db.session.rollback()
+
+
+def test_cancel_running_job_stops_at_next_progress(app, job_types, worker):
+    started, release = job_types
+    job_id = _submit(app, 'test-block', 0)
+    [ctx] = worker.claim(1)
+    thread = threading.Thread(target=worker._execute, args=(ctx,))
+    thread.start()
+    try:
+        assert started.wait(5)
+        with app.app_context():
+            assert jobs.request_cancel(db.session, job_id)
+            db.session.commit()
+        # 執行中的工作只標記取消要求；心跳讀回後，handler 下次回報進度時拋出 JobCancelled
+        assert _job(app, job_id).status == 'running'
+        assert _job(app, job_id).cancel_requested
+        worker.heartbeat()
+        assert ctx.cancel_event.is_set()
+    finally:
+        release.set()
+        thread.join(5)
+
+    job = _job(app, job_id)
+    assert job.status == 'cancelled'
+    assert job.result is None
+    assert job.progress == 0.5
+    assert job.progress_message == '執行中'
+    assert job_id not in worker._running
+
+
+def test_housekeeping_fails_jobs_without_heartbeat(app, job_types, worker):
+    stale = _submit(app, 'test-quick', 0)
+    fresh = _submit(app, 'test-wide', 1)
+    claimed = {ctx.job_id: ctx for ctx in worker.claim(10)}
+    assert set(claimed) == {stale, fresh}
+    with app.app_context():
+        db.session.execute(
+            update(Job).where(Job.id == stale)
+            .values(heartbeat_at=datetime.utcnow() - timedelta(seconds=worker.stale_seconds + 10))
+        )
+        db.session.commit()
+
+    worker.housekeeping()
+    job = _job(app, stale)
+    assert job.status == 'failed'
+    assert '心跳逾時' in job.error
+    assert _job(app, fresh).status == 'running'
+
+    # 中斷的 worker 之後才結束時，不覆寫已標記失敗的結果；群組空出後可以領取新的工作
+    worker._execute(claimed[stale])
+    assert _job(app, stale).status == 'failed'
+    next_job = _submit(app, 'test-quick', 2)
+    assert [ctx.job_id for ctx in worker.claim(10)] == [next_job]
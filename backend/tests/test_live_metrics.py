@@ -0,0 +1,118 @@
+# backend/tests/test_live_metrics.py
+
+import json
+import time
+import pytest
+from flask import Flask
+from live_metrics import LiveMetricsHub, format_event, HEARTBEAT
+from api.statistics import live_hub
+
+
+def _next_event(stream, skip=('retry', HEARTBEAT)):
+    """讀到下一則事件 (略過 retry 與 heartbeat)，回傳 (event, data)"""
+    for message in stream:
+        if isinstance(message, bytes):
+            message = message.decode('utf-8')
+        if message.startswith(skip):
+            continue
+        event, data = message.strip().split('\n')
+        return event[len('event: '):], json.loads(data[len('data: '):])
+    raise AssertionError('stream ended')
+
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def hub():
+    """producer 每次喚醒時送出 pending 中的事件，快照為目前的 count"""
+    pending = []
+
+    def produce(state):
+        state['count'] = state.get('count', 0) + len(pending)
+        updates, pending[:] = list(pending), []
+        return updates
+
+    hub = LiveMetricsHub(produce, lambda state: [('snapshot', {'count': state.get('count', 0)})])
+    hub.pending = pending
+    hub.heartbeat, hub.poll_interval, hub.min_interval = 0.2, 0.05, 0
+    yield hub
+    _wait_until(lambda: hub._thread is None)
+
+
+def test_subscribers_get_snapshot_then_fan_out(hub):
+    app = Flask(__name__)
+    first, second = hub.subscribe(app), hub.subscribe(app)
+    assert hub.subscriber_count == 2
+    assert _next_event(first) == ('snapshot', {'count': 0})
+    assert _next_event(second) == ('snapshot', {'count': 0})
+
+    hub.pending.append(('metrics', {'total_records': 1}))
+    hub.notify()
+    # 計算一次，分送給每一個訂閱者
+    assert _next_event(first) == ('metrics', {'total_records': 1})
+    assert _next_event(second) == ('metrics', {'total_records': 1})
+
+    first.close()
+    second.close()
+    assert hub.subscriber_count == 0
+
+
+def test_disconnect_removes_subscriber_and_stops_producer(hub):
+    app = Flask(__name__)
+    stream = hub.subscribe(app)
+    _next_event(stream)
+    thread = hub._thread
+    assert thread.is_alive()
+
+    # 用戶端斷線時 WSGI 伺服器會 close() 產生器
+    stream.close()
+    assert hub.subscriber_count == 0
+    thread.join(timeout=5)
+    assert not thread.is_alive() and hub._thread is None
+
+
+def test_subscriber_limit_and_slow_client_resync(hub):
+    app = Flask(__name__)
+    hub.max_subscribers, hub.max_queue = 1, 2
+    stream = hub.subscribe(app)
+    assert hub.subscribe(app) is None
+    assert _next_event(stream) == ('snapshot', {'count': 0})
+
+    # 這個連線沒有在讀：佇列滿了之後丟掉累積的增量，改送 resync + 完整快照
+    hub._publish([format_event('metrics', {'n': n}) for n in range(5)])
+    assert _next_event(stream) == ('resync', {})
+    assert _next_event(stream) == ('snapshot', {'count': 0})
+    hub._publish([format_event('metrics', {'n': 5})])
+    assert _next_event(stream) == ('metrics', {'n': 5})
+    stream.close()
+
+
+def test_stream_endpoint_pushes_new_samples(app, client):
+    app.config.update(LIVE_HEARTBEAT_SECONDS=0.2, LIVE_POLL_SECONDS=0.05, LIVE_MIN_INTERVAL_SECONDS=0)
+    live_hub.init_app(app)
+    client.post('/api/v1/samples/ingest', json=[{'line_name': '產線A', 'metric_a': 1.0, 'metric_b': 2.0}])
+
+    response = client.get('/api/v1/statistics/stream', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    event, snapshot = _next_event(stream)
+    assert event == 'snapshot' and snapshot['total_records'] == 1
+
+    # 寫入 commit 後 (快取失效的通知) 喚醒 producer，推送變動的指標與新的圖表點
+    client.post('/api/v1/samples/ingest', json=[{'line_name': '產線B', 'metric_a': 3.0, 'metric_b': 4.0}])
+    event, metrics = _next_event(stream)
+    assert event == 'metrics'
+    assert metrics['total_records'] == 2 and metrics['avg_metric_a'] == 2.0
+    event, points = _next_event(stream)
+    assert event == 'points'
+    assert [(point['line_name'], point['metric_a']) for point in points['points']] == [('產線B', 3.0)]
+
+    response.close()
+    assert live_hub.subscriber_count == 0
+    _wait_until(lambda: live_hub._thread is None)
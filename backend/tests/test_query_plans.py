@@ -0,0 +1,23 @@
+# backend/tests/test_query_plans.py
+# 與 flask check-query-plans 相同的查詢計畫檢查 (規模較小)，讓全表掃描 / 走完整個索引的退步在測試中就被擋下
+
+from datetime import datetime
+from extensions import db
+import query_plans
+import seed_data
+
+NOW = datetime(2024, 6, 1)
+
+
+def test_read_endpoints_seek_with_indexes(app):
+    with app.app_context():
+        seed_data.seed(db.session, samples=6000, reports=300, now=NOW)
+    results = query_plans.check(app, NOW)
+
+    failures = [
+        f"{result['name']} (HTTP {result['status']}): {'; '.join(result['scans'])}"
+        for result in results if result['scans'] or result['status'] >= 400
+    ]
+    assert not failures, '\n'.join(failures)
+    # cursor 的第二頁與深處的一頁都有檢查到
+    assert any(result['name'].endswith('(cursor 深處)') and 'cursor=' in result['url'] for result in results)
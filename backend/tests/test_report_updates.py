@@ -0,0 +1,108 @@
+# backend/tests/test_report_updates.py
+
+import pytest
+from sqlalchemy import select
+from extensions import db
+from models import WastewaterReportItem
+
+REPORT = {
+    'vendor': '廠商甲', 'status': '合格', 'report_date': '2024-03-01',
+    'items': [
+        {'item_name': 'COD', 'value': 50, 'unit': 'mg/L', 'standard': '<=100', 'is_compliant': True},
+        {'item_name': 'pH', 'value': 7.2, 'standard': '6~9', 'is_compliant': True},
+        {'item_name': 'SS', 'value': 20, 'unit': 'mg/L', 'standard': '<=30', 'is_compliant': True},
+    ],
+}
+
+
+@pytest.fixture
+def report(client):
+    body = client.post('/api/v1/wastewater-reports/', json=REPORT).get_json()
+    return {'id': body['id'], 'items': {item['item_name']: item['id'] for item in body['items']}}
+
+
+def _stored_items(app, report_id):
+    with app.app_context():
+        rows = db.session.execute(
+            select(WastewaterReportItem.id, WastewaterReportItem.item_name, WastewaterReportItem.value,
+                   WastewaterReportItem.standard_min, WastewaterReportItem.standard_max)
+            .where(WastewaterReportItem.report_id == report_id).order_by(WastewaterReportItem.id)
+        ).all()
+    return {row.item_name: row for row in rows}
+
+
+def test_put_diffs_items_by_id(app, client, report):
+    ids = report['items']
+    payload = dict(REPORT, status='部分項目不合格', items=[
+        # COD：只改檢測值；pH：改標準值；SS 沒有出現 -> 刪除；NH3-N 沒有 id -> 新增
+        {'id': ids['COD'], 'item_name': 'COD', 'value': 120, 'unit': 'mg/L', 'standard': '<=100', 'is_compliant': False},
+        {'id': ids['pH'], 'item_name': 'pH', 'value': 7.2, 'standard': '5~8', 'is_compliant': True},
+        {'item_name': 'NH3-N', 'value': 3, 'unit': 'mg/L', 'standard': '>1', 'is_compliant': True},
+    ])
+    response = client.put(f"/api/v1/wastewater-reports/{report['id']}", json=payload)
+    assert response.status_code == 200
+    assert response.get_json()['status'] == '部分項目不合格'
+
+    items = _stored_items(app, report['id'])
+    assert set(items) == {'COD', 'pH', 'NH3-N'}
+    assert items['COD'].id == ids['COD'] and items['COD'].value == 120
+    assert items['pH'].id == ids['pH']
+    # 批次 UPDATE / INSERT 也會重新解析標準值的上下限
+    assert (items['pH'].standard_min, items['pH'].standard_max) == (5.0, 8.0)
+    assert (items['COD'].standard_min, items['COD'].standard_max) == (None, 100.0)
+    assert (items['NH3-N'].standard_min, items['NH3-N'].standard_max) == (1.0, None)
+    with app.app_context():
+        assert db.session.get(WastewaterReportItem, ids['SS']) is None
+
+
+def test_patch_updates_only_given_fields_and_deletes_listed_items(app, client, report):
+    ids = report['items']
+    response = client.patch(f"/api/v1/wastewater-reports/{report['id']}", json={
+        'items': [{'id': ids['pH'], 'standard': '6.5~8.5'}, {'item_name': 'Pb', 'value': 0.01, 'is_compliant': True}],
+        'delete_item_ids': [ids['SS']],
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['vendor'] == '廠商甲' and body['status'] == '合格'
+
+    items = _stored_items(app, report['id'])
+    assert set(items) == {'COD', 'pH', 'Pb'}
+    assert items['pH'].id == ids['pH'] and items['pH'].value == 7.2
+    assert (items['pH'].standard_min, items['pH'].standard_max) == (6.5, 8.5)
+    assert items['COD'].id == ids['COD'] and items['COD'].value == 50
+
+
+@pytest.mark.parametrize('method, payload', [
+    # 缺少必填欄位 (RESTx 驗證)
+    ('put', dict(REPORT, items=[{'item_name': 'COD', 'value': 1}])),
+    ('put', {'vendor': '廠商甲', 'items': []}),
+    ('patch', {'items': [{'id': 1, 'value': 'abc'}]}),
+    # 差異比對時的檢查
+    ('put', dict(REPORT, items=[{'id': 99999, 'item_name': 'COD', 'value': 1, 'is_compliant': True}])),
+    ('patch', {'items': [{'item_name': 'COD'}]}),
+    ('patch', {'items': [{'id': '{COD}', 'value': None}]}),
+    ('patch', {'delete_item_ids': [99999]}),
+    ('patch', {'items': [{'id': '{COD}', 'value': 1}], 'delete_item_ids': ['{COD}']}),
+    ('patch', {'items': [{'id': '{COD}', 'value': 1}, {'id': '{COD}', 'value': 2}]}),
+])
+def test_invalid_updates_are_rejected_without_changes(app, client, report, method, payload):
+    before = _stored_items(app, report['id'])
+    cod = report['items']['COD']
+
+    def resolve(value):
+        if value == '{COD}':
+            return cod
+        if isinstance(value, list):
+            return [resolve(item) for item in value]
+        if isinstance(value, dict):
+            return {key: resolve(item) for key, item in value.items()}
+        return value
+
+    response = getattr(client, method)(f"/api/v1/wastewater-reports/{report['id']}", json=resolve(payload))
+    assert response.status_code == 400
+    assert _stored_items(app, report['id']) == before
+
+
+def test_update_of_missing_report_is_not_found(client):
+    assert client.put('/api/v1/wastewater-reports/99999', json=REPORT).status_code == 404
+    assert client.patch('/api/v1/wastewater-reports/99999', json={'status': '合格'}).status_code == 404
@@ -0,0 +1,45 @@
+# backend/tests/test_response_cache.py
+
+import pytest
+from extensions import cache
+
+
+@pytest.fixture
+def cached_app(app):
+    app.config['CACHE_BACKEND'] = 'memory'
+    cache.init_app(app)
+    yield app
+    app.config['CACHE_BACKEND'] = 'null'
+    cache.init_app(app)
+
+
+@pytest.fixture
+def report_client(cached_app):
+    client = cached_app.test_client()
+    response = client.post('/api/v1/wastewater-reports/', json={
+        'vendor': '測試廠商', 'status': '合格', 'report_date': '2024-01-01',
+        'items': [{'item_name': 'COD', 'value': 10.0, 'unit': 'mg/L', 'standard': '<30', 'is_compliant': True}],
+    })
+    assert response.status_code == 201
+    return client
+
+
+def _list(client, mask=None):
+    headers = {'X-Fields': mask} if mask else {}
+    return client.get('/api/v1/wastewater-reports/', headers=headers)
+
+
+@pytest.mark.parametrize('masked_first', [True, False])
+def test_field_mask_does_not_share_cache_entry(report_client, masked_first):
+    """帶 X-Fields 的回應與完整回應各自快取，不論哪一個先被快取"""
+    order = [True, False] if masked_first else [False, True]
+    responses = {masked: _list(report_client, 'id' if masked else None) for masked in order}
+
+    masked, full = responses[True].get_json(), responses[False].get_json()
+    assert set(masked[0]) == {'id'}
+    assert {'vendor', 'items'} <= set(full[0])
+    assert responses[True].headers['ETag'] != responses[False].headers['ETag']
+
+    # 第二次讀取命中快取，內容仍各自正確
+    assert _list(report_client, 'id').get_json() == masked
+    assert _list(report_client).get_json() == full
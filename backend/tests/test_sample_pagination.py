@@ -0,0 +1,98 @@
+# backend/tests/test_sample_pagination.py
+
+from datetime import datetime, timedelta
+import pytest
+from extensions import db
+from models import Sample
+import query_plans
+
+
+@pytest.fixture
+def samples(app):
+    """產線A / 產線B 交錯，每 7 筆一筆 metric_a 為 NULL，metric_a 有大量重複值"""
+    with app.app_context():
+        start = datetime(2024, 1, 1)
+        db.session.add_all([
+            Sample(line_name='產線A' if n % 2 else '產線B', timestamp=start + timedelta(minutes=n),
+                   metric_a=None if n % 7 == 0 else float(n % 10), metric_b=1.0)
+            for n in range(300)
+        ])
+        db.session.commit()
+    return 300
+
+
+def _walk(client, **query):
+    """依 next_cursor 讀完所有頁；回傳 (id 列表, 每一頁的回應)"""
+    ids, pages, cursor = [], [], None
+    while True:
+        params = dict(query, pagination='cursor', per_page=23)
+        if cursor:
+            params['cursor'] = cursor
+        body = client.get('/api/v1/samples/', query_string=params).get_json()
+        ids += [row['id'] for row in body['data']]
+        pages.append(body)
+        cursor = body['pagination']['next_cursor']
+        if not cursor:
+            return ids, pages
+
+
+@pytest.mark.parametrize('sort_by', ['timestamp', 'metric_a', 'operator', 'line_name'])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('line_name', [None, '產線A'])
+def test_cursor_walk_matches_sort_order(client, samples, sort_by, order, line_name):
+    """逐頁讀完的順序等於 (欄位, id) 排序 (NULL 最小)"""
+    query = {'sort_by': sort_by, 'order': order}
+    if line_name:
+        query['line_name'] = line_name
+    rows = client.get('/api/v1/samples/', query_string=dict(query, per_page=1000)).get_json()['data']
+    rows.sort(key=lambda row: (row[sort_by] is not None, row[sort_by] or 0, row['id']), reverse=order == 'desc')
+    expected = [row['id'] for row in rows]
+    ids, pages = _walk(client, **query)
+    assert ids == expected
+
+    # 由最後一頁依 prev_cursor 往回讀，順序相同
+    body, backwards = pages[-1], [row['id'] for row in pages[-1]['data']]
+    while body['pagination']['prev_cursor']:
+        params = dict(query, pagination='cursor', per_page=23, cursor=body['pagination']['prev_cursor'])
+        body = client.get('/api/v1/samples/', query_string=params).get_json()
+        backwards = [row['id'] for row in body['data']] + backwards
+    assert backwards == expected
+
+
+@pytest.mark.parametrize('sort_by, order, bound', [
+    ('timestamp', 'desc', 'timestamp<?'),
+    ('timestamp', 'asc', 'timestamp>?'),
+    ('metric_a', 'desc', 'metric_a<?'),
+    ('metric_a', 'asc', 'metric_a>?'),
+])
+@pytest.mark.parametrize('line_name', [None, '產線A'])
+def test_cursor_page_seeks_to_the_cursor(app, client, samples, sort_by, order, bound, line_name):
+    """第 N 頁的查詢直接在 (欄位, id) 索引上定位到 cursor 的位置，不是從索引開頭掃描"""
+    query = {'sort_by': sort_by, 'order': order, 'pagination': 'cursor', 'per_page': 20}
+    if line_name:
+        query['line_name'] = line_name
+    for _ in range(3):
+        query['cursor'] = client.get('/api/v1/samples/', query_string=query).get_json()['pagination']['next_cursor']
+
+    plan = _page_plan(app, client, query)
+    assert len(plan) == 1 and plan[0].startswith('SEARCH sample USING'), plan
+    assert bound in plan[0], plan
+    if line_name:
+        assert 'line_name=?' in plan[0], plan
+
+
+@pytest.mark.parametrize('order, bound', [('desc', 'id<?'), ('asc', 'id>?')])
+def test_cursor_page_sorted_by_filtered_line_seeks_by_id(app, client, samples, order, bound):
+    """依產線篩選又依產線排序：排序欄位只有一個值，以 (line_name, id) 索引上的 id 定位"""
+    query = {'sort_by': 'line_name', 'order': order, 'line_name': '產線A', 'pagination': 'cursor', 'per_page': 20}
+    query['cursor'] = client.get('/api/v1/samples/', query_string=query).get_json()['pagination']['next_cursor']
+    plan = _page_plan(app, client, query)
+    assert len(plan) == 1 and f'(line_name=? AND {bound})' in plan[0], plan
+
+
+def _page_plan(app, client, query):
+    with app.app_context():
+        engine = db.engine
+    with query_plans.capture_statements(engine) as statements:
+        assert client.get('/api/v1/samples/', query_string=query).status_code == 200
+    return query_plans.explain(engine, *statements[0])